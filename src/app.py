@@ -1,17 +1,17 @@
 import dash
-from dash import Dash, dcc, html, Input, Output, dash_table, DiskcacheManager, clientside_callback
-import pandas as pd
+from dash import Dash, dcc, html, Input, Output, clientside_callback
 import dash_bootstrap_components as dbc
-import numpy as np
-from plotly.subplots import make_subplots
-import diskcache
+
+from background import background_callback_manager
+from metrics import register_metrics
+from health import register_health
+from predictions import register_predictions
+from seasonstore import SHARED_DATA
+from warmup import WARM_CACHE_ON_STARTUP, load_shared_data, start_background_warmup
 
 import warnings
 warnings.filterwarnings("ignore")
 
-cache = diskcache.Cache("./cache")
-background_callback_manager = DiskcacheManager(cache)
-
 app = Dash(
     __name__, 
     external_stylesheets=[dbc.themes.CYBORG], 
@@ -26,6 +26,10 @@ app._favicon = "favicon.ico"
 
 server=app.server
 
+register_metrics(server)
+register_health(server)
+register_predictions(server)
+
 Navigation_options = [
     dbc.NavLink("Home", href = "/", active = "exact"),
     dbc.NavLink("Exploratory Analysis", href = "/eda", active = "exact"),
@@ -113,6 +117,15 @@ clientside_callback(
     Input('url', 'href')
 )
 
+if SHARED_DATA:
+    load_shared_data()
+
+# A preloaded app is imported by the gunicorn master, which must not have
+# threads running when it forks the workers: they start the warmup from the
+# post_worker_init hook instead.
+if WARM_CACHE_ON_STARTUP and not SHARED_DATA:
+    start_background_warmup()
+
 if __name__ == '__main__':
     app.run_server(debug=True)
     #app.run_server(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
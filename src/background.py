@@ -0,0 +1,144 @@
+import os
+import uuid
+import threading
+
+from dash import DiskcacheManager
+
+from cache import cache, HOUR
+
+# Background callbacks run on a fixed pool of processes per gunicorn worker
+# instead of one new process per job, so a burst of slow figures queues up
+# rather than forking without bound.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# Finished results are kept this long and shared by every session asking
+# for the same figure; bump BACKGROUND_CACHE_VERSION to drop them all. A
+# callback wrapped in versioned() also keys them on the data version of its
+# inputs, so loading a race only drops the figures of that season.
+BACKGROUND_CACHE_TTL = int(os.getenv('BACKGROUND_CACHE_TTL', HOUR))
+BACKGROUND_CACHE_VERSION = os.getenv('BACKGROUND_CACHE_VERSION', '1')
+
+QUEUED = 'queued'
+CANCELLED = 'cancelled'
+# A job that never reported back (its worker died) is forgotten after this
+JOB_TTL = 10 * 60
+
+
+def _job_key(job):
+    return f'background-job-{job}'
+
+def versioned(version):
+    # version gets the callback's inputs and returns the data version its
+    # figures are built from, e.g. season_version of the selected season
+    def decorator(func):
+        func.cache_version = version
+        return func
+    return decorator
+
+def _kill(pid):
+    import psutil
+
+    try:
+        process = psutil.Process(pid)
+        for child in process.children(recursive=True):
+            child.kill()
+        process.kill()
+    except psutil.NoSuchProcess:
+        pass
+
+def _run_job(handle, job, job_fn, *job_args):
+    # The job state lives in the cache, not in this process: the request
+    # polling for the result may be served by another gunicorn worker.
+    with handle.transact():
+        if handle.get(_job_key(job)) != QUEUED:
+            # Cancelled while it was waiting for a free process
+            return
+        handle.set(_job_key(job), (os.getpid(), job_args[0]), expire=JOB_TTL)
+
+    try:
+        job_fn(*job_args)
+    finally:
+        with handle.transact():
+            handle.delete(_job_key(job))
+
+
+class PooledDiskcacheManager(DiskcacheManager):
+    def __init__(self, cache=None, workers=BACKGROUND_WORKERS, cache_by=None, expire=None):
+        super().__init__(cache, cache_by=cache_by, expire=expire)
+        self.workers = workers
+
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    def after_fork(self):
+        # Forked while another thread held the lock; the pid check below
+        # replaces the parent's pool
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created in the worker that runs the first job; a forked child
+        # doesn't inherit the pool's threads, it starts its own.
+        from multiprocess import Pool
+
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = Pool(processes=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore):
+        key = super().build_cache_key(fn, args, cache_args_to_ignore)
+        version = getattr(fn, 'cache_version', None)
+        if version is None:
+            return key
+        inputs = args.values() if isinstance(args, dict) else args
+        return f'{key}-{version(*inputs)}'
+
+    def call_job_fn(self, key, job_fn, args, context):
+        job = uuid.uuid4().hex
+
+        # Someone already built this figure: the poll picks the result up
+        # from the cache without running anything.
+        if self.cache_by is not None and self.result_ready(key):
+            return job
+
+        self.handle.set(_job_key(job), QUEUED, expire=JOB_TTL)
+        self._get_pool().apply_async(
+            _run_job, (self.handle, job, job_fn, key, self._make_progress_key(key), args, context)
+        )
+        return job
+
+    def job_running(self, job):
+        if not job:
+            return False
+        return self.handle.get(_job_key(job)) not in (None, CANCELLED)
+
+    def terminate_job(self, job):
+        if not job:
+            return
+
+        # Under the transaction a running job can't finish and hand its
+        # process to the next job before it is killed. The pool replaces
+        # the killed process.
+        with self.handle.transact():
+            state = self.handle.get(_job_key(job))
+            if state is None or state == CANCELLED:
+                return
+            if isinstance(state, tuple):
+                pid, key = state
+                # Done but for the bookkeeping: its result is shared with
+                # every later request for the figure, and the process with
+                # the next job
+                if self.result_ready(key):
+                    return
+            self.handle.set(_job_key(job), CANCELLED, expire=JOB_TTL)
+            if isinstance(state, tuple):
+                _kill(pid)
+
+
+background_callback_manager = PooledDiskcacheManager(
+    cache,
+    cache_by=[lambda: BACKGROUND_CACHE_VERSION],
+    expire=BACKGROUND_CACHE_TTL
+)
+os.register_at_fork(after_in_child=background_callback_manager.after_fork)
@@ -0,0 +1,97 @@
+import time
+import argparse
+import statistics
+
+from db import fetch_df, fetch_many, capture_queries, FANOUT_WORKERS
+from edafunctions import get_seasons, get_season_bundle
+from modelsfunctions import get_season_inputs
+
+# The three queries get_constructor_info used to run one after another on a
+# single cursor, before it was derived from the season bundle.
+CONSTRUCTOR_INFO_QUERIES = [
+    """
+        SELECT
+            c.name, max(r.fastestlapspeed) AS speed, c.url
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN constructors c ON r.constructorid = c.constructorid
+        WHERE ra.year = %s
+        GROUP BY r.raceid, c.name, c.url
+        ORDER BY speed DESC
+        LIMIT 1;
+    """,
+    """
+        SELECT
+            c.name, sum(r.position) AS wins, c.url
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN constructors c ON r.constructorid = c.constructorid
+        WHERE ra.year = %s AND r.position = 1
+        GROUP BY c.name, c.url
+        ORDER BY wins DESC
+        LIMIT 1;
+    """,
+    """
+        SELECT
+            c.name, count(s.status_category) AS problems, c.url
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN constructors c ON r.constructorid = c.constructorid
+        JOIN categorize_status() s ON r.statusid = s.statusid
+        WHERE ra.year = %s AND NOT s.status_category IN ('Finished', 'Not finished')
+        GROUP BY c.name, c.url
+        ORDER BY problems DESC
+        LIMIT 1;
+    """,
+]
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), min(timings)
+
+def cases(year):
+    constructor_info = [(query, (year,)) for query in CONSTRUCTOR_INFO_QUERIES]
+
+    with capture_queries() as season_inputs:
+        get_season_inputs.__wrapped__(year)
+
+    # The undecorated functions, so every run goes to the database
+    return [
+        ('get_constructor_info, sequential', lambda: [fetch_df(*query) for query in constructor_info]),
+        ('get_constructor_info, fetch_many', lambda: fetch_many(constructor_info)),
+        ('get_constructor_info, season bundle', lambda: get_season_bundle.__wrapped__(year)['constructor_info']),
+        ('get_season_inputs, sequential', lambda: [fetch_df(*query) for query in season_inputs]),
+        ('get_season_inputs, fetch_many', lambda: get_season_inputs.__wrapped__(year)),
+    ]
+
+def run(year=None, repeat=5):
+    if year is None:
+        year = int(get_seasons()['year'].max())
+
+    print(f'Season {year}, {repeat} runs, {FANOUT_WORKERS} fan-out workers')
+    print(f'{"Case":<40} {"Median (ms)":>12} {"Best (ms)":>12}')
+
+    results = {}
+    for name, func in cases(year):
+        # One untimed run so every case starts with warm connections
+        func()
+        median, best = timeit(func, repeat)
+        results[name] = median
+        print(f'{name:<40} {median * 1000:>12.2f} {best * 1000:>12.2f}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sequential vs concurrent execution of the multi-query data functions')
+    parser.add_argument('--season', type=int, help='Season the queries are run for (latest by default)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+
+    args = parser.parse_args()
+
+    run(args.season, args.repeat)
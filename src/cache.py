@@ -0,0 +1,88 @@
+import os
+import time
+from functools import wraps
+
+import diskcache
+import numpy as np
+
+from metrics import observe_data_function, cache_requests
+
+CACHE_DIR = os.getenv('CACHE_DIR', './cache')
+CACHE_SIZE_LIMIT = int(os.getenv('CACHE_SIZE_LIMIT', 512 * 2 ** 20))
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# One cache directory shared by every gunicorn worker (and by Dash's
+# background callback manager); diskcache handles the cross-process locking.
+# Evicting by store time keeps reads read-only: least-recently-used writes
+# the access time on every hit, and every process would queue for the write
+# lock. The TTLs and the size limit bound the cache anyway.
+cache = diskcache.Cache(
+    CACHE_DIR,
+    size_limit=CACHE_SIZE_LIMIT,
+    eviction_policy='least-recently-stored',
+    tag_index=True
+)
+
+_MISSING = object()
+
+
+def _normalize(value):
+    # Dash hands back numpy scalars from DataFrames; make them hash like the
+    # plain Python values used everywhere else so both share one entry.
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def memoize(ttl=None, name=None, version=None):
+    # version is called with the function's arguments; its result goes into
+    # the key, so a new data version misses instead of serving stale entries.
+    def decorator(func):
+        prefix = name or f'{func.__module__}.{func.__qualname__}'
+
+        def make_key(args, kwargs):
+            key = (prefix,) + tuple(_normalize(arg) for arg in args)
+            if kwargs:
+                key += tuple(sorted((k, _normalize(v)) for k, v in kwargs.items()))
+            if version is not None:
+                key += (('version', version(*args, **kwargs)),)
+            return key
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+
+            start = time.perf_counter()
+            value = cache.get(key, default=_MISSING, retry=True)
+            if value is not _MISSING:
+                observe_data_function(func.__name__, time.perf_counter() - start, value, hit=True)
+                return value
+
+            value = func(*args, **kwargs)
+            cache.set(key, value, expire=ttl, tag=prefix, retry=True)
+            observe_data_function(func.__name__, time.perf_counter() - start, value, hit=False)
+            return value
+
+        wrapper.cache_name = prefix
+        wrapper.cache_clear = lambda: cache.evict(prefix, retry=True)
+        wrapper.cache_stats = lambda: cache_stats().get(func.__name__, {'hits': 0, 'misses': 0})
+        wrapper.is_cached = lambda *args, **kwargs: make_key(args, kwargs) in cache
+        return wrapper
+
+    return decorator
+
+def cache_stats():
+    # From the Prometheus counters, so every worker's lookups are counted
+    # whichever worker asks
+    return cache_requests()
+
+def cache_info():
+    return {
+        'directory': cache.directory,
+        'size_limit': CACHE_SIZE_LIMIT,
+        'volume': cache.volume(),
+        'entries': len(cache),
+        'functions': cache_stats(),
+    }
@@ -0,0 +1,201 @@
+import os
+import time
+import argparse
+import threading
+
+from db import DATA_BACKEND, get_connection, fetch_df
+
+# Every season has a version in the database that moves whenever its rows
+# change. Cache keys include it, so loading a race only orphans the entries
+# of that season (and of the cross-season queries covering it); the old
+# entries age out of the diskcache on their own.
+DATA_VERSION_TTL = float(os.getenv('DATA_VERSION_TTL', 30))
+
+# Creating a trigger locks its table against the dashboard's reads, and
+# queues behind any open one: give up rather than hold every reader up
+DDL_LOCK_TIMEOUT = os.getenv('DDL_LOCK_TIMEOUT', '5s')
+
+# Tables keyed by raceid whose changes bump the season of the race
+RACE_TABLES = ['results', 'lap_times', 'pit_stops']
+
+CREATE_TABLE = """
+    CREATE SEQUENCE IF NOT EXISTS data_version_seq;
+
+    CREATE TABLE IF NOT EXISTS data_version (
+        year integer PRIMARY KEY,
+        version bigint NOT NULL,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+
+    INSERT INTO data_version (year, version)
+    SELECT year, nextval('data_version_seq') FROM seasons
+    ON CONFLICT (year) DO NOTHING;
+"""
+
+# Statement level, so a bulk load bumps each season once. The versions come
+# from one sequence: the newest version of a set of seasons also moves when
+# any of them changes.
+CREATE_FUNCTIONS = """
+    CREATE OR REPLACE FUNCTION bump_data_version_by_race() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO data_version (year, version, updated_at)
+        SELECT y.year, nextval('data_version_seq'), now()
+        FROM (
+            SELECT DISTINCT ra.year
+            FROM changed_rows c
+            JOIN races ra ON c.raceid = ra.raceid
+        ) AS y
+        ON CONFLICT (year) DO UPDATE SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION bump_data_version_by_year() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO data_version (year, version, updated_at)
+        SELECT y.year, nextval('data_version_seq'), now()
+        FROM (SELECT DISTINCT year FROM changed_rows) AS y
+        ON CONFLICT (year) DO UPDATE SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+"""
+
+TRIGGER_EVENTS = [('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')]
+
+EXISTING_TRIGGERS = """
+    SELECT c.relname, t.tgname
+    FROM pg_trigger t
+    JOIN pg_class c ON t.tgrelid = c.oid
+    WHERE NOT t.tgisinternal AND c.relname = ANY(%s) AND pg_table_is_visible(c.oid);
+"""
+
+BUMP = """
+    INSERT INTO data_version (year, version, updated_at)
+    SELECT year, nextval('data_version_seq'), now()
+    FROM unnest(%s::integer[]) AS year
+    ON CONFLICT (year) DO UPDATE SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at;
+"""
+
+_versions = None
+_versions_at = 0
+_versions_lock = threading.Lock()
+_reported = False
+
+
+def _after_fork():
+    global _versions_lock
+
+    # Forked while another thread was refreshing the versions
+    _versions_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def _triggers():
+    tables = [(table, 'bump_data_version_by_race') for table in RACE_TABLES]
+    tables.append(('races', 'bump_data_version_by_year'))
+
+    for table, function in tables:
+        for event, transition in TRIGGER_EVENTS:
+            name = f'{table}_data_version_{event}'
+            yield table, name, f"""
+                CREATE TRIGGER {name}
+                AFTER {event.upper()} ON {table}
+                REFERENCING {transition} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+            """
+
+def create_data_versions():
+    # One-time setup: the functions are replaced in place, the triggers are
+    # only created where they are missing, so running it again takes no lock
+    # on the tables the dashboard reads
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SET LOCAL lock_timeout = %s;', (DDL_LOCK_TIMEOUT,))
+        cur.execute(CREATE_TABLE)
+        cur.execute(CREATE_FUNCTIONS)
+
+        triggers = list(_triggers())
+        cur.execute(EXISTING_TRIGGERS, (sorted({table for table, _, _ in triggers}),))
+        existing = set(cur.fetchall())
+        for table, name, statement in triggers:
+            if (table, name) not in existing:
+                cur.execute(statement)
+        conn.commit()
+        cur.close()
+
+def bump(cur, years):
+    # Runs in the caller's transaction, so the new version is visible
+    # together with the rows it describes
+    years = sorted({int(year) for year in years})
+    if years:
+        cur.execute(BUMP, (years,))
+    return years
+
+def get_versions():
+    global _versions, _versions_at, _reported
+
+    # The local snapshot never changes under a running app: every season
+    # stays at version 0
+    if DATA_BACKEND == 'local':
+        return {}
+
+    # One tiny query every DATA_VERSION_TTL seconds per process; a new race
+    # shows up at most that long after it is committed.
+    with _versions_lock:
+        if _versions is not None and time.monotonic() - _versions_at < DATA_VERSION_TTL:
+            return _versions
+
+        try:
+            records_data = fetch_df('SELECT year, version FROM data_version;')
+            _versions = dict(zip(records_data['year'].astype(int), records_data['version'].astype(int)))
+        except Exception as e:
+            # Not created yet: same as the local snapshot, until it is
+            if not _reported:
+                print('Error while reading the data versions', e)
+                _reported = True
+            _versions = {}
+        _versions_at = time.monotonic()
+        return _versions
+
+def season_version(year):
+    return get_versions().get(int(year), 0)
+
+def since_version(year):
+    # For results covering every season from year on
+    return max((version for season, version in get_versions().items() if season >= int(year)), default=0)
+
+def global_version():
+    return max(get_versions().values(), default=0)
+
+def clear_versions():
+    global _versions
+
+    with _versions_lock:
+        _versions = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-season data versions used in the cache keys')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('create', help='Create the version table and the triggers that bump it')
+
+    bump_parser = subparsers.add_parser('bump', help='Bump seasons by hand, dropping their cached results')
+    bump_parser.add_argument('seasons', type=int, nargs='+', help='Seasons to bump')
+
+    subparsers.add_parser('show', help='Print the current version of every season')
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        create_data_versions()
+    elif args.command == 'bump':
+        with get_connection() as conn:
+            cur = conn.cursor()
+            bump(cur, args.seasons)
+            conn.commit()
+            cur.close()
+    elif args.command == 'show':
+        for year, version in sorted(get_versions().items()):
+            print(f'{year}: {version}')
@@ -1,24 +1,9 @@
-import os
 import random
-from dotenv import load_dotenv
-import psycopg2 as psy
-from psycopg2 import Error
 
-import pandas as pd
-
-from functools import lru_cache
-
-load_dotenv()
-
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-def connection_db() -> psy.extensions.connection:
-    try:
-        conn = psy.connect(DATABASE_URL)
-        return conn
-    except (Exception, Error) as e:
-        print('Error while connecting to PostgreSQL', e)
-        return None
+from cache import memoize, HOUR, DAY
+from db import fetch_df
+from dataversion import season_version, since_version, global_version
+from seasonstore import get_bundle
 
 def random_color():
     r = random.randint(100, 255)
@@ -33,451 +18,213 @@ def convert_milliseconds(ms):
     horas, minutos = divmod(minutos, 60)
     return f"{horas}h {minutos} min {segundos} secs"
 
-@lru_cache(maxsize=None)
+@memoize(ttl=DAY, version=global_version)
 def get_seasons():
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
+    records_data = fetch_df(
         """
             SELECT * FROM seasons;
         """
     )
 
-    records = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-
     return records_data
 
-
-@lru_cache(maxsize=None)
-def get_map_data(year):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
+@memoize(ttl=DAY, version=global_version)
+def get_result_seasons():
+    # A new season's races are loaded before any of them is run; the page
+    # only offers seasons with results to show
+    records_data = fetch_df(
+        """
+            SELECT DISTINCT year FROM summary_result_status ORDER BY year DESC;
         """
-            SELECT 
-                r.year, r.name AS race_name,
-                c.lat AS circuit_lat, c.lng AS circuit_lng, c.country as circuit_country,
-                re.milliseconds AS race_time_in_milliseconds,
-                MAX(re.fastestlapspeed) AS fastest_lap_speed
-            FROM races AS r
-            JOIN circuits AS c ON r.circuitId = c.circuitId
-            JOIN (
-                SELECT raceId, milliseconds, fastestlapspeed
-                FROM results
-                WHERE positionOrder = 1
-            ) AS re ON r.raceId = re.raceId
-            LEFT JOIN (
-                SELECT raceId, MIN(milliseconds) AS milliseconds
-                FROM lap_times
-                GROUP BY raceId
-            ) AS l ON r.raceId = l.raceId
-            WHERE r.year = %s
-            GROUP BY r.year, race_name, circuit_lat, circuit_lng, circuit_country, race_time_in_milliseconds;
-        """, (year,)
     )
-    
-    records = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-    records_data = records_data.sort_values(by='year', ascending=True)
 
     return records_data
 
-@lru_cache(maxsize=None)
-def get_constructors_data(year):
-    conn = connection_db()
-    cur = conn.cursor()
 
-    cur.execute(
+@memoize(ttl=6 * HOUR, version=season_version)
+def get_season_bundle(year):
+    results = fetch_df(
         """
-            SELECT 
-                race_name, 
-                constructor_name, 
-                SUM(total_points) OVER(PARTITION BY constructor_name ORDER BY race_date) AS total_points
-            FROM (
-                SELECT 
-                    r.name as race_name, 
-                    c.name AS constructor_name, 
-                    SUM(rs.points) AS total_points,
-                    r.date as race_date
-                FROM constructors c
-                JOIN results rs ON c.constructorid = rs.constructorid
-                JOIN races r ON rs.raceid = r.raceid
-                WHERE r.year = %s
-                GROUP BY r.name, c.name, r.date
-            ) AS subquery
-            ORDER BY race_date ASC, total_points DESC;
+            SELECT
+                ra.year, ra.raceid, ra.race_name, ra.race_date,
+                ra.circuit_lat, ra.circuit_lng, ra.circuit_country,
+                ra.winner_driverid, ra.winner_milliseconds, ra.winner_fastestlapspeed,
+                c.name AS constructor_name, c.url AS constructor_url,
+                r.driverid, d.surname,
+                r.position, r.positionorder, r.points, r.milliseconds, r.fastestlapspeed,
+                s.status_category
+            FROM results r
+            JOIN summary_race ra ON r.raceid = ra.raceid
+            JOIN constructors c ON r.constructorid = c.constructorid
+            JOIN drivers d ON r.driverid = d.driverid
+            LEFT JOIN summary_result_status s ON r.resultid = s.resultid
+            WHERE ra.year = %s
+            ORDER BY ra.race_date, r.positionorder;
         """, (year,)
     )
 
-    records = cur.fetchall()
-    cur.close()
-    conn.close()
+    return {
+        'results': results,
+        'map': _map_view(results),
+        'constructors': _constructors_view(results),
+        'constructor_info': _constructor_info_view(results),
+        'constructor_names': _constructor_names_view(results),
+    }
+
+def _season_bundle(year):
+    # Memory-mapped Arrow copy when the seasons were preloaded (SHARED_DATA=1),
+    # as long as the season hasn't changed since it was exported
+    bundle = get_bundle(int(year), season_version(year))
+    if bundle is None:
+        bundle = get_season_bundle(int(year))
+    return bundle
+
+def _constructor_results(year, constructor):
+    results = _season_bundle(year)['results']
+    return results[results['constructor_name'] == constructor]
+
+def _status_problems(results, by):
+    results = results[results['status_category'].notna()]
+    records_data = results.groupby(by + ['status_category']).size().reset_index(name='problems')
+    records_data = records_data.rename(columns={'status_category': 'status'})
+    return records_data.sort_values(by='problems', ascending=False, kind='stable').reset_index(drop=True)
+
+def _map_view(results):
+    races = results.drop_duplicates(subset='raceid')
+    races = races[races['winner_driverid'].notna()]
+
+    records_data = races[[
+        'year', 'race_name', 'circuit_lat', 'circuit_lng', 'circuit_country',
+        'winner_milliseconds', 'winner_fastestlapspeed'
+    ]].rename(columns={
+        'winner_milliseconds': 'race_time_in_milliseconds',
+        'winner_fastestlapspeed': 'fastest_lap_speed'
+    }).reset_index(drop=True)
+    # Races without a classified time leave NULLs, which turns the column into floats
+    records_data['race_time_in_milliseconds'] = records_data['race_time_in_milliseconds'].astype('Int64')
 
-    records_data = pd.DataFrame(records)
+    return records_data
 
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+def _constructors_view(results):
+    records_data = results.groupby(['race_name', 'constructor_name', 'race_date'], as_index=False)['points'].sum()
+    records_data = records_data.sort_values(by='race_date', kind='stable')
+    records_data['total_points'] = records_data.groupby('constructor_name')['points'].cumsum()
+    records_data = records_data.sort_values(by=['race_date', 'total_points'], ascending=[True, False], kind='stable')
+    records_data = records_data[['race_name', 'constructor_name', 'total_points']].reset_index(drop=True)
 
-    records_data.columns = columns
     records_data['race_name'] = records_data['race_name'].str.replace('Grand Prix', 'GP')
     records_data['total_points'] = records_data['total_points'].astype(int)
 
     return records_data
 
-@lru_cache(maxsize=None)
-def get_sankey_data(year):
-    conn = connection_db()
-    cur = conn.cursor()
-    
-    cur.execute(
-        """
-            SELECT 
-                c.constructorid, c.constructorref, c.name, c.nationality,
-                d.surname, SUM(r.points) AS total_points
-            FROM constructors c
-            JOIN constructor_results ON c.constructorId = constructor_results.constructorId
-            JOIN races ON constructor_results.raceId = races.raceId
-            JOIN results as r ON constructor_results.raceId = r.raceId AND constructor_results.constructorId = r.constructorId AND r.points > 0
-            JOIN drivers as d ON r.driverid = d.driverid
-            WHERE races.year >= %s
-            GROUP BY c.constructorid, c.constructorref, c.name, c.nationality, d.surname
-            ORDER BY total_points DESC
-            LIMIT 20;
-        """, (year,)
-    )
-
-    records = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    return records
-
-@lru_cache(maxsize=None)
-def get_constructor_info(year):
-    conn = connection_db()
-    cur = conn.cursor()
-    
-    year = str(year)
-    
-    cur.execute(
-        """
-            select 
-                c.name, max(r.fastestlapspeed) as speed, c.url
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join constructors c on r.constructorid = c.constructorid
-            WHERE ra.year = %s
-            GROUP BY r.raceid, c.name, c.url
-            ORDER BY speed desc
-            LIMIT 1;
-        """, (year,)
-    )
+def _constructor_info_view(results):
+    columns = {'constructor_name': 'name', 'constructor_url': 'url'}
 
-    records = cur.fetchall()    
-    records_data = pd.DataFrame(records)
+    fastest = results.groupby(['raceid', 'constructor_name', 'constructor_url'])['fastestlapspeed'].max().reset_index(name='speed')
+    # Postgres sorts NULLs first on DESC, keep the same pick as the old query
+    fastest = fastest.sort_values(by='speed', ascending=False, na_position='first').head(1)
+    fastest = fastest.rename(columns=columns)[['name', 'speed', 'url']].reset_index(drop=True)
 
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+    wins = results[results['position'] == 1]
+    wins = wins.groupby(['constructor_name', 'constructor_url'])['position'].sum().reset_index(name='wins')
+    wins = wins.sort_values(by='wins', ascending=False).head(1)
+    wins = wins.rename(columns=columns)[['name', 'wins', 'url']].reset_index(drop=True)
 
-    records_data.columns = columns
+    problems = results[results['status_category'].notna() & ~results['status_category'].isin(['Finished', 'Not finished'])]
+    problems = problems.groupby(['constructor_name', 'constructor_url']).size().reset_index(name='problems')
+    problems = problems.sort_values(by='problems', ascending=False).head(1)
+    problems = problems.rename(columns=columns)[['name', 'problems', 'url']].reset_index(drop=True)
 
-    cur.execute(
-        """
-            select 
-                c.name, sum(r.position) as wins, c.url
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join constructors c on r.constructorid = c.constructorid
-            WHERE ra.year = %s and r.position = 1
-            GROUP BY c.name, c.url
-            ORDER BY wins desc
-            LIMIT 1;
-        """, (year,)
-    )
+    return fastest, wins, problems
 
-    records = cur.fetchall()
-    records_data2 = pd.DataFrame(records)
+def _constructor_names_view(results):
+    records_data = results.drop_duplicates(subset=['constructor_name', 'constructor_url'])
+    return records_data[['constructor_name']].rename(columns={'constructor_name': 'name'}).reset_index(drop=True)
 
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+def get_map_data(year):
+    return _season_bundle(year)['map']
 
-    records_data2.columns = columns
+def get_constructors_data(year):
+    return _season_bundle(year)['constructors']
 
-    cur.execute(
-        """
-            select 
-                c.name, count(s.status_category) as problems, c.url
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join constructors c on r.constructorid = c.constructorid
-            join categorize_status() s on r.statusid = s.statusid
-            WHERE ra.year = %s and not s.status_category in ('Finished', 'Not finished')
-            GROUP BY c.name, c.url
-            ORDER BY problems DESC
-            LIMIT 1;
+@memoize(ttl=6 * HOUR, version=since_version)
+def get_sankey_data(year):
+    records_data = fetch_df(
+        """
+            SELECT
+                constructorid, constructorref, constructor_name AS name, constructor_nationality AS nationality,
+                surname, SUM(points) AS total_points
+            FROM summary_season_driver
+            WHERE year >= %s AND points > 0
+            GROUP BY constructorid, constructorref, constructor_name, constructor_nationality, surname
+            ORDER BY total_points DESC
+            LIMIT 20;
         """, (year,)
     )
 
-    records = cur.fetchall()
-    records_data3 = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data3.columns = columns
-
-    cur.close()
-    conn.close()
+    return records_data
 
-    return records_data, records_data2, records_data3
+def get_constructor_info(year):
+    return _season_bundle(year)['constructor_info']
 
-@lru_cache(maxsize=None)
 def get_constructor_status_info(value, constructor):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-           select 
-                c.name, s.status_category as status, count(s.status_category) as problems, c.url
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join constructors c on r.constructorid = c.constructorid
-            join categorize_status() s on r.statusid = s.statusid
-            WHERE ra.year = %s and c.name = %s
-            GROUP BY c.name, c.url, s.status_category
-            ORDER BY problems DESC;
-        """, (value, constructor)
-    )
-
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
+    records_data = _status_problems(_constructor_results(value, constructor), ['constructor_name', 'constructor_url'])
+    records_data = records_data.rename(columns={'constructor_name': 'name', 'constructor_url': 'url'})
 
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+    return records_data[['name', 'status', 'problems', 'url']]
 
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
-
-    return records_data
-
-@lru_cache(maxsize=None)
 def get_constructor_stats_names(value):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-            SELECT 
-                c.name
-            FROM results r
-            JOIN races ra ON r.raceid = ra.raceid
-            JOIN constructors c ON r.constructorid = c.constructorid
-            WHERE ra.year = %s
-            GROUP BY c.name, c.url;
-        """, (value,)
-    )
-
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
+    return _season_bundle(value)['constructor_names']
 
-    return records_data
-
-@lru_cache(maxsize=None)
 def get_constructor_stats_info(value, constructor):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-            SELECT 
-                c.name, c.url,
-                COUNT(DISTINCT r.driverid) AS total_drivers, 
-                MAX(r.fastestlapspeed) AS max_speed, 
-                SUM(r.points) AS total_points,
-                SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS total_wins
-            FROM results r
-            JOIN races ra ON r.raceid = ra.raceid
-            JOIN constructors c ON r.constructorid = c.constructorid
-            WHERE ra.year = %s and c.name = %s
-            GROUP BY c.name, c.url;
-        """, (value, constructor)
-    )
+    results = _constructor_results(value, constructor)
 
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
+    records_data = results.groupby(['constructor_name', 'constructor_url']).agg(
+        total_drivers=('driverid', 'nunique'),
+        max_speed=('fastestlapspeed', 'max'),
+        total_points=('points', 'sum'),
+        total_wins=('position', lambda position: (position == 1).sum())
+    ).reset_index()
+    records_data = records_data.rename(columns={'constructor_name': 'name', 'constructor_url': 'url'})
 
     return records_data
 
-@lru_cache(maxsize=None)
 def get_constructor_stats_table(value, constructor):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-            SELECT 
-                d.surname, 
-                MAX(r.fastestlapspeed) AS max_speed, 
-                SUM(r.points) AS total_points,
-                SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS total_wins
-            FROM results r
-            JOIN races ra ON r.raceid = ra.raceid
-            JOIN constructors c ON r.constructorid = c.constructorid
-            JOIN drivers d on r.driverid = d.driverid
-            WHERE ra.year = %s and c.name = %s
-            GROUP BY  d.surname;
-        """, (value, constructor)
-    )
-
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+    results = _constructor_results(value, constructor)
 
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
+    records_data = results.groupby('surname').agg(
+        max_speed=('fastestlapspeed', 'max'),
+        total_points=('points', 'sum'),
+        total_wins=('position', lambda position: (position == 1).sum())
+    ).reset_index()
 
     return records_data
 
-@lru_cache(maxsize=None)
+# Whole careers: any season can change the points of these drivers
+@memoize(ttl=6 * HOUR, version=lambda constructor_name, year: global_version())
 def get_driver_age_point_distribution_data(constructor_name, year):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute("DROP TABLE IF EXISTS filtered_results;")
-    conn.commit()
-
-    cur.execute(
-        """
-            CREATE TEMP TABLE filtered_results AS
-            SELECT 
-                d.driverid,
-                d.surname,
-                c.name AS constructor_name,
-                SUM(rs.points) AS total_points
-            FROM drivers d
-            JOIN results rs ON d.driverid = rs.driverid
-            JOIN races ra ON rs.raceid = ra.raceid
-            JOIN constructors c ON rs.constructorid = c.constructorid
-            WHERE ra.year = %s
-            AND c.name = %s
-            GROUP BY d.driverid, d.surname, c.name;
-        """, (year, constructor_name,)
-    )
-    conn.commit()
-
-    cur.execute(
-        """
-            SELECT 
-                DISTINCT d.surname as driver,
-                c.name as constructor,
-                (DATE_PART('year', ra.date) - DATE_PART('year', d.dob)) as age,
-                SUM(r.points) as points
-            FROM drivers d
-            JOIN results r ON d.driverid = r.driverid
-            JOIN races ra ON r.raceid = ra.raceid
-            JOIN constructors c ON r.constructorid = c.constructorid
-            WHERE d.surname IN (SELECT DISTINCT surname FROM filtered_results)
-            GROUP BY d.surname, age, constructor
+    records_data = fetch_df(
+        """
+            SELECT
+                DISTINCT s.surname as driver,
+                s.constructor_name as constructor,
+                (s.year - s.birth_year) as age,
+                SUM(s.points) as points
+            FROM summary_season_driver s
+            WHERE s.surname IN (
+                SELECT DISTINCT surname
+                FROM summary_season_driver
+                WHERE year = %s AND constructor_name = %s
+            )
+            GROUP BY s.surname, age, constructor
             ORDER BY age;
-        """
+        """, (year, constructor_name,)
     )
 
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
-
     return records_data
 
-@lru_cache(maxsize=None)
 def get_driver_status_info(value, constructor):
-    conn = connection_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-            select 
-                d.surname, s.status_category as status, count(s.status_category) as problems, c.url
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join constructors c on r.constructorid = c.constructorid
-            join categorize_status() s on r.statusid = s.statusid
-            join drivers d on r.driverid = d.driverid
-            WHERE ra.year = %s and c.name = %s
-            GROUP BY d.surname, c.url, s.status_category
-            ORDER BY problems DESC;
-        """, (value, constructor)
-    )
-
-    records = cur.fetchall()
-    records_data = pd.DataFrame(records)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    records_data.columns = columns
-
-    cur.close()
-    conn.close()
+    records_data = _status_problems(_constructor_results(value, constructor), ['surname', 'constructor_url'])
+    records_data = records_data.rename(columns={'constructor_url': 'url'})
 
-    return records_data
\ No newline at end of file
+    return records_data[['surname', 'status', 'problems', 'url']]
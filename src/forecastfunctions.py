@@ -0,0 +1,146 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import memoize, DAY
+from modelstore import MODELS_DIR
+
+# Constructors with a SARIMA model fitted in f1analysis/timeseries.qmd, on
+# the share of the points available each race (2010-present, 25 races a season)
+FORECAST_TEAMS = {
+    'ferrari': 'Ferrari',
+    'redbull': 'Red Bull',
+    'mercedes': 'Mercedes',
+    'mclaren': 'McLaren',
+    'williams': 'Williams',
+}
+FREQUENCY = 25
+FORECAST_HORIZON = int(os.getenv('FORECAST_HORIZON', 50))
+
+# Normal quantiles for the 80% and 95% intervals, as R's forecast() reports
+INTERVALS = {80: 1.2815515655446004, 95: 1.959963984540054}
+
+_models = {}
+_models_lock = threading.Lock()
+
+def _after_fork():
+    global _models_lock
+    _models_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _read_rds(path):
+    import rdata
+    return rdata.read_rds(path)
+
+def load_arima(team):
+    # saveRDS() output of R's arima(): the coefficients and the state space
+    # form with the Kalman state at the end of the training series.
+    if team not in _models:
+        with _models_lock:
+            if team not in _models:
+                fit = _read_rds(os.path.join(MODELS_DIR, f'{team}_model.rda'))
+                orders = _read_rds(os.path.join(MODELS_DIR, f'{team}_best_arima.rda'))
+                model = fit['model']
+                _models[team] = {
+                    'a': np.asarray(model['a'], dtype='float64'),
+                    'P': np.asarray(model['P'], dtype='float64'),
+                    'T': np.asarray(model['T'], dtype='float64'),
+                    'V': np.asarray(model['V'], dtype='float64'),
+                    'Z': np.asarray(model['Z'], dtype='float64'),
+                    'h': float(np.ravel(model['h'])[0]),
+                    'delta': len(model['Delta']),
+                    'sigma2': float(np.ravel(fit['sigma2'])[0]),
+                    'aic': float(np.ravel(fit['aic'])[0]),
+                    'nobs': int(np.ravel(fit['nobs'])[0]),
+                    'coef': np.asarray(fit['coef'], dtype='float64'),
+                    'order': [int(value) for value in orders['best_pdq']],
+                    'seasonal_order': [int(value) for value in orders['best_PDQ']],
+                }
+    return _models[team]
+
+def kalman_forecast(model, horizon):
+    # R's KalmanForecast(): predict the state forward, the variance grows by V
+    a, P, T, V, Z = model['a'], model['P'], model['T'], model['V'], model['Z']
+    mean = np.empty(horizon)
+    variance = np.empty(horizon)
+    for step in range(horizon):
+        a = T @ a
+        P = V + T @ P @ T.T
+        mean[step] = Z @ a
+        variance[step] = model['h'] + Z @ P @ Z
+    return mean, np.sqrt(variance * model['sigma2'])
+
+def kalman_update(model, observations):
+    # R's KalmanRun() carried on from the fitted state: every observation is
+    # predicted one step ahead, then filtered into the state. The coefficients
+    # stay fixed, as with Arima(model=) in pred_rolling, so nothing is refitted.
+    a, P, T, V, Z = model['a'], model['P'], model['T'], model['V'], model['Z']
+    predictions = np.empty(len(observations))
+    for step, y in enumerate(observations):
+        a = T @ a
+        P = V + T @ P @ T.T
+        predictions[step] = Z @ a
+        if np.isnan(y):
+            continue
+        M = P @ Z
+        gain = model['h'] + Z @ M
+        a = a + M * (y - predictions[step]) / gain
+        P = P - np.outer(M, M) / gain
+    return predictions, dict(model, a=a, P=P)
+
+@memoize(ttl=DAY)
+def get_history(team):
+    # The last observations, kept in the differencing part of the state
+    model = load_arima(team)
+    history = model['a'][-model['delta']:][::-1]
+    return pd.DataFrame({
+        'step': np.arange(-len(history) + 1, 1),
+        'value': history,
+    })
+
+@memoize(ttl=DAY)
+def get_forecast(team):
+    model = load_arima(team)
+    mean, se = kalman_forecast(model, FORECAST_HORIZON)
+
+    records_data = pd.DataFrame({
+        'step': np.arange(1, FORECAST_HORIZON + 1),
+        'mean': mean,
+        'se': se,
+    })
+    for level, z in INTERVALS.items():
+        records_data[f'lo{level}'] = mean - z * se
+        records_data[f'hi{level}'] = mean + z * se
+
+    return records_data
+
+def get_team_forecast(team, horizon=FREQUENCY):
+    return get_forecast(team).head(min(int(horizon), FORECAST_HORIZON))
+
+@memoize(ttl=DAY)
+def get_model_summary(team):
+    model = load_arima(team)
+    p, d, q = model['order']
+    P, D, Q = model['seasonal_order']
+    return {
+        'team': FORECAST_TEAMS[team],
+        'model': f'SARIMA({p},{d},{q})({P},{D},{Q})[{FREQUENCY}]',
+        'aic': model['aic'],
+        'sigma2': model['sigma2'],
+        'nobs': model['nobs'],
+    }
+
+def warm_forecasts():
+    errors = []
+    for team in FORECAST_TEAMS:
+        try:
+            get_forecast(team)
+            get_history(team)
+            get_model_summary(team)
+        except Exception as e:
+            errors.append(f'{team}: {e}')
+    return errors
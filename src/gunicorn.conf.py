@@ -0,0 +1,39 @@
+import os
+import shutil
+
+# prometheus_client reads this when it's first imported, so it has to be set
+# here, before the workers load the app.
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/f1dashboard-prometheus')
+
+# SHARED_DATA=1: import the app in the master, which maps the Arrow season
+# files and loads the models once; the workers inherit them copy-on-write.
+preload_app = os.getenv('SHARED_DATA', '0') == '1'
+
+
+def on_starting(server):
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+def post_worker_init(worker):
+    import db
+
+    # Open DB_POOL_MIN_SIZE connections before the first request needs one
+    if db.DATA_BACKEND != 'local':
+        try:
+            db.db_pool.warm()
+        except Exception as e:
+            print('Error while warming the connection pool', e)
+
+    # app.py leaves the warmup to the workers when the master imported it
+    if preload_app:
+        from warmup import WARM_CACHE_ON_STARTUP, start_background_warmup
+        if WARM_CACHE_ON_STARTUP:
+            start_background_warmup()
+
+def worker_exit(server, worker):
+    import db
+    db.db_pool.closeall()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
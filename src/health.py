@@ -0,0 +1,96 @@
+import os
+import time
+
+from flask import jsonify
+
+import db
+import warmup
+from modelstore import MODEL_NAMES, METRICS_SUFFIX, store
+
+READY_DB_TIMEOUT = float(os.getenv('READY_DB_TIMEOUT', 2))
+
+
+def check_database():
+    if db.DATA_BACKEND == 'local':
+        import localstore
+        try:
+            localstore.get_cursor().execute('SELECT 1;').fetchall()
+        except Exception as e:
+            return False, {'backend': 'local', 'error': str(e)}
+        return True, {'backend': 'local', 'data_dir': localstore.LOCAL_DATA_DIR}
+
+    try:
+        with db.get_connection(timeout=READY_DB_TIMEOUT) as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT 1;')
+            cur.close()
+    except Exception as e:
+        return False, {'backend': 'postgres', 'pool': db.pool_stats(), 'error': str(e)}
+
+    return True, {'backend': 'postgres', 'pool': db.pool_stats()}
+
+def check_cache():
+    status = warmup.get_status()
+    if not warmup.WARM_CACHE_ON_STARTUP:
+        return True, dict(status, required=False)
+    # A failed warmup only leaves pages cold, they are still served
+    if status['state'] == 'failed':
+        return True, dict(status, degraded=True)
+    return status['state'] == 'done', dict(status, degraded=bool(status.get('failed')))
+
+def _model_state(name, loaded, manifest):
+    if any(filename.startswith(f'{name}.') for filename in loaded):
+        return 'loaded'
+    if store.exists(f'{name}.pkl') or store.exists(f'{name}{METRICS_SUFFIX}'):
+        return 'on disk'
+    # Only downloaded against a pinned checksum
+    return 'download' if store.download and f'{name}.pkl' in manifest else 'missing'
+
+def check_models():
+    # Reports what the store already has and never loads or downloads
+    # anything: a probe must stay fast and can't depend on GitHub. A model
+    # that can't be loaded only breaks its own tab.
+    loaded = store.loaded()
+    manifest = store.manifest()
+    models = {
+        name: {
+            'state': _model_state(name, loaded, manifest),
+            'verified': sorted(filename for filename in manifest if filename.startswith(f'{name}.')),
+        }
+        for name in MODEL_NAMES
+    }
+    missing = [name for name, model in models.items() if model['state'] == 'missing']
+    return True, dict(models, loaded=loaded, degraded=bool(missing))
+
+CHECKS = {
+    'database': check_database,
+    'cache': check_cache,
+    'models': check_models,
+}
+
+def readiness():
+    checks = {}
+    for name, check in CHECKS.items():
+        try:
+            ok, details = check()
+        except Exception as e:
+            ok, details = False, {'error': str(e)}
+        checks[name] = dict(details, ready=ok)
+
+    ready = all(check['ready'] for check in checks.values())
+    if ready and any(check.get('degraded') for check in checks.values()):
+        return 'degraded', checks
+    return 'ready' if ready else 'not ready', checks
+
+def register_health(server):
+    started = time.time()
+
+    # Liveness only: never touches the database or the cache
+    @server.route('/health')
+    def health_view():
+        return jsonify(status='ok', uptime=time.time() - started)
+
+    @server.route('/ready')
+    def ready_view():
+        status, checks = readiness()
+        return jsonify(status=status, checks=checks), 503 if status == 'not ready' else 200
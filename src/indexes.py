@@ -0,0 +1,208 @@
+import sys
+import json
+import time
+import argparse
+
+from db import get_connection, capture_queries
+from summaries import SUMMARIES
+from edafunctions import get_result_seasons, get_season_bundle, get_sankey_data, get_constructor_stats_names, get_driver_age_point_distribution_data
+from modelsfunctions import get_season_inputs
+
+# Indexes the dashboard queries rely on: everything filters races by year
+# and joins results back on raceid/constructorid/driverid.
+INDEXES = [
+    ('races_year_idx', 'races', ['year']),
+    ('races_circuitid_idx', 'races', ['circuitid']),
+    ('results_raceid_idx', 'results', ['raceid']),
+    ('results_raceid_positionorder_idx', 'results', ['raceid', 'positionorder']),
+    ('results_constructorid_idx', 'results', ['constructorid']),
+    ('results_driverid_idx', 'results', ['driverid']),
+    ('results_statusid_idx', 'results', ['statusid']),
+    ('lap_times_raceid_idx', 'lap_times', ['raceid']),
+    ('pit_stops_raceid_idx', 'pit_stops', ['raceid']),
+    ('constructor_results_raceid_constructorid_idx', 'constructor_results', ['raceid', 'constructorid']),
+]
+
+# Sequential scans on these tables are flagged in the report
+WATCHED_TABLES = {'results', 'lap_times', 'pit_stops'}
+
+REPORT_FILE = 'index_report.md'
+
+# Every index on a table with its key columns in order. Only a valid, plain
+# btree index can stand in for one of ours: a failed CREATE INDEX
+# CONCURRENTLY leaves an INVALID index behind that the planner never uses.
+TABLE_INDEXES = """
+    SELECT
+        i.relname,
+        ix.indisvalid AND ix.indpred IS NULL AND am.amname = 'btree' AS usable,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+            LEFT JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+            ORDER BY k.n
+        ) AS columns
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_am am ON am.oid = i.relam
+    WHERE ix.indrelid = %s::regclass;
+"""
+
+
+def apply_indexes():
+    created = []
+    with get_connection() as conn:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block, and
+        # doesn't block the dashboard's reads while it builds.
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            for name, table, columns in INDEXES:
+                cur.execute(TABLE_INDEXES, (table,))
+                existing = cur.fetchall()
+
+                # Whatever its name, an index starting with these columns
+                # serves the same lookups (the primary key often does)
+                covering = [index for index, usable, indexed in existing if usable and indexed[:len(columns)] == columns]
+                if covering:
+                    if name not in covering:
+                        print(f'{name} skipped, {covering[0]} covers {table} ({", ".join(columns)})')
+                    continue
+
+                start = time.perf_counter()
+                if any(index == name for index, _, _ in existing):
+                    cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name};')
+                    print(f'{name} exists but is invalid, rebuilding it')
+                cur.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({", ".join(columns)});')
+                created.append(name)
+                print(f'{name} created in {time.perf_counter() - start:.2f}s')
+            cur.close()
+        finally:
+            conn.autocommit = False
+
+    return created
+
+def registered_queries(year=None):
+    if year is None:
+        year = int(get_result_seasons()['year'].max())
+    constructor = get_constructor_stats_names(year)['name'][0]
+
+    # The undecorated functions, so the queries run even if the cache is warm
+    calls = [
+        ('get_season_bundle', get_season_bundle, (year,)),
+        ('get_sankey_data', get_sankey_data, (year,)),
+        ('get_driver_age_point_distribution_data', get_driver_age_point_distribution_data, (constructor, year)),
+        ('get_season_inputs', get_season_inputs, (year,)),
+    ]
+
+    queries = []
+    for name, func, args in calls:
+        with capture_queries() as captured:
+            func.__wrapped__(*args)
+        for i, (query, params) in enumerate(captured):
+            queries.append((name if len(captured) == 1 else f'{name}[{i}]', query, params))
+
+    for name, query in SUMMARIES.items():
+        queries.append((f'summaries.{name}', query, {'year': year}))
+
+    return queries
+
+def _walk_plan(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _walk_plan(child)
+
+def explain(query, params=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.strip().rstrip(";")}', params)
+        result = cur.fetchone()[0]
+        cur.close()
+
+    if isinstance(result, str):
+        result = json.loads(result)
+    result = result[0]
+
+    seq_scans = sorted({
+        node['Relation Name'] for node in _walk_plan(result['Plan'])
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in WATCHED_TABLES
+    })
+
+    return {
+        'execution_time': result['Execution Time'],
+        'planning_time': result['Planning Time'],
+        'shared_hit_blocks': result['Plan'].get('Shared Hit Blocks', 0),
+        'shared_read_blocks': result['Plan'].get('Shared Read Blocks', 0),
+        'seq_scans': seq_scans,
+    }
+
+def explain_all(queries):
+    return {name: explain(query, params) for name, query, params in queries}
+
+def write_report(before, after=None, path=REPORT_FILE):
+    lines = ['# Index report', '']
+    if after is None:
+        lines += [
+            '| Query | Time (ms) | Buffers hit/read | Seq scans |',
+            '| --- | ---: | ---: | --- |',
+        ]
+        for name, stats in before.items():
+            lines.append(
+                f"| {name} | {stats['execution_time']:.2f} | {stats['shared_hit_blocks']}/{stats['shared_read_blocks']} "
+                f"| {', '.join(stats['seq_scans']) or '-'} |"
+            )
+    else:
+        lines += [
+            '| Query | Before (ms) | After (ms) | Speedup | Seq scans before | Seq scans after |',
+            '| --- | ---: | ---: | ---: | --- | --- |',
+        ]
+        for name, stats in before.items():
+            new = after[name]
+            speedup = stats['execution_time'] / new['execution_time'] if new['execution_time'] else float('inf')
+            lines.append(
+                f"| {name} | {stats['execution_time']:.2f} | {new['execution_time']:.2f} | {speedup:.1f}x "
+                f"| {', '.join(stats['seq_scans']) or '-'} | {', '.join(new['seq_scans']) or '-'} |"
+            )
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    print(f'Report written to {path}')
+
+def _flagged(results):
+    return {name: stats['seq_scans'] for name, stats in results.items() if stats['seq_scans']}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Indexes for the Ergast tables the dashboard queries')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('apply', help='Create the missing indexes')
+
+    for command, help_text in [
+        ('check', 'EXPLAIN every registered query and flag sequential scans'),
+        ('report', 'Time every query, apply the indexes, time them again'),
+    ]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument('--season', type=int, help='Season the queries are run for (latest by default)')
+        command_parser.add_argument('--out', default=REPORT_FILE, help='Report file')
+
+    args = parser.parse_args()
+
+    if args.command == 'apply':
+        apply_indexes()
+    else:
+        queries = registered_queries(args.season)
+        before = explain_all(queries)
+
+        after = None
+        if args.command == 'report':
+            apply_indexes()
+            after = explain_all(queries)
+
+        write_report(before, after, args.out)
+
+        flagged = _flagged(after or before)
+        for name, tables in flagged.items():
+            print(f'Sequential scan in {name}: {", ".join(tables)}')
+        if args.command == 'check' and flagged:
+            sys.exit(1)
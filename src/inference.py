@@ -0,0 +1,408 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from modelstore import MODEL_NAMES, get_estimator, get_metrics
+
+# Rows every compiled model is checked against its estimator on before it
+# is used; anything that doesn't match exactly falls back to the estimator.
+CHECK_ROWS = 200
+PROBA_TOLERANCE = 1e-9
+
+
+class UnsupportedModel(Exception):
+    pass
+
+
+def _rows(X):
+    X = np.asarray(X, dtype='float64')
+    return X.reshape(1, -1) if X.ndim == 1 else X
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+
+class CompiledModel:
+    kind = None
+    has_proba = False
+
+    def __init__(self, features, shift=None, scale=None):
+        self.features = features
+        self.shift = shift
+        self.scale = scale
+
+    def transform(self, X):
+        X = _rows(X)
+        if self.shift is not None:
+            X = X - self.shift
+        if self.scale is not None:
+            X = X / self.scale
+        return X
+
+    def inverse_transform(self, X):
+        # Back to the feature units, e.g. for showing training rows
+        X = _rows(X)
+        if self.scale is not None:
+            X = X * self.scale
+        if self.shift is not None:
+            X = X + self.shift
+        return X
+
+
+class LogisticModel(CompiledModel):
+    kind = 'logistic'
+    has_proba = True
+
+    def __init__(self, features, coef, intercept, classes, **scaler):
+        super().__init__(features, **scaler)
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+
+    def predict_proba(self, X):
+        p = _sigmoid(self.transform(X) @ self.coef + self.intercept)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes[(self.transform(X) @ self.coef + self.intercept > 0).astype(int)]
+
+
+class StatsmodelsLogitModel(CompiledModel):
+    # statsmodels' Logit predicts the probability of a win, not a class
+    kind = 'statsmodels-logit'
+
+    def __init__(self, features, coef, intercept):
+        super().__init__(features)
+        self.coef = coef
+        self.intercept = intercept
+
+    def predict(self, X):
+        return _sigmoid(self.transform(X) @ self.coef + self.intercept)
+
+
+class LinearOneVsOneModel(CompiledModel):
+    kind = 'linear-ovo'
+
+    def __init__(self, features, coefs, intercepts, pairs, classes, **scaler):
+        super().__init__(features, **scaler)
+        self.coefs = coefs
+        self.intercepts = intercepts
+        self.pairs = pairs
+        self.classes = classes
+
+    def decision_function(self, X):
+        # Same votes plus squashed confidences as sklearn's OneVsOneClassifier
+        confidences = self.transform(X) @ self.coefs + self.intercepts
+        positive = confidences > 0
+        votes = np.zeros((len(confidences), len(self.classes)))
+        sums = np.zeros_like(votes)
+        for k, (i, j) in enumerate(self.pairs):
+            votes[:, i] += ~positive[:, k]
+            votes[:, j] += positive[:, k]
+            sums[:, i] -= confidences[:, k]
+            sums[:, j] += confidences[:, k]
+        return votes + sums / (3 * (np.abs(sums) + 1))
+
+    def predict(self, X):
+        Y = self.decision_function(X)
+        if len(self.classes) == 2:
+            return self.classes[(Y[:, 1] > 0).astype(int)]
+        return self.classes[Y.argmax(axis=1)]
+
+
+def _unit_rows(X, zero_axis):
+    # Unit vectors are as far apart in L2 as in cosine distance
+    # (|a - b|^2 = 2 * (1 - cos)), so a KD-tree over them answers cosine
+    # queries. Zero vectors, which cosine puts at distance 1 from everything,
+    # are moved onto an extra axis so they stay there.
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    zero = norms == 0
+    return np.hstack([X / np.where(zero, 1, norms), zero * zero_axis])
+
+
+class CosineKNNModel(CompiledModel):
+    kind = 'cosine-knn'
+    has_proba = True
+
+    def __init__(self, features, fit_X, y, classes, n_neighbors, names=None, **scaler):
+        from scipy.spatial import cKDTree
+
+        super().__init__(features, **scaler)
+        self.fit_X = fit_X
+        self.y = y
+        self.classes = classes
+        self.n_neighbors = n_neighbors
+        self.names = names
+        self.tree = cKDTree(_unit_rows(fit_X, 1.0))
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = n_neighbors or self.n_neighbors
+        X = self.transform(X)
+        distances, neighbors = self.tree.query(_unit_rows(X, 0.0), k=k)
+        distances, neighbors = distances.reshape(-1, k), neighbors.reshape(-1, k)
+        distances = np.clip(distances ** 2 / 2, 0, 2)
+
+        # A zero query is at distance 1 from every row. sklearn picks among
+        # them with argpartition, then argsort; the same calls on a row of
+        # ties pick the same rows.
+        zero = np.linalg.norm(X, axis=1) == 0
+        if zero.any():
+            ties = np.ones((1, len(self.fit_X)))
+            sample_range = np.arange(1)[:, None]
+            tied = np.argpartition(ties, k - 1, axis=1)[:, :k]
+            tied = tied[sample_range, np.argsort(ties[sample_range, tied])]
+            distances[zero] = 1.0
+            neighbors[zero] = tied[0]
+        return distances, neighbors
+
+    def predict_proba(self, X):
+        _, neighbors = self.kneighbors(X)
+        counts = np.zeros((len(neighbors), len(self.classes)))
+        np.add.at(counts, (np.arange(len(neighbors))[:, None], self.y[neighbors]), 1)
+        return counts / self.n_neighbors
+
+    def predict(self, X):
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+    def explain(self, X):
+        # The training profiles behind each prediction, closest first
+        distances, neighbors = self.kneighbors(X)
+        proba = np.zeros((len(neighbors), len(self.classes)))
+        np.add.at(proba, (np.arange(len(neighbors))[:, None], self.y[neighbors]), 1 / self.n_neighbors)
+
+        explained = []
+        for row_distances, row_neighbors, row_proba in zip(distances, neighbors, proba):
+            # fit_X is what the estimator saw, after the pipeline's scaler
+            values = self.inverse_transform(self.fit_X[row_neighbors])
+            explained.append({
+                'prediction': self.classes[row_proba.argmax()],
+                'probability': row_proba.max(),
+                'neighbors': [
+                    dict(
+                        zip(self.features, row_values),
+                        index=int(index),
+                        name=self.names[index] if self.names is not None else None,
+                        label=self.classes[self.y[index]],
+                        distance=float(distance)
+                    )
+                    for distance, index, row_values in zip(row_distances, row_neighbors, values)
+                ]
+            })
+        return explained
+
+
+class EstimatorModel(CompiledModel):
+    # Anything the compiler doesn't know goes through the estimator itself
+    kind = 'estimator'
+
+    def __init__(self, features, estimator):
+        super().__init__(features)
+        self.estimator = estimator
+        self.has_proba = hasattr(estimator, 'predict_proba')
+
+    def frame(self, X):
+        import pandas as pd
+
+        frame = pd.DataFrame(_rows(X), columns=self.features)
+        # Rebuilt from floats; put the id/count columns back to integers
+        return frame.apply(lambda column: column.astype('int64') if (column % 1 == 0).all() else column)
+
+    def predict_proba(self, X):
+        return np.asarray(self.estimator.predict_proba(self.frame(X)))
+
+    def predict(self, X):
+        return np.asarray(self.estimator.predict(self.frame(X)))
+
+
+def _split_pipeline(estimator):
+    steps = getattr(estimator, 'steps', None)
+    if steps is None:
+        return {}, estimator
+
+    scaler = {}
+    for _, step in steps[:-1]:
+        if step in (None, 'passthrough'):
+            continue
+        if type(step).__name__ != 'StandardScaler' or scaler:
+            raise UnsupportedModel(f'{type(step).__name__} step')
+        scaler = {'shift': getattr(step, 'mean_', None), 'scale': getattr(step, 'scale_', None)}
+    return scaler, steps[-1][1]
+
+def _check_features(estimator, features):
+    names = getattr(estimator, 'feature_names_in_', None)
+    if names is not None and list(names) != list(features):
+        raise UnsupportedModel(f'fitted on {list(names)}')
+
+def compile_estimator(estimator, features, names=None):
+    _check_features(estimator, features)
+    scaler, final = _split_pipeline(estimator)
+    kind = type(final).__name__
+
+    if kind == 'LogisticRegression' and len(final.classes_) == 2:
+        return LogisticModel(features, final.coef_[0], final.intercept_[0], final.classes_, **scaler)
+
+    if kind == 'OneVsOneClassifier' and getattr(final, 'pairwise_indices_', None) is None:
+        coefs, intercepts = [], []
+        for binary in final.estimators_:
+            if type(binary).__name__ not in ('SVC', 'LinearSVC') or getattr(binary, 'kernel', 'linear') != 'linear':
+                raise UnsupportedModel(f'{binary!r} in {kind}')
+            coefs.append(np.ravel(binary.coef_))
+            intercepts.append(np.ravel(binary.intercept_)[0])
+        n_classes = len(final.classes_)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        return LinearOneVsOneModel(
+            features, np.array(coefs).T, np.array(intercepts), pairs, final.classes_, **scaler
+        )
+
+    if kind == 'KNeighborsClassifier' and final.metric == 'cosine' and final.weights == 'uniform' and not final.outputs_2d_:
+        return CosineKNNModel(features, final._fit_X, final._y, final.classes_, final.n_neighbors, names, **scaler)
+
+    if type(getattr(final, 'model', None)).__name__ == 'Logit' and not scaler:
+        params = dict(zip(final.model.exog_names, np.asarray(final.params)))
+        intercept = sum(params.pop(name, 0.0) for name in ('const', 'Intercept'))
+        if set(params) - set(features):
+            raise UnsupportedModel(f'Logit terms {sorted(set(params) - set(features))}')
+        coef = np.array([params.get(feature, 0.0) for feature in features])
+        return StatsmodelsLogitModel(features, coef, intercept)
+
+    raise UnsupportedModel(kind)
+
+def sample_rows(model, n=CHECK_ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    if isinstance(model, CosineKNNModel):
+        base = model.fit_X
+    elif isinstance(model, LogisticModel):
+        base = np.outer(np.ones(n), model.coef)
+    elif isinstance(model, LinearOneVsOneModel):
+        base = model.coefs.T
+    else:
+        base = np.ones((1, len(model.features)))
+
+    rows = base[rng.integers(0, len(base), n)]
+    rows = rows * rng.uniform(0.5, 1.5, rows.shape) + rng.normal(0, 1, rows.shape)
+    # The origin after scaling, where the cosine distance is a special case
+    rows[0] = 0
+    if model.scale is not None:
+        rows = rows * model.scale
+    if model.shift is not None:
+        rows = rows + model.shift
+    return rows
+
+def check_equivalence(model, estimator, X):
+    reference = EstimatorModel(model.features, estimator)
+
+    predicted, expected = model.predict(X), reference.predict(X)
+    if predicted.dtype.kind == 'f':
+        # statsmodels' Logit predicts probabilities, equal up to rounding
+        difference = float(np.max(np.abs(predicted - expected)))
+        return difference <= PROBA_TOLERANCE, difference
+    if not np.array_equal(predicted, expected):
+        return False, float('inf')
+    if not (model.has_proba and reference.has_proba):
+        return True, 0.0
+    difference = float(np.max(np.abs(model.predict_proba(X) - reference.predict_proba(X))))
+    return difference <= PROBA_TOLERANCE, difference
+
+def compile_model(name, estimator=None):
+    from modelsfunctions import MODEL_FEATURES
+
+    features = MODEL_FEATURES[name]
+    estimator = get_estimator(name) if estimator is None else estimator
+    # Optional team/season label for each training row, shown with the neighbours
+    names = get_metrics(name).get('train_names')
+    try:
+        model = compile_estimator(estimator, features, names)
+        ok, difference = check_equivalence(model, estimator, sample_rows(model))
+        if not ok:
+            raise UnsupportedModel(f'differs from the estimator by {difference}')
+    except UnsupportedModel as e:
+        print(f'No fast path for {name} ({e}), predicting through the estimator')
+        model = EstimatorModel(features, estimator)
+
+    return model
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+def _after_fork():
+    global _compiled_lock
+    _compiled_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def get_fast_model(name):
+    # Compiled once per estimator; a hot-reloaded artifact is a new object
+    estimator = get_estimator(name)
+    entry = _compiled.get(name)
+    if entry is None or entry[0] is not estimator:
+        with _compiled_lock:
+            entry = _compiled.get(name)
+            if entry is None or entry[0] is not estimator:
+                entry = (estimator, compile_model(name, estimator))
+                _compiled[name] = entry
+    return entry[1]
+
+def _timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def benchmark(names=None, repeat=1000, batch=1000):
+    import pandas as pd
+
+    print(f'{"Model":<12} {"Engine":<18} {"Row (us)":>10} {"Batch of " + str(batch) + " (us/row)":>24}')
+    for name in names or MODEL_NAMES:
+        try:
+            model = get_fast_model(name)
+        except Exception as e:
+            print(f'{name:<12} {e}')
+            continue
+        estimator = get_estimator(name)
+        X = sample_rows(model, batch)
+        row = X[:1]
+
+        # The current path: a one-row DataFrame per prediction
+        current = lambda X: estimator.predict(pd.DataFrame(X, columns=model.features))
+        current_row = _timeit(lambda: current(row), repeat) * 1e6
+        current_batch = _timeit(lambda: current(X), max(repeat // 100, 3)) * 1e6 / batch
+        fast_row = _timeit(lambda: model.predict(row), repeat) * 1e6
+        fast_batch = _timeit(lambda: model.predict(X), max(repeat // 100, 3)) * 1e6 / batch
+
+        print(f'{name:<12} {"estimator":<18} {current_row:>10.1f} {current_batch:>24.2f}')
+        print(f'{name:<12} {model.kind:<18} {fast_row:>10.1f} {fast_batch:>24.2f}   {current_row / fast_row:.0f}x per row')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NumPy inference for the fitted models')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser('check', help='Compare every compiled model with its estimator')
+    check_parser.add_argument('--rows', type=int, default=10000, help='Random rows compared')
+
+    bench_parser = subparsers.add_parser('bench', help='Per-prediction latency, estimator vs compiled model')
+    bench_parser.add_argument('--repeat', type=int, default=1000, help='Timed single-row predictions')
+    bench_parser.add_argument('--batch', type=int, default=1000, help='Rows in the batch case')
+
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        failed = False
+        for name in MODEL_NAMES:
+            model = None
+            try:
+                model = get_fast_model(name)
+                ok, difference = check_equivalence(model, get_estimator(name), sample_rows(model, args.rows, seed=1))
+            except Exception as e:
+                ok, difference = False, e
+            failed = failed or not ok
+            print(f'{name}: {"ok" if ok else "MISMATCH"} ({getattr(model, "kind", "-")}, max probability difference {difference})')
+        if failed:
+            sys.exit(1)
+    elif args.command == 'bench':
+        benchmark(repeat=args.repeat, batch=args.batch)
@@ -0,0 +1,240 @@
+import os
+import csv
+import time
+import argparse
+
+from db import get_connection
+from dataversion import bump
+from summaries import refresh_summaries, summaries_exist
+
+# Loads an Ergast-format CSV dump (one <table>.csv per table, \N for NULL)
+# into the existing tables. Everything is staged with COPY into temporary
+# tables and diffed there; only the races whose rows changed are rewritten.
+INGEST_LOCK_TIMEOUT = os.getenv('INGEST_LOCK_TIMEOUT', '5s')
+
+# Looked up by their own key: new rows are inserted, changed ones updated.
+# Each query gives the seasons whose summaries read the changed keys.
+REFERENCE_TABLES = {
+    'seasons': ('year', 'SELECT unnest(%s::integer[]);'),
+    'circuits': ('circuitid', 'SELECT DISTINCT year FROM races WHERE circuitid = ANY(%s);'),
+    'constructors': ('constructorid', """
+        SELECT DISTINCT ra.year FROM results r JOIN races ra ON r.raceid = ra.raceid WHERE r.constructorid = ANY(%s);
+    """),
+    'drivers': ('driverid', """
+        SELECT DISTINCT ra.year FROM results r JOIN races ra ON r.raceid = ra.raceid WHERE r.driverid = ANY(%s);
+    """),
+    'status': ('statusid', """
+        SELECT DISTINCT ra.year FROM results r JOIN races ra ON r.raceid = ra.raceid WHERE r.statusid = ANY(%s);
+    """),
+    'races': ('raceid', 'SELECT DISTINCT year FROM races WHERE raceid = ANY(%s);'),
+}
+
+# Rows belonging to a race: a race is rewritten as a whole when any of its
+# rows differ from the dump. Tables missing from the database are skipped.
+RACE_TABLES = [
+    'results',
+    'lap_times',
+    'pit_stops',
+    'qualifying',
+    'sprint_results',
+    'constructor_results',
+    'constructor_standings',
+    'driver_standings',
+]
+
+# With --seasons, what is kept of each staged table. The other reference
+# tables aren't tied to a season and are merged whole. races is merged
+# before any race table, so their filter already sees the new races.
+SEASON_FILTERS = {
+    'seasons': 'year = ANY(%s)',
+    'races': 'year = ANY(%s)',
+    **{table: 'raceid IN (SELECT raceid FROM races WHERE year = ANY(%s))' for table in RACE_TABLES},
+}
+
+# Both sides are fingerprinted the same way, over the columns of the dump,
+# so equal rows have equal text.
+CHANGED_RACES = """
+    CREATE TEMP TABLE changed_{table} ON COMMIT DROP AS
+    WITH staged AS (
+        SELECT s.raceid, md5(string_agg(ROW({staged})::text, ',' ORDER BY ROW({staged})::text)) AS checksum
+        FROM stage_{table} s
+        GROUP BY s.raceid
+    ), current AS (
+        SELECT t.raceid, md5(string_agg(ROW({current})::text, ',' ORDER BY ROW({current})::text)) AS checksum
+        FROM {table} t
+        WHERE t.raceid IN (SELECT raceid FROM staged)
+        GROUP BY t.raceid
+    )
+    SELECT s.raceid
+    FROM staged s
+    LEFT JOIN current c ON s.raceid = c.raceid
+    WHERE c.checksum IS DISTINCT FROM s.checksum;
+"""
+
+
+def _read_header(path):
+    with open(path, newline='') as f:
+        return [column.strip().lower() for column in next(csv.reader(f))]
+
+def _stage(cur, table, path, seasons=None):
+    cur.execute(f'CREATE TEMP TABLE stage_{table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;')
+
+    cur.execute(f'SELECT * FROM {table} LIMIT 0;')
+    target = [column[0] for column in cur.description]
+    columns = _read_header(path)
+    unknown = [column for column in columns if column not in target]
+    if unknown:
+        raise ValueError(f'{path} has columns {table} does not: {", ".join(unknown)}')
+
+    with open(path, newline='') as f:
+        cur.copy_expert(
+            f"COPY stage_{table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true, NULL '\\N')", f
+        )
+    staged = cur.rowcount
+
+    if seasons and table in SEASON_FILTERS:
+        cur.execute(f'DELETE FROM stage_{table} WHERE NOT ({SEASON_FILTERS[table]});', (list(seasons),))
+        staged -= cur.rowcount
+
+    return staged, target, columns
+
+def _merge_reference(cur, table, key, columns):
+    # Only the columns in the dump: the others were staged as NULL and
+    # would wipe what the table has
+    assignments = ', '.join(columns)
+    values = ', '.join(f's.{column}' for column in columns)
+    current = ', '.join(f't.{column}' for column in columns)
+
+    cur.execute(
+        f"""
+            UPDATE {table} t SET ({assignments}) = ROW({values})
+            FROM stage_{table} s
+            WHERE t.{key} = s.{key} AND ROW({current}) IS DISTINCT FROM ROW({values})
+            RETURNING t.{key};
+        """
+    )
+    keys = [row[0] for row in cur.fetchall()]
+    updated = len(keys)
+
+    cur.execute(
+        f"""
+            INSERT INTO {table} ({assignments})
+            SELECT {values} FROM stage_{table} s
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})
+            RETURNING {key};
+        """
+    )
+    keys += [row[0] for row in cur.fetchall()]
+
+    return keys, {'inserted': len(keys) - updated, 'updated': updated, 'deleted': 0}
+
+def _merge_race_rows(cur, table, target, columns):
+    # A changed race is rewritten from the dump alone; a column the dump
+    # lacks would come back empty for it
+    missing = [column for column in target if column not in columns]
+    if missing:
+        raise ValueError(f'{table}.csv is missing columns: {", ".join(missing)}')
+
+    cur.execute(CHANGED_RACES.format(
+        table=table,
+        staged=', '.join(f's.{column}' for column in columns),
+        current=', '.join(f't.{column}' for column in columns),
+    ))
+    columns = ', '.join(columns)
+    cur.execute(f'SELECT raceid FROM changed_{table};')
+    races = [row[0] for row in cur.fetchall()]
+
+    cur.execute(f'DELETE FROM {table} t USING changed_{table} c WHERE t.raceid = c.raceid;')
+    deleted = cur.rowcount
+    cur.execute(
+        f"""
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM stage_{table} s
+            WHERE s.raceid IN (SELECT raceid FROM changed_{table});
+        """
+    )
+
+    return races, {'inserted': cur.rowcount, 'updated': 0, 'deleted': deleted}
+
+def _seasons_of(cur, query, keys):
+    if not keys:
+        return set()
+    cur.execute(query, (keys,))
+    return {int(row[0]) for row in cur.fetchall()}
+
+def _table_exists(cur, table):
+    cur.execute('SELECT to_regclass(%s);', (table,))
+    return cur.fetchone()[0] is not None
+
+def ingest(data_dir, seasons=None, dry_run=False, refresh=True):
+    start = time.perf_counter()
+    report = []
+    affected = set()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # No DDL on the live tables: staging goes to temporary tables, and
+        # INSERT/UPDATE/DELETE take ROW EXCLUSIVE locks, which never block
+        # the dashboard's reads; it keeps seeing the old rows until the
+        # commit. Give up rather than queue behind anything heavier.
+        cur.execute('SET LOCAL lock_timeout = %s;', (INGEST_LOCK_TIMEOUT,))
+
+        tables = [(table, key, query) for table, (key, query) in REFERENCE_TABLES.items()]
+        tables += [(table, 'raceid', None) for table in RACE_TABLES]
+        for table, key, query in tables:
+            path = os.path.join(data_dir, f'{table}.csv')
+            if not os.path.exists(path) or not _table_exists(cur, table):
+                continue
+
+            table_start = time.perf_counter()
+            staged, target, columns = _stage(cur, table, path, seasons)
+            if query is not None:
+                keys, counts = _merge_reference(cur, table, key, columns)
+                affected |= _seasons_of(cur, query, keys)
+            else:
+                keys, counts = _merge_race_rows(cur, table, target, columns)
+                affected |= _seasons_of(cur, REFERENCE_TABLES['races'][1], keys)
+            report.append(dict(counts, table=table, staged=staged, seconds=time.perf_counter() - table_start))
+
+        # The triggers bump the seasons of changed race rows; reference rows
+        # (a driver's name, say) don't know their seasons
+        bump(cur, affected)
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        cur.close()
+
+    elapsed = time.perf_counter() - start
+    staged = sum(row['staged'] for row in report)
+
+    print(f'{"Table":<24} {"Staged":>10} {"Inserted":>10} {"Updated":>10} {"Deleted":>10} {"Rows/sec":>12}')
+    for row in report:
+        rate = row['staged'] / row['seconds'] if row['seconds'] else 0
+        print(f'{row["table"]:<24} {row["staged"]:>10} {row["inserted"]:>10} {row["updated"]:>10} {row["deleted"]:>10} {rate:>12.0f}')
+    print(f'{staged} rows in {elapsed:.2f}s ({staged / elapsed:.0f} rows/sec), seasons changed: {sorted(affected) or "none"}')
+
+    if dry_run:
+        print('Dry run, rolled back')
+    elif refresh and affected:
+        # Only the changed seasons are rebuilt, with plain writes to the
+        # summary tables; creating them is the one-time 'summaries.py create'
+        if summaries_exist():
+            refresh_summaries(sorted(affected))
+        else:
+            print("No summary tables to refresh, run 'summaries.py create' first")
+
+    return sorted(affected)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load new rounds from an Ergast CSV dump, rewriting only the races that changed')
+    parser.add_argument('data_dir', help='Directory with the Ergast <table>.csv files')
+    parser.add_argument('--seasons', type=int, nargs='*', help='Only load the races of these seasons')
+    parser.add_argument('--dry-run', action='store_true', help='Diff and report, then roll back')
+    parser.add_argument('--no-refresh', action='store_true', help="Don't rebuild the summaries of the changed seasons")
+
+    args = parser.parse_args()
+
+    ingest(args.data_dir, args.seasons, dry_run=args.dry_run, refresh=not args.no_refresh)
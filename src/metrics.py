@@ -0,0 +1,131 @@
+import os
+import json
+import time
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Set by gunicorn.conf.py; every worker then writes its samples to this
+# directory and /metrics aggregates them, whichever worker serves the scrape.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+CALLBACK_LATENCY = Histogram(
+    'dash_callback_duration_seconds',
+    'Time to serve a Dash callback request, serialization included',
+    ['output']
+)
+DATA_FUNCTION_LATENCY = Histogram(
+    'data_function_duration_seconds',
+    'Time spent in a cached data function',
+    ['function', 'cache']
+)
+DATA_FUNCTION_ROWS = Histogram(
+    'data_function_rows',
+    'Rows returned by a data function',
+    ['function'],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, float('inf'))
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Shared cache lookups by data function',
+    ['function', 'result']
+)
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Database connections per pool state',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+POOL_MAX_CONNECTIONS = Gauge(
+    'db_pool_max_connections',
+    'Configured maximum pool size',
+    multiprocess_mode='livesum'
+)
+POOL_CHECKOUT_LATENCY = Histogram(
+    'db_pool_checkout_seconds',
+    'Time to get a connection from the pool'
+)
+MODEL_PREDICTIONS = Counter(
+    'model_predictions_total',
+    'Predictions served by model',
+    ['model']
+)
+
+
+def _rows(value):
+    if isinstance(value, dict):
+        value = value.get('results', ())
+    if isinstance(value, tuple):
+        return sum(_rows(item) for item in value)
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+def observe_data_function(name, elapsed, value, hit):
+    result = 'hit' if hit else 'miss'
+    CACHE_REQUESTS.labels(name, result).inc()
+    DATA_FUNCTION_LATENCY.labels(name, result).observe(elapsed)
+    DATA_FUNCTION_ROWS.labels(name).observe(_rows(value))
+
+def observe_pool(stats, checkout_time=None):
+    POOL_CONNECTIONS.labels('in_use').set(stats['in_use'])
+    POOL_CONNECTIONS.labels('idle').set(stats['idle'])
+    POOL_CONNECTIONS.labels('waiting').set(stats['waiting'])
+    POOL_MAX_CONNECTIONS.set(stats['max_size'])
+    if checkout_time is not None:
+        POOL_CHECKOUT_LATENCY.observe(checkout_time)
+
+def observe_prediction(model, count=1):
+    MODEL_PREDICTIONS.labels(model).inc(count)
+
+def _callback_output():
+    try:
+        output = request.get_json(silent=True)['output']
+    except (TypeError, KeyError):
+        return 'unknown'
+    if not output.startswith('{'):
+        return output
+    # Pattern-matching ids come through as JSON followed by the property;
+    # their values may have dots of their own. Keep the label readable.
+    try:
+        return json.dumps(json.loads(output.rsplit('.', 1)[0]), sort_keys=True)
+    except ValueError:
+        return output
+
+def _registry():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def cache_requests():
+    # Hits and misses per data function, summed over every process writing
+    # to PROMETHEUS_MULTIPROC_DIR (workers and background jobs alike)
+    counts = {}
+    for metric in _registry().collect():
+        for sample in metric.samples:
+            if sample.name == 'cache_requests_total':
+                counter = counts.setdefault(sample.labels['function'], {'hits': 0, 'misses': 0})
+                counter['hits' if sample.labels['result'] == 'hit' else 'misses'] += int(sample.value)
+    return counts
+
+def register_metrics(server):
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        # Never let the metrics turn a served callback into a 500
+        try:
+            if request.path.endswith('/_dash-update-component') and hasattr(g, 'metrics_start'):
+                CALLBACK_LATENCY.labels(_callback_output()).observe(time.perf_counter() - g.metrics_start)
+        except Exception as e:
+            print('Error while recording callback metrics', e)
+        return response
+
+    @server.route('/metrics')
+    def metrics_view():
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
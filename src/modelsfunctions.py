@@ -1,129 +1,80 @@
-import os
-import pickle
-from dotenv import load_dotenv
-import psycopg2 as psy
-from psycopg2 import Error
-
-import plotly.express as px
-
 import pandas as pd
 
-from functools import lru_cache
-
 import numpy as np
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
-
-import requests
-
-load_dotenv()
+from cache import memoize, HOUR
+from db import fetch_many
+from dataversion import season_version
+from modelstore import get_metrics
+from inference import get_fast_model
+
+@memoize(ttl=6 * HOUR, version=season_version)
+def get_season_inputs(year):
+    # Three independent queries, run concurrently on pooled connections
+    teams, circuits, params = fetch_many([
+        (
+            """
+                SELECT
+                    DISTINCT c.constructorid, c.name, c.url
+                FROM constructors c
+                JOIN results r ON c.constructorid = r.constructorid
+                JOIN races ra ON r.raceid = ra.raceid
+                WHERE ra.year = %s
+            """, (year,)
+        ),
+        (
+            """
+                select
+                    distinct r.raceid, ra.round, c.name
+                from results r
+                join races ra on r.raceid = ra.raceid
+                join circuits c on ra.circuitid = c.circuitid
+                where ra.year = %s
+                order by ra.round;
+            """, (year,)
+        ),
+        (
+            """
+                SELECT
+                    min(grid) as min_grid,
+                    max(grid) as max_grid,
+                    -- whole minutes: DuckDB's / on integers doesn't truncate
+                    cast(floor(min(r.milliseconds) / 60000) as integer) as min_minutes,
+                    cast(floor(max(r.milliseconds) / 60000) as integer) as max_minutes,
+                    min(fastestlapspeed) as min_fastestlapspeed,
+                    max(fastestlapspeed) as max_fastestlapspeed,
+                    min(p.stop) as min_pit_stop,
+                    max(p.stop) as max_pit_stop
+                FROM results r
+                JOIN races ra ON r.raceid = ra.raceid
+                JOIN pit_stops p ON r.raceid = p.raceid
+                WHERE ra.year = %s
+            """, (year,)
+        ),
+    ])
+
+    return {
+        'teams': teams,
+        'circuits': circuits,
+        'params': params,
+    }
 
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-def connection_db() -> psy.extensions.connection:
-    try:
-        conn = psy.connect(DATABASE_URL)
-        return conn
-    except (Exception, Error) as e:
-        print('Error while connecting to PostgreSQL', e)
-        return None
-    
-@lru_cache(maxsize=None)
 def get_teams(year):
-    conn = connection_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-            SELECT 
-                DISTINCT c.constructorid, c.name, c.url
-            FROM constructors c
-            JOIN results r ON c.constructorid = r.constructorid
-            JOIN races ra ON r.raceid = ra.raceid
-            WHERE ra.year = %s
-        """, (year,)
-    )
-    teams = cur.fetchall()
-    teams = pd.DataFrame(teams)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+    return get_season_inputs(int(year))['teams']
 
-    teams.columns = columns
-
-    cur.close()
-    conn.close()
-    return teams
-
-@lru_cache(maxsize=None)
 def get_circuits_data(year):
-    conn = connection_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-            select 
-                distinct r.raceid, c.name
-            from results r
-            join races ra on r.raceid = ra.raceid
-            join circuits c on ra.circuitid = c.circuitid
-            where ra.year = %s;
-        """, (year,)
-    )
-    inputs = cur.fetchall()
-    inputs = pd.DataFrame(inputs)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
+    return get_season_inputs(int(year))['circuits']
 
-    inputs.columns = columns
+def race_labels(circuits):
+    # Some seasons visit a circuit twice (2020: Red Bull Ring, Silverstone,
+    # Bahrain), the round tells the races apart
+    return [f'R{round_} {name}' for round_, name in zip(circuits['round'], circuits['name'])]
 
-    cur.close()
-    conn.close()
-    return inputs
-
-@lru_cache(maxsize=None)
 def get_inputs_params(year):
-    conn = connection_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-            SELECT 
-                min(grid) as min_grid, 
-                max(grid) as max_grid, 
-                min(r.milliseconds) / 60000 as min_minutes,
-                max(r.milliseconds) / 60000 as max_minutes,
-                min(fastestlapspeed) as min_fastestlapspeed,
-                max(fastestlapspeed) as max_fastestlapspeed,
-                min(p.stop) as min_pit_stop,
-                max(p.stop) as max_pit_stop
-            FROM results r
-            JOIN races ra ON r.raceid = ra.raceid
-            JOIN pit_stops p ON r.raceid = p.raceid
-            WHERE ra.year = %s
-        """, (year,)
-    )
-    inputs = cur.fetchall()
-    inputs = pd.DataFrame(inputs)
-
-    columns = []
-    for column in cur.description:
-        columns.append(column[0])
-
-    inputs.columns = columns
+    return get_season_inputs(int(year))['params']
 
-    cur.close()
-    conn.close()
-    return inputs
-
-@lru_cache(maxsize=None)
 def get_binary_model():
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/binarylsm.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    log_reg = pickle.loads(model_content)
+    log_reg = get_metrics('binarylsm')
     
     precision = log_reg['precision']
     recall = log_reg['recall']
@@ -136,37 +87,44 @@ def get_binary_model():
     
     return precision, recall, f1, auc, fig_hist, fig_thresh, fig_roc, fig_cm
 
-@lru_cache(maxsize=None)
 def get_binary_model_predict(year, circuit, grid, minutes, constructorid, pits, fastestlapspeed):
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/binarylsm.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    log_reg = pickle.loads(model_content)
-
-    
     minutes = float(minutes)
 
-    to_predict = pd.DataFrame({
-        'year': [year],
-        'raceid': [circuit],
-        'grid': [grid],
-        'minutes': [minutes],
-        'constructorid': [constructorid],
-        'pit_stop': [pits],
-        'fastestlapspeed': [fastestlapspeed]
-    })
-
-    model = log_reg['binarylsm']
+    to_predict = np.array([year, circuit, grid, minutes, constructorid, pits, fastestlapspeed], dtype='float64')
+
+    model = get_fast_model('binarylsm')
     y_hat = model.predict(to_predict)[0]
 
     return y_hat
 
-@lru_cache(maxsize=None)
+def get_binary_sweep(year, constructorid, minutes, pits, fastestlapspeed):
+    # Every grid slot at every circuit of the season, scored in one batch
+    circuits = get_circuits_data(year)
+    params = get_inputs_params(year)
+    grids = np.arange(int(params['min_grid'].values[0]), int(params['max_grid'].values[0]) + 1)
+
+    raceids = np.repeat(circuits['raceid'].to_numpy(dtype='float64'), len(grids))
+    to_predict = np.column_stack([
+        np.full(len(raceids), year),
+        raceids,
+        np.tile(grids, len(circuits)),
+        np.full(len(raceids), float(minutes)),
+        np.full(len(raceids), constructorid),
+        np.full(len(raceids), pits),
+        np.full(len(raceids), fastestlapspeed),
+    ]).astype('float64')
+
+    model = get_fast_model('binarylsm')
+    y_hat = model.predict_proba(to_predict)[:, 1] if model.has_proba else model.predict(to_predict)
+
+    return pd.DataFrame(
+        np.asarray(y_hat, dtype='float64').reshape(len(circuits), len(grids)),
+        index=race_labels(circuits),
+        columns=grids
+    )
+
 def get_svm_model():
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/svm.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    svm = pickle.loads(model_content)
+    svm = get_metrics('svm')
     
     precision = svm['precision']
     recall = svm['recall']
@@ -177,12 +135,8 @@ def get_svm_model():
     
     return precision, recall, f1, auc, fig_cm, fig_acc
 
-@lru_cache(maxsize=None)
 def get_knn_model():
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/knn.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    knn = pickle.loads(model_content)
+    knn = get_metrics('knn')
     
     precision = knn['precision']
     recall = knn['recall']
@@ -193,50 +147,48 @@ def get_knn_model():
     
     return precision, recall, f1, auc, fig_cm, fig_acc
 
-@lru_cache(maxsize=None)
 def get_knn_predict(points, init, final, laps, speed, win, stop, ret):
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/knn.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    knn = pickle.loads(model_content)
-
-    to_predict = pd.DataFrame({
-        'avgpoints': [points],
-        'avginitialpos': [init],
-        'avgfinalpos': [final],
-        'avglaps': [laps],
-        'avgfastestlapspeed': [speed],
-        'totalwins': [win],
-        'avgstops': [stop],
-        'avgretirements': [ret]
-    })
-
-    model = knn['model']
+    to_predict = np.array([points, init, final, laps, speed, win, stop, ret], dtype='float64')
+
+    model = get_fast_model('knn')
     y_hat = model.predict(to_predict)[0]
 
     return y_hat
 
-@lru_cache(maxsize=None)
-def get_svm_predict(points, init, final, laps, speed, win, stop, ret):
-    url = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/svm.pkl'
-    response = requests.get(url)
-    model_content = response.content
-    svm = pickle.loads(model_content)
+def get_knn_neighbors(points, init, final, laps, speed, win, stop, ret):
+    to_predict = np.array([points, init, final, laps, speed, win, stop, ret], dtype='float64')
+
+    model = get_fast_model('knn')
+    if not hasattr(model, 'explain'):
+        return pd.DataFrame()
 
+    return pd.DataFrame(model.explain(to_predict)[0]['neighbors'])
+
+def get_svm_predict(points, init, final, laps, speed, win, stop, ret):
     #speed = float(speed)
 
-    to_predict = pd.DataFrame({
-        'avgpoints': [points],
-        'avginitialpos': [init],
-        'avgfinalpos': [final],
-        'avglaps': [laps],
-        'avgfastestlapspeed': [speed],
-        'totalwins': [win],
-        'avgstops': [stop],
-        'avgretirements': [ret]
-    })
-
-    model = svm['model']
+    to_predict = np.array([points, init, final, laps, speed, win, stop, ret], dtype='float64')
+
+    model = get_fast_model('svm')
     y_hat = model.predict(to_predict)[0]
 
-    return y_hat
\ No newline at end of file
+    return y_hat
+
+# Feature columns each model is fitted on, in order
+MODEL_FEATURES = {
+    'binarylsm': ['year', 'raceid', 'grid', 'minutes', 'constructorid', 'pit_stop', 'fastestlapspeed'],
+    'knn': ['avgpoints', 'avginitialpos', 'avgfinalpos', 'avglaps', 'avgfastestlapspeed', 'totalwins', 'avgstops', 'avgretirements'],
+    'svm': ['avgpoints', 'avginitialpos', 'avgfinalpos', 'avglaps', 'avgfastestlapspeed', 'totalwins', 'avgstops', 'avgretirements'],
+}
+
+def predict_frame(name, features):
+    # One vectorized call for every row; the binary model already predicts
+    # the win probability, the classifiers add it when they can.
+    model = get_fast_model(name)
+    X = features[MODEL_FEATURES[name]].to_numpy(dtype='float64')
+
+    predictions = pd.DataFrame({'prediction': model.predict(X)}, index=features.index)
+    if model.has_proba:
+        predictions['probability'] = model.predict_proba(X).max(axis=1)
+
+    return predictions
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODELS_DIR = os.getenv('MODELS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+MANIFEST_FILE = 'manifest.json'
+# Symlink to the promoted version directory (train.py --promote)
+CURRENT_LINK = 'current'
+
+# Artifacts missing from MODELS_DIR are fetched from here once and kept on
+# disk; set MODEL_DOWNLOAD=0 on hosts without network access.
+MODEL_URL = 'https://github.com/unfresh25/f1-dashboard/raw/main/src/models/{name}.pkl'
+MODEL_DOWNLOAD = os.getenv('MODEL_DOWNLOAD', '1') == '1'
+
+MODEL_NAMES = ['binarylsm', 'svm', 'knn']
+
+# Key the fitted estimator is stored under in each training artifact;
+# everything else in it is metrics and figures.
+ESTIMATOR_KEYS = {
+    'binarylsm': 'binarylsm',
+    'knn': 'model',
+    'svm': 'model',
+}
+
+# Written by `python modelstore.py split`: the page only needs the metrics
+# bundle, the estimator is unpickled on the first prediction.
+METRICS_SUFFIX = '.metrics.json'
+ESTIMATOR_SUFFIX = '.estimator.pkl'
+
+
+class ModelChecksumError(Exception):
+    pass
+
+
+class ModelUnavailable(FileNotFoundError):
+    # Not on disk and can't be fetched: the pages say so instead of failing
+    pass
+
+
+def sha256sum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _signature(path):
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+def _jsonable(value):
+    if hasattr(value, 'to_plotly_json'):
+        import plotly.io as pio
+        return json.loads(pio.to_json(value))
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class ModelStore:
+    def __init__(self, models_dir=MODELS_DIR, download=MODEL_DOWNLOAD):
+        self.models_dir = models_dir
+        self.download = download
+
+        self._lock = threading.Lock()
+        self._files = {}
+        self._manifest = (None, {})
+
+    def after_fork(self):
+        # Forked while another thread was loading an artifact
+        self._lock = threading.Lock()
+
+    def live_dir(self):
+        # A promoted version is a complete directory with its own manifest,
+        # so flipping the link swaps every artifact and checksum at once
+        link = os.path.join(self.models_dir, CURRENT_LINK)
+        return os.path.realpath(link) if os.path.islink(link) else self.models_dir
+
+    def path(self, filename, directory=None):
+        return os.path.join(directory or self.live_dir(), filename)
+
+    def exists(self, filename):
+        return os.path.exists(self.path(filename))
+
+    def manifest(self, directory=None):
+        path = self.path(MANIFEST_FILE, directory)
+        signature = _signature(path) if os.path.exists(path) else (path, None)
+        # One tuple, so a thread reading another directory's manifest can't
+        # pair its checksums with this signature
+        cached_signature, manifest = self._manifest
+        if signature != cached_signature:
+            manifest = {}
+            if signature[1] is not None:
+                with open(path) as f:
+                    manifest = json.load(f)
+            self._manifest = (signature, manifest)
+        return manifest
+
+    def _fetch(self, name, expected=None):
+        import requests
+
+        # Whatever comes over the network gets unpickled: it has to match a
+        # checksum pinned beforehand, never one computed from the download
+        expected = expected or self.manifest().get(f'{name}.pkl', {}).get('sha256')
+        if expected is None:
+            raise ModelUnavailable(
+                f'No checksum for {name}.pkl in {MANIFEST_FILE}, not downloading it; '
+                f'pin one with `python modelstore.py fetch {name} --sha256 <hash>`'
+            )
+
+        url = MODEL_URL.format(name=name)
+        print(f'{name}.pkl not found in {self.models_dir}, downloading {url}')
+        try:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise ModelUnavailable(f'Could not download {url}: {e}') from e
+
+        checksum = hashlib.sha256(response.content).hexdigest()
+        if checksum != expected:
+            raise ModelChecksumError(f'{url} has sha256 {checksum}, expected {expected}')
+
+        os.makedirs(self.models_dir, exist_ok=True)
+        path = self.path(f'{name}.pkl')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, path)
+
+    def _load(self, filename, loader):
+        # The file and its checksum come from the same directory, even if
+        # a promotion flips the link in between
+        directory = self.live_dir()
+        path = self.path(filename, directory)
+        signature = _signature(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        checksum = hashlib.sha256(content).hexdigest()
+
+        expected = self.manifest(directory).get(filename, {}).get('sha256')
+        if expected is None:
+            print(f'No checksum for {filename} in {MANIFEST_FILE}, loading it unverified')
+        elif checksum != expected:
+            raise ModelChecksumError(f'{path} has sha256 {checksum}, expected {expected}')
+
+        return signature, checksum, loader(content)
+
+    def _current(self, filename):
+        # A changed path, mtime or size means the file was replaced (or a
+        # new version promoted): load it again
+        entry = self._files.get(filename)
+        if entry is None:
+            return None
+        try:
+            if _signature(self.path(filename)) != entry[0]:
+                return None
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def _get(self, filename, loader):
+        entry = self._current(filename)
+        if entry is None:
+            with self._lock:
+                entry = self._current(filename)
+                if entry is None:
+                    entry = self._load(filename, loader)
+                    self._files[filename] = entry
+        return entry[2]
+
+    def get(self, name):
+        # The whole training artifact, estimator and figures together
+        if not self.exists(f'{name}.pkl'):
+            if not self.download:
+                raise ModelUnavailable(f'Model artifact {self.path(f"{name}.pkl")} not found')
+            self._fetch(name)
+        return self._get(f'{name}.pkl', pickle.loads)
+
+    def get_metrics(self, name):
+        if self.exists(f'{name}{METRICS_SUFFIX}'):
+            return self._get(f'{name}{METRICS_SUFFIX}', json.loads)
+        artifact = self.get(name)
+        return {key: value for key, value in artifact.items() if key != ESTIMATOR_KEYS[name]}
+
+    def get_estimator(self, name):
+        if self.exists(f'{name}{ESTIMATOR_SUFFIX}'):
+            return self._get(f'{name}{ESTIMATOR_SUFFIX}', pickle.loads)
+        return self.get(name)[ESTIMATOR_KEYS[name]]
+
+    def loaded(self):
+        return {filename: entry[1] for filename, entry in list(self._files.items())}
+
+    def split(self, name):
+        artifact = self.get(name)
+        estimator_key = ESTIMATOR_KEYS[name]
+
+        metrics = {key: _jsonable(value) for key, value in artifact.items() if key != estimator_key}
+        with open(self.path(f'{name}{METRICS_SUFFIX}'), 'w') as f:
+            json.dump(metrics, f, separators=(',', ':'))
+        with open(self.path(f'{name}{ESTIMATOR_SUFFIX}'), 'wb') as f:
+            pickle.dump(artifact[estimator_key], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return [f'{name}.pkl', f'{name}{METRICS_SUFFIX}', f'{name}{ESTIMATOR_SUFFIX}']
+
+    def write_manifest(self, filenames):
+        manifest = dict(self.manifest())
+        for filename in filenames:
+            path = self.path(filename)
+            if not os.path.exists(path):
+                print(f'{path} not found, skipping')
+                continue
+            manifest[filename] = {'sha256': sha256sum(path), 'size': os.path.getsize(path)}
+            print(f'{filename}: {manifest[filename]["sha256"]}')
+
+        with open(self.path(MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+            f.write('\n')
+
+        return manifest
+
+
+store = ModelStore()
+os.register_at_fork(after_in_child=store.after_fork)
+
+def get_model(name):
+    return store.get(name)
+
+def get_metrics(name):
+    return store.get_metrics(name)
+
+def get_estimator(name):
+    return store.get_estimator(name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model artifacts served by the dashboard')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for command, help_text in [
+        ('manifest', f'Record the artifacts checksums in {MANIFEST_FILE}'),
+        ('split', 'Write the metrics bundle and the estimator of each artifact to their own files'),
+    ]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument('--models', nargs='*', default=MODEL_NAMES, help='Only these models')
+
+    subparsers.add_parser('verify', help='Load every artifact and check it against the manifest')
+
+    fetch_parser = subparsers.add_parser('fetch', help=f'Download an artifact and pin its checksum in {MANIFEST_FILE}')
+    fetch_parser.add_argument('name', choices=MODEL_NAMES, help='Model to download')
+    fetch_parser.add_argument('--sha256', required=True, help='Checksum the download must have')
+
+    args = parser.parse_args()
+
+    if args.command == 'manifest':
+        store.write_manifest([
+            f'{name}{suffix}' for name in args.models
+            for suffix in ['.pkl', METRICS_SUFFIX, ESTIMATOR_SUFFIX]
+            if store.exists(f'{name}{suffix}')
+        ])
+    elif args.command == 'split':
+        filenames = []
+        for name in args.models:
+            try:
+                filenames += store.split(name)
+            except Exception as e:
+                print(f'{name}: {e}')
+        store.write_manifest(filenames)
+    elif args.command == 'fetch':
+        store._fetch(args.name, args.sha256)
+        store.write_manifest([f'{args.name}.pkl'])
+    elif args.command == 'verify':
+        failed = False
+        for name in MODEL_NAMES:
+            try:
+                store.get_metrics(name)
+                store.get_estimator(name)
+                print(f'{name}: ok')
+            except Exception as e:
+                failed = True
+                print(f'{name}: {e}')
+        if failed:
+            sys.exit(1)
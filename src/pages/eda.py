@@ -7,9 +7,10 @@ from dotenv import load_dotenv
 
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 
-from edafunctions import convert_milliseconds, get_constructor_info, get_constructor_stats_info, get_constructor_stats_names, get_constructor_stats_table, get_constructor_status_info, get_driver_age_point_distribution_data, get_driver_status_info, get_map_data, get_constructors_data, get_sankey_data, get_seasons, random_color
+from background import versioned
+from dataversion import season_version, global_version
+from edafunctions import convert_milliseconds, get_constructor_info, get_constructor_stats_info, get_constructor_stats_names, get_constructor_stats_table, get_constructor_status_info, get_driver_age_point_distribution_data, get_driver_status_info, get_map_data, get_constructors_data, get_result_seasons, get_sankey_data, get_seasons, random_color
 
 load_dotenv()
 
@@ -17,235 +18,64 @@ MAPBOX_TOKEN = os.getenv('MAPBOX_TOKEN')
 
 dash.register_page(__name__, title='F1 Dashboard - Exploratory Analysis')
 
-dates = get_seasons()
-dates = dates.sort_values(by='year', ascending=False)
-
-constructor_names = get_constructor_stats_names('2023')
-
-layout = html.Main([
-    html.Section([
-        dls.Grid([
-            dcc.Graph(id='map-graph')
-        ],
-        color='#fff',
-        speed_multiplier=2,
-        show_initially=True
-        )
-    ],
-    style={
-        'background-color': 'rgba(0, 0, 0, 0.7)',
-    }),
-
-    html.Section([
-        html.H3('Constructors'),
-        html.Hr(),
-        html.Nav([
-            html.Article([
-                html.Span('Season', style={'font-weight': 'regular', 'color': 'rgba(255, 255, 255, 0.35)', 'margin-left': '12px', 'position': 'relative', 'top': '5px'}),
-                dcc.Dropdown(
-                    id='seasons-dropdown',
-                    options=[{'label': k, 'value': k} for i, k in enumerate(dates['year'])],
-                    value=dates['year'].max(),
-                    style={
-                        "color": "black", 
-                        "background-color": "transparent", 
-                        "border": "none", 
-                    },
-                ),
-            ])            
-        ], style={'width': '200px'}),
-        html.Section([
-            html.Article([
-                html.Aside([
-                    html.Label('Fastest Constructor', style={'font-size': '12px'}),
-                    html.Div([
-                        html.Span(id='fastest-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
-                        html.Div([
-                            html.Img(src='../assets/webicons/speed.svg', alt='speed icon', style={'width': '15px'}),
-                            html.Span(id='fastest-constructor-speed', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
-                        ],
-                        style={
-                            'display': 'flex',
-                            'align-items': 'flex-end',
-                            'gap': '10px'
-                        }),
-                    ],
-                    style={
-                        'display': 'flex',
-                        'flex-direction': 'column',
-                        'align-items': 'center',
-                        'margin-top': '15px',
-                        'margin-bottom': '15px',
-                        'gap': '5px'
-                    })
-                ],
-                style={
-                    'border': '.5px solid #222',
-                    'border-radius': '20px',
-                    'padding': '10px',
-                }),
-                html.Aside([
-                    html.Label('Most Winner Constructor', style={'font-size': '12px'}),
-                    html.Div([
-                        html.Span(id='most-winner-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
-                        html.Div([
-                            html.Img(src='../assets/webicons/winner.svg', alt='winner icon', style={'width': '15px'}),
-                            html.Span(id='most-winner-constructor-wins', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
-                        ],
-                        style={
-                            'display': 'flex',
-                            'align-items': 'flex-end',
-                            'gap': '10px'
-                        }),
-                    ],
-                    style={
-                        'display': 'flex',
-                        'flex-direction': 'column',
-                        'align-items': 'center',
-                        'margin-top': '15px',
-                        'margin-bottom': '15px',
-                        'gap': '5px'
-                    })
-                ],
-                style={
-                    'border': '.5px solid #222',
-                    'border-radius': '20px',
-                    'padding': '10px',
-                    'margin-top': '20px'
-                }),
-                html.Aside([
-                    html.Label('Most Problematic Constructor', style={'font-size': '12px'}),
-                    html.Div([
-                        html.Span(id='most-problematic-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
-                        html.Div([
-                            html.Img(src='../assets/webicons/problematicteam.svg', alt='problematic icon', style={'width': '15px'}),
-                            html.Span(id='most-problematic-constructor-problems', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
-                        ],
-                        style={
-                            'display': 'flex',
-                            'align-items': 'flex-end',
-                            'gap': '10px'
-                        }),
-                    ],
-                    style={
-                        'display': 'flex',
-                        'flex-direction': 'column',
-                        'align-items': 'center',
-                        'margin-top': '15px',
-                        'margin-bottom': '15px',
-                        'gap': '5px'
-                    })
-                ],
-                style={
-                    'border': '.5px solid #222',
-                    'border-radius': '20px',
-                    'padding': '10px',
-                    'margin-top': '20px'
-                }),
-            ],
-            style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '30%',
-                'place-content': 'center'
-            }),
-
-            html.Article([
-                html.H5(id='race-point-distribution-title', style={'text-align': 'center'}),
-                dls.Grid([
-                    dcc.Graph(id='race-point-distribution-graph')
-                ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
-            ],
-            style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '70%'
-            }),
-        ],
-        style={
-            'display': 'flex',
-            'gap': '10px'
-        }),
+# The line chart + Sankey and the drivers' careers chart are built as
+# background jobs; these bars show how far along they are.
+CONSTRUCTORS_STEPS = 4
+DRIVERS_STEPS = 2
+PROGRESS_HIDDEN = {'display': 'none'}
+PROGRESS_VISIBLE = {'display': 'block', 'width': '100%', 'height': '4px', 'accent-color': '#e10600'}
+
+def layout(**kwargs):
+    # Built on each page view from the cached season data, so importing the
+    # page (and booting a worker) doesn't touch the database
+    dates = get_result_seasons()
+    if dates.empty:
+        # Nothing has been run yet (a fresh database): list the seasons anyway
+        dates = get_seasons().sort_values(by='year', ascending=False)
+    constructor_names = get_constructor_stats_names(dates['year'].max())['name']
+
+    return html.Main([
         html.Section([
-            html.Article([
-                html.H5(id='race-distribution-title', style={'text-align': 'center'}),
-                dls.Grid([
-                    dcc.Graph(id='race-distribution-graph')
-                ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
+            dls.Grid([
+                dcc.Graph(id='map-graph')
             ],
-            style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '100%'
-            })
+            color='#fff',
+            speed_multiplier=2,
+            show_initially=True
+            )
         ],
         style={
-            'display': 'flex',
+            'background-color': 'rgba(0, 0, 0, 0.7)',
         }),
+
         html.Section([
-            html.Article([
-                html.H5(id='constructor-radar-status-title', style={'text-align': 'center'}),
-                dls.Grid([
-                    dcc.Graph(id='constructor-radar-status-graph')
-                ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
-            ],
-            style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '70%'
-            }),
-            html.Article([
-                html.H6('Constructor Stats', style={'text-align': 'center'}),
-                html.Nav(
+            html.H3('Constructors'),
+            html.Hr(),
+            html.Progress(id='constructors-progress', value='0', max=str(CONSTRUCTORS_STEPS), style=PROGRESS_HIDDEN),
+            html.Nav([
+                html.Article([
+                    html.Span('Season', style={'font-weight': 'regular', 'color': 'rgba(255, 255, 255, 0.35)', 'margin-left': '12px', 'position': 'relative', 'top': '5px'}),
                     dcc.Dropdown(
-                        id='constructor-selector',
-                        options=[{'label': name, 'value': name} for i, name in enumerate(constructor_names['name'])],
-                        value=constructor_names['name'][0],
+                        id='seasons-dropdown',
+                        options=[{'label': k, 'value': k} for i, k in enumerate(dates['year'])],
+                        value=dates['year'].max(),
                         style={
                             "color": "black", 
                             "background-color": "transparent", 
                             "border": "none", 
-                        }
+                        },
                     ),
-                    style={'margin-top': '20px'}
-                ),
-                dls.Grid([
-                    html.H5(id='constructor-name', style={'margin-top': '25px', 'text-align': 'center'}),
-                    html.Hr(),
+                ])            
+            ], style={'width': '200px'}),
+            html.Section([
+                html.Article([
                     html.Aside([
-                        html.Span([
-                            html.Label('Drivers'),
+                        html.Label('Fastest Constructor', style={'font-size': '12px'}),
+                        html.Div([
+                            html.Span(id='fastest-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
                             html.Div([
-                                html.Img(src='../assets/webicons/f1car.svg', alt='driver icon', style={'width': '15px'}),
-                                html.Span(id='constructor-total-drivers')
+                                html.Img(src='../assets/webicons/speed.svg', alt='speed icon', style={'width': '15px'}),
+                                html.Span(id='fastest-constructor-speed', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
                             ],
                             style={
                                 'display': 'flex',
@@ -257,13 +87,23 @@ layout = html.Main([
                             'display': 'flex',
                             'flex-direction': 'column',
                             'align-items': 'center',
+                            'margin-top': '15px',
+                            'margin-bottom': '15px',
                             'gap': '5px'
-                        }),
-                        html.Span([
-                            html.Label('Speed'),
+                        })
+                    ],
+                    style={
+                        'border': '.5px solid #222',
+                        'border-radius': '20px',
+                        'padding': '10px',
+                    }),
+                    html.Aside([
+                        html.Label('Most Winner Constructor', style={'font-size': '12px'}),
+                        html.Div([
+                            html.Span(id='most-winner-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
                             html.Div([
-                                html.Img(src='../assets/webicons/speed.svg', alt='speed icon', style={'width': '15px'}),
-                                html.Span(id='constructor-max-speed')
+                                html.Img(src='../assets/webicons/winner.svg', alt='winner icon', style={'width': '15px'}),
+                                html.Span(id='most-winner-constructor-wins', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
                             ],
                             style={
                                 'display': 'flex',
@@ -275,13 +115,24 @@ layout = html.Main([
                             'display': 'flex',
                             'flex-direction': 'column',
                             'align-items': 'center',
+                            'margin-top': '15px',
+                            'margin-bottom': '15px',
                             'gap': '5px'
-                        }),
-                        html.Span([
-                            html.Label('Points'),
+                        })
+                    ],
+                    style={
+                        'border': '.5px solid #222',
+                        'border-radius': '20px',
+                        'padding': '10px',
+                        'margin-top': '20px'
+                    }),
+                    html.Aside([
+                        html.Label('Most Problematic Constructor', style={'font-size': '12px'}),
+                        html.Div([
+                            html.Span(id='most-problematic-constructor', style={'font-size': '18px', 'font-weight': '600'}, className='team'),
                             html.Div([
-                                html.Img(src='../assets/webicons/points.svg', alt='points icon', style={'width': '15px'}),
-                                html.Span(id='constructor-total-points')
+                                html.Img(src='../assets/webicons/problematicteam.svg', alt='problematic icon', style={'width': '15px'}),
+                                html.Span(id='most-problematic-constructor-problems', style={'color': '#fff', 'font-size': '16px', 'font-weight': '300'})
                             ],
                             style={
                                 'display': 'flex',
@@ -293,144 +144,310 @@ layout = html.Main([
                             'display': 'flex',
                             'flex-direction': 'column',
                             'align-items': 'center',
+                            'margin-top': '15px',
+                            'margin-bottom': '15px',
                             'gap': '5px'
-                        }),
-                        html.Span([
-                            html.Label('Wins'),
-                            html.Div([
-                                html.Img(src='../assets/webicons/winner.svg', alt='wins icon', style={'width': '15px'}),
-                                html.Span(id='constructor-total-wins')
+                        })
+                    ],
+                    style={
+                        'border': '.5px solid #222',
+                        'border-radius': '20px',
+                        'padding': '10px',
+                        'margin-top': '20px'
+                    }),
+                ],
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '30%',
+                    'place-content': 'center'
+                }),
+
+                html.Article([
+                    html.H5(id='race-point-distribution-title', style={'text-align': 'center'}),
+                    dls.Grid([
+                        dcc.Graph(id='race-point-distribution-graph')
+                    ],
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
+                ],
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '70%'
+                }),
+            ],
+            style={
+                'display': 'flex',
+                'gap': '10px'
+            }),
+            html.Section([
+                html.Article([
+                    html.H5(id='race-distribution-title', style={'text-align': 'center'}),
+                    dls.Grid([
+                        dcc.Graph(id='race-distribution-graph')
+                    ],
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
+                ],
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '100%'
+                })
+            ],
+            style={
+                'display': 'flex',
+            }),
+            html.Section([
+                html.Article([
+                    html.H5(id='constructor-radar-status-title', style={'text-align': 'center'}),
+                    dls.Grid([
+                        dcc.Graph(id='constructor-radar-status-graph')
+                    ],
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
+                ],
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '70%'
+                }),
+                html.Article([
+                    html.H6('Constructor Stats', style={'text-align': 'center'}),
+                    html.Nav(
+                        dcc.Dropdown(
+                            id='constructor-selector',
+                            options=[{'label': name, 'value': name} for i, name in enumerate(constructor_names)],
+                            value=constructor_names.iloc[0] if len(constructor_names) else None,
+                            style={
+                                "color": "black", 
+                                "background-color": "transparent", 
+                                "border": "none", 
+                            }
+                        ),
+                        style={'margin-top': '20px'}
+                    ),
+                    dls.Grid([
+                        html.H5(id='constructor-name', style={'margin-top': '25px', 'text-align': 'center'}),
+                        html.Hr(),
+                        html.Aside([
+                            html.Span([
+                                html.Label('Drivers'),
+                                html.Div([
+                                    html.Img(src='../assets/webicons/f1car.svg', alt='driver icon', style={'width': '15px'}),
+                                    html.Span(id='constructor-total-drivers')
+                                ],
+                                style={
+                                    'display': 'flex',
+                                    'align-items': 'flex-end',
+                                    'gap': '10px'
+                                }),
                             ],
                             style={
                                 'display': 'flex',
-                                'align-items': 'flex-end',
-                                'gap': '10px'
+                                'flex-direction': 'column',
+                                'align-items': 'center',
+                                'gap': '5px'
+                            }),
+                            html.Span([
+                                html.Label('Speed'),
+                                html.Div([
+                                    html.Img(src='../assets/webicons/speed.svg', alt='speed icon', style={'width': '15px'}),
+                                    html.Span(id='constructor-max-speed')
+                                ],
+                                style={
+                                    'display': 'flex',
+                                    'align-items': 'flex-end',
+                                    'gap': '10px'
+                                }),
+                            ],
+                            style={
+                                'display': 'flex',
+                                'flex-direction': 'column',
+                                'align-items': 'center',
+                                'gap': '5px'
+                            }),
+                            html.Span([
+                                html.Label('Points'),
+                                html.Div([
+                                    html.Img(src='../assets/webicons/points.svg', alt='points icon', style={'width': '15px'}),
+                                    html.Span(id='constructor-total-points')
+                                ],
+                                style={
+                                    'display': 'flex',
+                                    'align-items': 'flex-end',
+                                    'gap': '10px'
+                                }),
+                            ],
+                            style={
+                                'display': 'flex',
+                                'flex-direction': 'column',
+                                'align-items': 'center',
+                                'gap': '5px'
+                            }),
+                            html.Span([
+                                html.Label('Wins'),
+                                html.Div([
+                                    html.Img(src='../assets/webicons/winner.svg', alt='wins icon', style={'width': '15px'}),
+                                    html.Span(id='constructor-total-wins')
+                                ],
+                                style={
+                                    'display': 'flex',
+                                    'align-items': 'flex-end',
+                                    'gap': '10px'
+                                }),
+                            ],
+                            style={
+                                'display': 'flex',
+                                'flex-direction': 'column',
+                                'align-items': 'center',
+                                'gap': '5px'
                             }),
                         ],
                         style={
                             'display': 'flex',
-                            'flex-direction': 'column',
-                            'align-items': 'center',
-                            'gap': '5px'
+                            'gap': '20px',
+                            'justify-content': 'space-between',
                         }),
+                        dash.dash_table.DataTable(
+                            id='constructor-stats-table',
+                            style_cell={
+                                "backgroundColor": "transparent",
+                                "color": "gray",
+                                "border": "0.5px solid #666",
+                                "font-size": "16px",
+                                "textAlign": "center",
+                                'font-size': '14px'
+                            },
+                            style_data={
+                                "whiteSpace": "normal",
+                                "height": "auto",    
+                            },
+                            style_table={
+                                'font-size': '12px',
+                                'margin-top': '30px'
+                            },
+                            style_header={
+                                "border": "0.5px solid #666",
+                            }
+                            )
                     ],
-                    style={
-                        'display': 'flex',
-                        'gap': '20px',
-                        'justify-content': 'space-between',
-                    }),
-                    dash.dash_table.DataTable(
-                        id='constructor-stats-table',
-                        style_cell={
-                            "backgroundColor": "transparent",
-                            "color": "gray",
-                            "border": "0.5px solid #666",
-                            "font-size": "16px",
-                            "textAlign": "center",
-                            'font-size': '14px'
-                        },
-                        style_data={
-                            "whiteSpace": "normal",
-                            "height": "auto",    
-                        },
-                        style_table={
-                            'font-size': '12px',
-                            'margin-top': '30px'
-                        },
-                        style_header={
-                            "border": "0.5px solid #666",
-                        }
-                        )
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
                 ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '30%'
+                }),
             ],
             style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '30%'
-            }),
+                'display': 'flex',
+                'gap': '10px'
+            })
         ],
         style={
-            'display': 'flex',
-            'gap': '10px'
-        })
-    ],
-    style={
-        'margin-top': '50px'
-    }),
+            'margin-top': '50px'
+        }),
 
-    html.Section([
-        html.H3('Drivers'),
-        html.Hr(),
         html.Section([
-            html.Article([
-                html.H5(id='driver-age-point-distribution-title', style={'text-align': 'center'}),
-                dls.Grid([
-                    dcc.Graph(id='driver-age-point-distribution-graph')
+            html.H3('Drivers'),
+            html.Hr(),
+            html.Progress(id='drivers-progress', value='0', max=str(DRIVERS_STEPS), style=PROGRESS_HIDDEN),
+            html.Section([
+                html.Article([
+                    html.H5(id='driver-age-point-distribution-title', style={'text-align': 'center'}),
+                    dls.Grid([
+                        dcc.Graph(id='driver-age-point-distribution-graph')
+                    ],
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
                 ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
-            ],
-            style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '60%'
-            }),
-            html.Article([
-                html.H5(id='driver-radar-status-title', style={'text-align': 'center'}),
-                dls.Grid([
-                    dcc.Graph(id='driver-radar-status-graph')
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '60%'
+                }),
+                html.Article([
+                    html.H5(id='driver-radar-status-title', style={'text-align': 'center'}),
+                    dls.Grid([
+                        dcc.Graph(id='driver-radar-status-graph')
+                    ],
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=True
+                    )
                 ],
-                color='#fff',
-                speed_multiplier=2,
-                show_initially=True
-                )
+                style={
+                    "padding": "20px",
+                    "border-radius": "12px",
+                    "border": "1px solid rgba(255, 255, 255, 0.125)",
+                    "margin-top": "10px",
+                    "background-color": "rgba(0, 0, 0, 0.7)",
+                    "backdrop-filter": 'blur(5px)',
+                    'width': '40%',
+                    'place-content': 'center'
+                }),
             ],
             style={
-                "padding": "20px",
-                "border-radius": "12px",
-                "border": "1px solid rgba(255, 255, 255, 0.125)",
-                "margin-top": "10px",
-                "background-color": "rgba(0, 0, 0, 0.7)",
-                "backdrop-filter": 'blur(5px)',
-                'width': '40%',
-                'place-content': 'center'
+                'display': 'flex',
+                'gap': '10px'
             }),
         ],
         style={
-            'display': 'flex',
-            'gap': '10px'
-        }),
-    ],
+            'margin-top': '50px'
+        })
+    ], 
     style={
+        'width': '90%',
+        'margin': '0 auto',
         'margin-top': '50px'
-    })
-], 
-style={
-    'width': '90%',
-    'margin': '0 auto',
-    'margin-top': '50px'
-    }
-)
+        }
+    )
 
 @callback(
     Output('map-graph', 'figure'),
     Input('seasons-dropdown', 'value')
 )
 def update_map_graph(value):
+    # plotly.express pulls in xarray & co., only load it once a map is drawn
+    import plotly.express as px
+
     records_data = get_map_data(value)
 
     records_data['race_time'] = records_data['race_time_in_milliseconds'].apply(convert_milliseconds) 
@@ -484,10 +501,16 @@ def update_stats(value):
     Output('race-distribution-title', 'children'),
     Output('race-point-distribution-graph', 'figure'),
     Output('race-point-distribution-title', 'children'),
-    Input('seasons-dropdown', 'value')
+    Input('seasons-dropdown', 'value'),
+    background=True,
+    progress=Output('constructors-progress', 'value'),
+    running=[(Output('constructors-progress', 'style'), PROGRESS_VISIBLE, PROGRESS_HIDDEN)],
+    cancel=Input('seasons-dropdown', 'value')
 )
-def update_constructors_graphs(value):
+@versioned(season_version)
+def update_constructors_graphs(set_progress, value):
     records_data = get_constructors_data(value)
+    set_progress('1')
 
     fig = go.Figure()
 
@@ -536,8 +559,10 @@ def update_constructors_graphs(value):
             font=dict(size=12),
             align='left'
         )
+    set_progress('2')
 
     results = get_sankey_data(value)
+    set_progress('3')
 
     nodes = {'Puntos': 0}
     constructors = {}
@@ -547,7 +572,7 @@ def update_constructors_graphs(value):
     node_labels = ['Puntos']
     node_values = [0]
 
-    for row in results:
+    for row in results.itertuples(index=False):
         constructor_id, constructor_ref, constructor_name, constructor_nationality, driver_name, points = row
         
         if constructor_name not in nodes:
@@ -645,9 +670,9 @@ def update_constructor_radar_status_graph(value, constructor):
     prevent_initial_call=True
 )
 def update_constructor_selector(value):
-    constructor_names = get_constructor_stats_names(value)
-    options = [{'label': name, 'value': name} for i, name in enumerate(constructor_names['name'])]
-    value = constructor_names['name'][0]
+    constructor_names = get_constructor_stats_names(value)['name']
+    options = [{'label': name, 'value': name} for i, name in enumerate(constructor_names)]
+    value = constructor_names.iloc[0] if len(constructor_names) else None
     return options, value
 
 @callback(
@@ -680,10 +705,17 @@ def update_constructor_stats_table(value, constructor_name):
     Output('driver-age-point-distribution-title', 'children'),
     Output('driver-age-point-distribution-graph', 'figure'),
     Input('constructor-selector', 'value'),
-    Input('seasons-dropdown', 'value')
+    Input('seasons-dropdown', 'value'),
+    background=True,
+    progress=Output('drivers-progress', 'value'),
+    running=[(Output('drivers-progress', 'style'), PROGRESS_VISIBLE, PROGRESS_HIDDEN)],
+    cancel=Input('seasons-dropdown', 'value')
 )
-def update_driver_age_point_distribution_graph(constructor_name, year):
+# Whole careers, like the data behind it
+@versioned(lambda constructor_name, year: global_version())
+def update_driver_age_point_distribution_graph(set_progress, constructor_name, year):
     records_data = get_driver_age_point_distribution_data(constructor_name, year)
+    set_progress('1')
 
     fig = go.Figure()
 
@@ -4,12 +4,15 @@ from dash.exceptions import PreventUpdate
 import dash_loading_spinners as dls
 
 from edafunctions import get_seasons
-from modelsfunctions import get_binary_model, get_binary_model_predict, get_circuits_data, get_inputs_params, get_svm_model, get_teams, get_knn_model, get_knn_predict, get_svm_predict
+from metrics import observe_prediction
+from modelstore import ModelChecksumError, ModelUnavailable
+from forecastfunctions import FORECAST_HORIZON, FORECAST_TEAMS, FREQUENCY, get_history, get_model_summary, get_team_forecast
+from modelsfunctions import get_binary_model, get_binary_model_predict, get_binary_sweep, get_circuits_data, race_labels, get_inputs_params, get_svm_model, get_teams, get_knn_model, get_knn_neighbors, get_knn_predict, get_svm_predict
 
 import os
 from dotenv import load_dotenv
 
-import pandas as pd
+import plotly.graph_objects as go
 
 dash.register_page(__name__, title='F1 Dashboard - Predictive Analysis')
 
@@ -51,8 +54,15 @@ element_style = {
 car = element_style
 car['align-items'] = 'center'
 
-dates = get_seasons()
-dates = dates.sort_values(by='year', ascending=False)
+# A missing or tampered artifact takes down its own tab, not the page
+MODEL_ERRORS = (ModelUnavailable, ModelChecksumError)
+
+def model_unavailable(name, error):
+    print(f'Model {name} unavailable:', error)
+    return html.Article([
+        html.H3('Model unavailable', style={'text-align': 'center', 'margin-top': '50px'}),
+        html.P(f'The {name} model could not be loaded, try again later.', style={'text-align': 'center'})
+    ])
 
 layout = html.Main([
     html.Nav([
@@ -61,7 +71,8 @@ layout = html.Main([
             value='binarylsm',
             children=[
                 dcc.Tab(label='Binary Logistic Regression', value='binarylsm'),
-                dcc.Tab(label='KNN vs. SVM Classifiers', value='class')
+                dcc.Tab(label='KNN vs. SVM Classifiers', value='class'),
+                dcc.Tab(label='SARIMA Forecasts', value='arima')
             ]
         )
     ], style={'margin-top': '50px'}),
@@ -76,7 +87,11 @@ layout = html.Main([
 )
 def set_model_tab(tab):
     if tab == 'binarylsm':
-        precision, recall, f1, auc, fig_hist, fig_thresh, fig_roc, fig_cm = get_binary_model()
+        try:
+            precision, recall, f1, auc, fig_hist, fig_thresh, fig_roc, fig_cm = get_binary_model()
+        except MODEL_ERRORS as e:
+            return model_unavailable('binarylsm', e)
+        dates = get_seasons().sort_values(by='year', ascending=False)
         return html.Article([
             html.H3('Would my team score?', style={'text-align': 'center', 'margin-top': '50px'}),
             html.Aside([
@@ -234,6 +249,23 @@ def set_model_tab(tab):
                                     'align-items': 'center',
                                     'gap': '10px'
                                 }),
+                                html.Button([
+                                    html.Img(src=dash.get_asset_url('webicons/predict.svg'), alt='sweep icon', style={'width': '20px'}),
+                                    'Sweep grid x circuit'
+                                ], 
+                                id='sweep-button', 
+                                style={
+                                    'background-color': 'transparent', 
+                                    'color': '#fff', 
+                                    'border': '.5px solid #e10600', 
+                                    'border-radius': '10px', 
+                                    'padding': '10px 20px', 
+                                    'font-weight': 'bold', 
+                                    'cursor': 'pointer',
+                                    'display': 'flex',
+                                    'align-items': 'center',
+                                    'gap': '10px'
+                                }),
                             ], style={'display': 'flex', 'align-items': 'center', 'gap': '20px', 'margin-top': '30px', 'place-content': 'center', 'margin-bottom': '20px'}),
                             dls.Grid(
                                 html.Div(
@@ -305,6 +337,23 @@ def set_model_tab(tab):
                     'align-items': 'stretch',
                     'gap': '20px',
                 }),
+                html.Div(
+                    dls.Grid(
+                        dcc.Graph(id='sweep-heatmap', style={'width': '100%'}),
+                        color='#fff',
+                        speed_multiplier=2,
+                        show_initially=False
+                    ),
+                    id='sweep-section',
+                    style={
+                        'display': 'none',
+                        'background-color': 'rgba(0, 0, 0, 0.7)',
+                        'border': '.5px solid #222',
+                        'border-radius': '20px',
+                        'padding': '20px',
+                        'width': '100%'
+                    }
+                ),
                 html.Div(
                     dcc.Graph(figure=fig_hist),
                     style={
@@ -331,8 +380,11 @@ def set_model_tab(tab):
             'margin-top': '20px'
         })
     elif tab == 'class':
-        precision, recall, f1, auc, fig_cm, fig_acc = get_svm_model()
-        precision_k, recall_k, f1_k, auc_k, fig_cm_k, fig_acc_k = get_knn_model()
+        try:
+            precision, recall, f1, auc, fig_cm, fig_acc = get_svm_model()
+            precision_k, recall_k, f1_k, auc_k, fig_cm_k, fig_acc_k = get_knn_model()
+        except MODEL_ERRORS as e:
+            return model_unavailable('svm/knn', e)
         return html.Article([
             html.H3('Win or no win team classifying by KNN and SVM', style={'text-align': 'center', 'margin-top': '50px'}),
             html.Aside([
@@ -625,11 +677,104 @@ def set_model_tab(tab):
                 'flex-direction': 'column'
             }),         
         ])
+    elif tab == 'arima':
+        return html.Article([
+            html.Div([
+                html.Nav([
+                    html.Article([
+                        html.Span('Constructor', style={'font-weight': 'regular', 'color': 'rgba(255, 255, 255, 0.35)', 'margin-left': '12px', 'position': 'relative', 'top': '5px'}),
+                        dcc.Dropdown(
+                            id='forecast-team-dropdown',
+                            options=[{'label': name, 'value': team} for team, name in FORECAST_TEAMS.items()],
+                            value='ferrari',
+                            clearable=False,
+                            style={
+                                "color": "black", 
+                                "background-color": "transparent", 
+                                "border": "none", 
+                            },
+                        ),
+                    ], style={'width': '30%'}),
+                    html.Article([
+                        html.Span('Races ahead', style={'font-weight': 'regular', 'color': 'rgba(255, 255, 255, 0.35)', 'margin-left': '12px'}),
+                        dcc.Slider(
+                            id='forecast-horizon-slider',
+                            min=1,
+                            max=FORECAST_HORIZON,
+                            step=1,
+                            value=FREQUENCY,
+                            marks={value: str(value) for value in range(0, FORECAST_HORIZON + 1, 10) if value},
+                        ),
+                    ], style={'width': '60%'}),
+                ], style={'width': '100%', 'display': 'flex', 'justify-content': 'space-between', 'align-items': 'center', 'gap': '30px'}),
+                html.Span(id='forecast-model-info', style={'color': 'rgba(255, 255, 255, 0.5)'}),
+                dls.Grid(
+                    dcc.Graph(id='forecast-graph'),
+                    color='#fff',
+                    speed_multiplier=2,
+                    show_initially=False
+                ),
+            ],
+            style={
+                'display': 'flex',
+                'flex-direction': 'column',
+                'gap': '20px',
+                'background-color': 'rgba(0, 0, 0, 0.7)',
+                'border': '.5px solid #222',
+                'border-radius': '20px',
+                'padding': '20px',
+            })
+        ], 
+        style={
+            'margin-top': '50px'
+        })
     else:
         return html.Article([
             html.H3('Error')
         ])
     
+@callback(
+    Output('forecast-graph', 'figure'),
+    Output('forecast-model-info', 'children'),
+    Input('forecast-team-dropdown', 'value'),
+    Input('forecast-horizon-slider', 'value')
+)
+def update_forecast(team, horizon):
+    # Precomputed from the fitted R models; nothing is refitted here
+    forecast = get_team_forecast(team, horizon)
+    history = get_history(team)
+    summary = get_model_summary(team)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=list(forecast['step']) + list(forecast['step'][::-1]),
+        y=list(forecast['hi95']) + list(forecast['lo95'][::-1]),
+        fill='toself', fillcolor='rgba(225, 6, 0, 0.15)', line=dict(width=0), hoverinfo='skip', name='95%'
+    ))
+    fig.add_trace(go.Scatter(
+        x=list(forecast['step']) + list(forecast['step'][::-1]),
+        y=list(forecast['hi80']) + list(forecast['lo80'][::-1]),
+        fill='toself', fillcolor='rgba(225, 6, 0, 0.3)', line=dict(width=0), hoverinfo='skip', name='80%'
+    ))
+    fig.add_trace(go.Scatter(x=history['step'], y=history['value'], mode='lines', name='Observed', line=dict(color='#fff')))
+    fig.add_trace(go.Scatter(x=forecast['step'], y=forecast['mean'], mode='lines', name='Forecast', line=dict(color='#e10600')))
+
+    fig.update_layout(
+        title=f"{summary['team']}: share of the available points, next {horizon} races",
+        xaxis={'title': 'Races', 'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+        yaxis={'title': '%', 'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+        plot_bgcolor='rgba(0, 0, 0, 0.0)',
+        paper_bgcolor='rgba(0, 0, 0, 0.0)',
+        font_color="white",
+        hovermode="x unified",
+        hoverlabel=dict(
+            bgcolor="#111"
+        )
+    )
+
+    info = f"{summary['model']} fitted on {summary['nobs']} races, AIC {summary['aic']:.1f}, sigma² {summary['sigma2']:.1f}"
+    return fig, info
+
 @callback(
     Output('team-suggestions-list', 'children'),
     Input({'id': 'team-opt', 'type': 'searchteam'}, 'value'),
@@ -651,7 +796,7 @@ def suggest_teams(typing, season):
 )
 def get_circuits(season):
     circuits = get_circuits_data(season)
-    options = [{'label': name, 'value': raceid} for name, raceid in zip(circuits['name'], circuits['raceid'])]
+    options = [{'label': label, 'value': raceid} for label, raceid in zip(race_labels(circuits), circuits['raceid'])]
     return options, circuits['raceid'].values[0]
 
 @callback(
@@ -677,6 +822,68 @@ def update_binary_model_limits(season):
 
     return grid_min, grid_max, minutes_min, pits_min, pits_max, fastestlapspeed_min, fastestlapspeed_max
 
+@callback(
+    Output('sweep-heatmap', 'figure'),
+    Output('sweep-section', 'style'),
+    Input('sweep-button', 'n_clicks'),
+    State({'id': 'team-opt', 'type': 'searchteam'}, 'value'),
+    State('minutes-binary', 'value'),
+    State('pits-binary', 'value'),
+    State('fastestlapspeed-binary', 'value'),
+    State('seasons-dropdown', 'value'),
+    State('sweep-section', 'style'),
+    prevent_initial_call=True,
+    running=[
+        (Output("sweep-button", "disabled"), True, False)
+    ]
+)
+def sweep_constructor(n_clicks, team, minutes, pits, fastestlapspeed, season, style):
+    teams = get_teams(season)
+    team = teams[teams['name'] == team]
+    if n_clicks is None or team.empty:
+        raise PreventUpdate
+
+    # Inputs left blank are held at the middle of the season's range
+    params = get_inputs_params(season)
+    if minutes is None:
+        minutes = (params['min_minutes'].values[0] + params['max_minutes'].values[0]) / 2
+    if pits is None:
+        pits = round((params['min_pit_stop'].values[0] + params['max_pit_stop'].values[0]) / 2)
+    if fastestlapspeed is None:
+        fastestlapspeed = (params['min_fastestlapspeed'].values[0] + params['max_fastestlapspeed'].values[0]) / 2
+
+    try:
+        sweep = get_binary_sweep(season, team['constructorid'].values[0], minutes, pits, fastestlapspeed)
+    except MODEL_ERRORS as e:
+        print('Model binarylsm unavailable:', e)
+        raise PreventUpdate
+    observe_prediction('binarylsm', sweep.size)
+
+    fig = go.Figure(go.Heatmap(
+        z=sweep.to_numpy() * 100,
+        x=sweep.columns,
+        y=sweep.index,
+        colorscale=[[0, '#e10600'], [0.5, '#222'], [1, '#00e600']],
+        zmin=0,
+        zmax=100,
+        hovertemplate='%{y}<br>Grid %{x}<br>%{z:.1f}%<extra></extra>',
+        colorbar=dict(title='%')
+    ))
+    fig.update_layout(
+        title=f"{team['name'].values[0]} {season}: probability of scoring by grid position and circuit",
+        xaxis={'title': 'Grid position', 'dtick': 1, 'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+        yaxis={'autorange': 'reversed', 'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+        height=max(400, 25 * len(sweep)),
+        plot_bgcolor='rgba(0, 0, 0, 0.0)',
+        paper_bgcolor='rgba(0, 0, 0, 0.0)',
+        font_color="white",
+        hoverlabel=dict(
+            bgcolor="#111"
+        )
+    )
+
+    return fig, dict(style, display='block')
+
 @callback(
     Output('prediction-result', 'children'),
     Output('grid-binary', 'value'),
@@ -704,7 +911,11 @@ def predict_constructor(n_clicks, team, grid, minutes, pits, fastestlapspeed, se
         constructorid = teams[teams['name'] == team]['constructorid'].values[0]
         constructorurl = teams[teams['name'] == team]['url'].values[0]
 
-        prediction = get_binary_model_predict(season, circuit, grid, minutes, constructorid, pits, fastestlapspeed)
+        try:
+            prediction = get_binary_model_predict(season, circuit, grid, minutes, constructorid, pits, fastestlapspeed)
+        except MODEL_ERRORS as e:
+            return model_unavailable('binarylsm', e), dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        observe_prediction('binarylsm')
         if prediction < 0.5:
             color = '#e10600'
         else:
@@ -780,8 +991,14 @@ def predict_constructor(n_clicks, points, init, final, laps, speed, win, stop, r
     if n_clicks is None:
         return dash.no_update
     else:
-        prediction = get_knn_predict(points, init, final, laps, speed, win, stop, ret)
-        prediction_s = get_svm_predict(points, init, final, laps, speed, win, stop, ret)
+        try:
+            prediction = get_knn_predict(points, init, final, laps, speed, win, stop, ret)
+            prediction_s = get_svm_predict(points, init, final, laps, speed, win, stop, ret)
+            neighbors = get_knn_neighbors(points, init, final, laps, speed, win, stop, ret)
+        except MODEL_ERRORS as e:
+            return (model_unavailable('svm/knn', e),) + (dash.no_update,) * 8
+        observe_prediction('knn')
+        observe_prediction('svm')
         if prediction == 'No win':
             color = '#e10600'
         else:
@@ -811,4 +1028,26 @@ def predict_constructor(n_clicks, points, init, final, laps, speed, win, stop, r
             ], style=pred_style.update({'flex-direction': 'column'})),
         ]
 
+        if not neighbors.empty:
+            neighbors = neighbors.rename(columns={'name': 'Team', 'label': 'Result', 'distance': 'Distance'})
+            neighbors['Team'] = neighbors['Team'].fillna('#' + neighbors['index'].astype(str))
+            neighbors = neighbors[['Team', 'Result', 'Distance', 'avgpoints', 'totalwins', 'avgfinalpos']].round(3)
+            info.append(html.Div([
+                html.Span('Closest historical team profiles', style={'margin-top': '15px'}),
+                dash.dash_table.DataTable(
+                    data=neighbors.to_dict('records'),
+                    columns=[{'name': column, 'id': column} for column in neighbors.columns],
+                    style_cell={
+                        "backgroundColor": "transparent",
+                        "color": "gray",
+                        "border": "0.5px solid #666",
+                        "textAlign": "center",
+                        'font-size': '12px'
+                    },
+                    style_header={
+                        "border": "0.5px solid #666",
+                    }
+                )
+            ], style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center', 'gap': '10px'}))
+
         return info, None, None, None, None, None, None, None, None
\ No newline at end of file
@@ -0,0 +1,107 @@
+import io
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request, stream_with_context
+
+from metrics import observe_prediction
+from modelstore import ModelChecksumError, ModelUnavailable
+from modelsfunctions import MODEL_FEATURES, predict_frame
+from forecastfunctions import FORECAST_HORIZON, FORECAST_TEAMS, get_model_summary, get_team_forecast
+
+MAX_BATCH_ROWS = int(os.getenv('MAX_BATCH_ROWS', 100000))
+# Rows serialized per chunk of the streamed response
+STREAM_CHUNK_ROWS = 1000
+
+
+class BatchError(Exception):
+    pass
+
+
+def read_rows():
+    if request.mimetype == 'text/csv':
+        try:
+            return pd.read_csv(io.BytesIO(request.get_data()))
+        except (ValueError, pd.errors.ParserError) as e:
+            raise BatchError(f'Invalid CSV: {e}')
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('rows')
+    if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        raise BatchError('Expected a JSON list of rows, or {"rows": [...]}, or a text/csv body')
+
+    return pd.DataFrame.from_records(payload)
+
+def validate(name, rows):
+    if rows.empty:
+        raise BatchError('No rows to predict')
+    if len(rows) > MAX_BATCH_ROWS:
+        raise BatchError(f'{len(rows)} rows sent, at most {MAX_BATCH_ROWS} per request')
+
+    missing = [column for column in MODEL_FEATURES[name] if column not in rows]
+    if missing:
+        raise BatchError(f'Missing columns: {", ".join(missing)}')
+
+    features = rows[MODEL_FEATURES[name]].apply(pd.to_numeric, errors='coerce').astype('float64')
+    invalid = ~np.isfinite(features.to_numpy()).all(axis=1)
+    if invalid.any():
+        raise BatchError(f'Non-numeric or missing values in rows: {np.flatnonzero(invalid)[:10].tolist()}')
+
+    return features
+
+def _stream_csv(results):
+    for start in range(0, len(results), STREAM_CHUNK_ROWS):
+        yield results.iloc[start:start + STREAM_CHUNK_ROWS].to_csv(index=False, header=start == 0)
+
+def _stream_json(results, name, elapsed):
+    yield f'{{"model": {json.dumps(name)}, "rows": {len(results)}, "elapsed": {elapsed:.6f}, "predictions": ['
+    for start in range(0, len(results), STREAM_CHUNK_ROWS):
+        chunk = results.iloc[start:start + STREAM_CHUNK_ROWS].to_json(orient='records')[1:-1]
+        yield (',' if start else '') + chunk
+    yield ']}'
+
+def register_predictions(server):
+    @server.route('/api/predict/<name>', methods=['POST'])
+    def predict_view(name):
+        if name not in MODEL_FEATURES:
+            return jsonify(error=f'Unknown model {name}, expected one of {", ".join(MODEL_FEATURES)}'), 404
+
+        try:
+            features = validate(name, read_rows())
+        except BatchError as e:
+            return jsonify(error=str(e)), 400
+
+        start = time.perf_counter()
+        try:
+            predictions = predict_frame(name, features)
+        except (ModelUnavailable, ModelChecksumError) as e:
+            print('Model unavailable', e)
+            return jsonify(error=f'Model {name} is unavailable'), 503
+        except Exception as e:
+            print('Error while predicting', e)
+            return jsonify(error=f'Prediction failed: {e}'), 500
+        elapsed = time.perf_counter() - start
+        observe_prediction(name, len(predictions))
+
+        results = pd.concat([features, predictions], axis=1)
+        headers = {'X-Prediction-Rows': str(len(results)), 'X-Prediction-Seconds': f'{elapsed:.6f}'}
+
+        if request.args.get('format') == 'csv' or request.accept_mimetypes.best == 'text/csv':
+            return Response(stream_with_context(_stream_csv(results)), mimetype='text/csv', headers=headers)
+        return Response(stream_with_context(_stream_json(results, name, elapsed)), mimetype='application/json', headers=headers)
+
+    @server.route('/api/forecast/<team>')
+    def forecast_view(team):
+        if team not in FORECAST_TEAMS:
+            return jsonify(error=f'Unknown team {team}, expected one of {", ".join(FORECAST_TEAMS)}'), 404
+
+        horizon = request.args.get('h', 25, type=int)
+        if not 1 <= horizon <= FORECAST_HORIZON:
+            return jsonify(error=f'h must be between 1 and {FORECAST_HORIZON}'), 400
+
+        forecast = get_team_forecast(team, horizon)
+        return jsonify(dict(get_model_summary(team), horizon=horizon, forecast=forecast.to_dict('records')))
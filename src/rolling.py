@@ -0,0 +1,115 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db import fetch_df
+from forecastfunctions import FORECAST_TEAMS, load_arima, kalman_update
+
+ROLLING_WORKERS = int(os.getenv('ROLLING_WORKERS', len(FORECAST_TEAMS)))
+
+# The series the SARIMA models are fitted on in f1analysis/timeseries.qmd:
+# each constructor's share of the points, every race since 2010.
+POINTS_SHARE_QUERY = """
+    SELECT
+        r.date AS race_date,
+        c.name AS team,
+        round((SUM(res.points) / COALESCE(fs.total_first_second, 1)) * 100, 4) AS adjusted_points_percentage
+    FROM results res
+    JOIN constructors c ON res.constructorid = c.constructorid
+    JOIN races r ON res.raceid = r.raceid
+    LEFT JOIN (
+        SELECT raceid, SUM(points) AS total_first_second
+        FROM results
+        WHERE positionorder IN (1, 2)
+        GROUP BY raceid
+    ) fs ON fs.raceid = res.raceid
+    WHERE r.date >= '2010-01-01'
+    GROUP BY r.date, c.name, fs.total_first_second
+    ORDER BY r.date ASC, c.name ASC;
+"""
+
+
+def get_points_share():
+    race_data = fetch_df(POINTS_SHARE_QUERY)
+    race_data['adjusted_points_percentage'] = race_data['adjusted_points_percentage'].astype('float64')
+
+    # One column per constructor, carried forward over the races it missed
+    return (
+        race_data
+        .pivot(index='race_date', columns='team', values='adjusted_points_percentage')
+        .reindex(columns=list(FORECAST_TEAMS.values()))
+        .ffill()
+    )
+
+def rolling_forecast(team, series):
+    # The races after the training sample, one step ahead each, as
+    # pred_rolling does; with R's 25-race holdout these are the test set.
+    start = time.perf_counter()
+    model = load_arima(team)
+    observed = np.asarray(series, dtype='float64')[model['nobs']:]
+
+    predictions, _ = kalman_update(model, observed)
+    predictions = np.clip(predictions, 0, 100)
+
+    errors = (observed - predictions)[~np.isnan(observed)]
+    return {
+        'team': FORECAST_TEAMS[team],
+        'races': len(errors),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))) if len(errors) else np.nan,
+        'mae': float(np.mean(np.abs(errors))) if len(errors) else np.nan,
+        'seconds': time.perf_counter() - start,
+        'predictions': predictions,
+    }
+
+def check_alignment(team, series):
+    # The fitted state keeps the last observations of the training sample;
+    # they should be the same races in the database series.
+    model = load_arima(team)
+    history = model['a'][-model['delta']:][::-1]
+    series = np.asarray(series, dtype='float64')[:model['nobs']]
+    if len(series) < model['nobs']:
+        return f'{len(series)} races in the database, the model was fitted on {model["nobs"]}'
+    if not np.allclose(series[-len(history):], history, atol=1e-3, equal_nan=True):
+        return 'the database series does not match the training sample'
+
+def run(teams=None, workers=ROLLING_WORKERS):
+    teams = teams or list(FORECAST_TEAMS)
+    points_share = get_points_share()
+    series = {team: points_share[FORECAST_TEAMS[team]].to_numpy() for team in teams}
+
+    for team in teams:
+        problem = check_alignment(team, series[team])
+        if problem:
+            print(f'{FORECAST_TEAMS[team]}: {problem}')
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(teams))) as executor:
+            results = list(executor.map(rolling_forecast, teams, [series[team] for team in teams]))
+    else:
+        results = [rolling_forecast(team, series[team]) for team in teams]
+    elapsed = time.perf_counter() - start
+
+    print(f'{"Constructor":<12} {"Races":>6} {"RMSE":>10} {"MAE":>10} {"Time (ms)":>10}')
+    for result in results:
+        print(f'{result["team"]:<12} {result["races"]:>6} {result["rmse"]:>10.4f} {result["mae"]:>10.4f} {result["seconds"] * 1000:>10.2f}')
+    print(f'{len(teams)} constructors in {elapsed * 1000:.2f} ms on {min(workers, len(teams))} worker(s)')
+
+    return pd.DataFrame([
+        {key: value for key, value in result.items() if key != 'predictions'}
+        for result in results
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rolling-origin one-step forecasts of the SARIMA models, filtered instead of refitted')
+    parser.add_argument('--teams', nargs='*', choices=list(FORECAST_TEAMS), help='Only these constructors')
+    parser.add_argument('--workers', type=int, default=ROLLING_WORKERS, help='Processes the constructors are spread over')
+
+    args = parser.parse_args()
+
+    run(args.teams, args.workers)
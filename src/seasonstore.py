@@ -0,0 +1,136 @@
+import os
+import time
+import argparse
+from collections.abc import Mapping
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Season bundles exported as Arrow IPC files. With SHARED_DATA=1 gunicorn
+# preloads the app, so the master maps them (and loads the models) before
+# forking and every worker reads the same read-only pages.
+SEASON_DATA_DIR = os.getenv('SEASON_DATA_DIR', './season_data')
+SHARED_DATA = os.getenv('SHARED_DATA', '0') == '1'
+
+ARROW_SUFFIX = '.arrow'
+VERSION_FILE = 'VERSION'
+
+_tables = {}
+_versions = {}
+
+
+class SeasonBundle(Mapping):
+    # Same keys as get_season_bundle(). Every lookup builds a fresh DataFrame
+    # from the shared Arrow buffers; it only lives as long as the request.
+    def __init__(self, tables):
+        self._tables = tables
+
+    def __getitem__(self, name):
+        if name == 'constructor_info':
+            return tuple(self._tables[f'constructor_info.{i}'].to_pandas() for i in range(3))
+        return self._tables[name].to_pandas()
+
+    def __iter__(self):
+        return iter(sorted({name.split('.')[0] for name in self._tables}))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+def _arrow_path(year, name, data_dir=None):
+    return os.path.join(data_dir or SEASON_DATA_DIR, str(year), f'{name}{ARROW_SUFFIX}')
+
+def _frames(bundle):
+    # constructor_info is three one-row frames, stored as constructor_info.0-2
+    for name, value in bundle.items():
+        if isinstance(value, tuple):
+            for i, frame in enumerate(value):
+                yield f'{name}.{i}', frame
+        else:
+            yield name, value
+
+def write_table(frame, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table.nbytes
+
+def _version_path(year, data_dir=None):
+    return os.path.join(data_dir or SEASON_DATA_DIR, str(year), VERSION_FILE)
+
+def export_seasons(data_dir=None, years=None):
+    from dataversion import season_version
+    from edafunctions import get_seasons, get_season_bundle
+
+    years = years or sorted(int(year) for year in get_seasons()['year'])
+    for year in years:
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(_arrow_path(year, 'results', data_dir)), exist_ok=True)
+
+        # Read before the rows: a change during the export leaves the files
+        # marked as older than they are, never newer
+        version = season_version(year)
+        # Straight from the database, not from a cached copy
+        bundle = get_season_bundle.__wrapped__(year)
+        size = sum(write_table(frame, _arrow_path(year, name, data_dir)) for name, frame in _frames(bundle))
+        with open(_version_path(year, data_dir), 'w') as f:
+            f.write(str(version))
+        print(f'{year}: {size / 2 ** 20:.2f} MB in {time.perf_counter() - start:.2f}s')
+
+def load_seasons(data_dir=None):
+    import pyarrow as pa
+
+    data_dir = data_dir or SEASON_DATA_DIR
+    if not os.path.isdir(data_dir):
+        print(f'No season data in {data_dir}, serving the seasons from the database')
+        return 0
+
+    size = 0
+    for year in sorted(os.listdir(data_dir)):
+        if not year.isdigit():
+            continue
+        for filename in sorted(os.listdir(os.path.join(data_dir, year))):
+            if not filename.endswith(ARROW_SUFFIX):
+                continue
+            # read_all() on a memory map references the file's pages, it
+            # doesn't copy them
+            source = pa.memory_map(os.path.join(data_dir, year, filename), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            _tables.setdefault(int(year), {})[filename[:-len(ARROW_SUFFIX)]] = table
+            size += table.nbytes
+
+        if os.path.exists(_version_path(year, data_dir)):
+            with open(_version_path(year, data_dir)) as f:
+                _versions[int(year)] = int(f.read())
+
+    return size
+
+def get_bundle(year, version=None):
+    # A season that changed after the export is served from the database
+    tables = _tables.get(year)
+    if tables is None or (version is not None and _versions.get(year) != version):
+        return None
+    return SeasonBundle(tables)
+
+def loaded_seasons():
+    return sorted(_tables)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Season bundles as Arrow IPC files, shared by the gunicorn workers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write every season bundle from the database')
+    export_parser.add_argument('--out', default=SEASON_DATA_DIR, help='Output directory')
+    export_parser.add_argument('--years', nargs='*', type=int, help='Only these seasons')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_seasons(args.out, args.years)
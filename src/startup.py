@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PATHS = ['/', '/eda', '/models']
+
+# Runs in a fresh interpreter every time, so nothing is imported or cached
+# in memory yet: what a new gunicorn worker goes through.
+PROBE = """
+import sys
+import json
+import time
+
+start = time.perf_counter()
+from db import capture_queries
+with capture_queries() as queries:
+    import app
+imported = time.perf_counter() - start
+
+client = app.server.test_client()
+timings = {}
+for path in sys.argv[1:]:
+    start = time.perf_counter()
+    response = client.get(path)
+    first_byte = time.perf_counter() - start
+
+    # The page itself is rendered by the pages router callback
+    start = time.perf_counter()
+    layout = client.post('/_dash-update-component', json={
+        'output': '.._pages_content.children..._pages_store.data..',
+        'outputs': [{'id': '_pages_content', 'property': 'children'}, {'id': '_pages_store', 'property': 'data'}],
+        'inputs': [
+            {'id': '_pages_location', 'property': 'pathname', 'value': path},
+            {'id': '_pages_location', 'property': 'search', 'value': ''},
+        ],
+        'changedPropIds': ['_pages_location.pathname'],
+    })
+    timings[path] = [first_byte, time.perf_counter() - start, response.status_code, layout.status_code]
+
+print(json.dumps({'import': imported, 'queries': len(queries), 'paths': timings}))
+"""
+
+
+def probe(paths, warm=False):
+    env = dict(os.environ, WARM_CACHE_ON_STARTUP='1' if warm else '0')
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PROBE, *paths],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run(paths=None, repeat=5, warm=False):
+    paths = paths or PATHS
+    runs = [probe(paths, warm) for _ in range(repeat)]
+
+    print(f'{repeat} fresh interpreters, startup warmup {"on" if warm else "off"}')
+    print(f'{"Import app":<24} {statistics.median(r["import"] for r in runs) * 1000:>10.1f} ms')
+    print(f'{"Queries during import":<24} {max(r["queries"] for r in runs):>10}')
+    print(f'{"Path":<24} {"First byte (ms)":>16} {"Page layout (ms)":>17} {"Status":>8}')
+    for path in paths:
+        first_byte = statistics.median(r['paths'][path][0] for r in runs)
+        layout = statistics.median(r['paths'][path][1] for r in runs)
+        status = '/'.join(str(code) for code in runs[-1]['paths'][path][2:])
+        print(f'{path:<24} {first_byte * 1000:>16.1f} {layout * 1000:>17.1f} {status:>8}')
+
+    return runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker startup: import time and time to first byte of each page')
+    parser.add_argument('--paths', nargs='*', default=PATHS, help='Pages requested after the import')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters started')
+    parser.add_argument('--warm', action='store_true', help='Start the cache warmer on import, as WARM_CACHE_ON_STARTUP=1 does')
+
+    args = parser.parse_args()
+
+    run(args.paths, args.repeat, args.warm)
@@ -0,0 +1,218 @@
+import time
+import argparse
+
+from db import get_connection, fetch_df, fetch_many
+from dataversion import DDL_LOCK_TIMEOUT, bump, create_data_versions
+
+# Summary tables rebuilt one season at a time. Each query is run with
+# %(year)s bound to the season being refreshed (NULL when creating the table).
+SUMMARIES = {
+    'summary_race': """
+        SELECT
+            ra.raceid, ra.year, ra.round, ra.name AS race_name, ra.date AS race_date,
+            c.circuitid, c.name AS circuit_name,
+            c.lat AS circuit_lat, c.lng AS circuit_lng, c.country AS circuit_country,
+            w.driverid AS winner_driverid, w.constructorid AS winner_constructorid,
+            w.milliseconds AS winner_milliseconds, w.fastestlapspeed AS winner_fastestlapspeed,
+            l.milliseconds AS fastest_lap_milliseconds
+        FROM races ra
+        JOIN circuits c ON ra.circuitid = c.circuitid
+        LEFT JOIN results w ON w.raceid = ra.raceid AND w.positionorder = 1
+        LEFT JOIN LATERAL (
+            SELECT MIN(milliseconds) AS milliseconds
+            FROM lap_times
+            WHERE raceid = ra.raceid
+        ) AS l ON true
+        WHERE ra.year = %(year)s
+    """,
+    'summary_result_status': """
+        SELECT
+            r.resultid, r.raceid, ra.year, r.statusid, s.status_category
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        LEFT JOIN categorize_status() s ON r.statusid = s.statusid
+        WHERE ra.year = %(year)s
+    """,
+    'summary_season_driver': """
+        SELECT
+            ra.year,
+            c.constructorid, c.constructorref, c.name AS constructor_name,
+            c.nationality AS constructor_nationality, c.url AS constructor_url,
+            d.driverid, d.surname, DATE_PART('year', d.dob) AS birth_year,
+            COUNT(*) AS races,
+            SUM(r.points) AS points,
+            SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS wins,
+            MAX(r.fastestlapspeed) AS max_speed
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN constructors c ON r.constructorid = c.constructorid
+        JOIN drivers d ON r.driverid = d.driverid
+        WHERE ra.year = %(year)s
+        GROUP BY ra.year, c.constructorid, c.constructorref, c.name, c.nationality, c.url, d.driverid, d.surname, d.dob
+    """,
+}
+
+INDEXES = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS summary_race_raceid_idx ON summary_race (raceid);',
+    'CREATE INDEX IF NOT EXISTS summary_race_year_idx ON summary_race (year);',
+    'CREATE UNIQUE INDEX IF NOT EXISTS summary_result_status_resultid_idx ON summary_result_status (resultid);',
+    'CREATE INDEX IF NOT EXISTS summary_result_status_year_idx ON summary_result_status (year);',
+    'CREATE INDEX IF NOT EXISTS summary_season_driver_year_idx ON summary_season_driver (year, constructor_name);',
+    'CREATE INDEX IF NOT EXISTS summary_season_driver_surname_idx ON summary_season_driver (surname);',
+]
+
+# Advisory lock namespace for refresh_season, keyed by season
+SUMMARY_LOCK = 7201
+
+# A cheap fingerprint of everything the summaries are built from, per season:
+# the races and their circuits, and every result with the driver, constructor
+# and status names it is shown with. Seasons whose races have no results yet
+# are included, summary_race lists them.
+SEASON_CHECKSUMS = """
+    WITH race_checksums AS (
+        SELECT
+            ra.year,
+            md5(string_agg(
+                concat_ws(':', ra.raceid, ra.round, ra.name, ra.date,
+                          c.circuitid, c.name, c.lat, c.lng, c.country),
+                ',' ORDER BY ra.raceid
+            )) AS checksum
+        FROM races ra
+        JOIN circuits c ON ra.circuitid = c.circuitid
+        GROUP BY ra.year
+    ), result_checksums AS (
+        SELECT
+            ra.year,
+            md5(string_agg(
+                concat_ws(':', r.resultid, r.raceid, r.driverid, r.constructorid, r.position,
+                          r.positionorder, r.points, r.milliseconds, r.fastestlapspeed, r.statusid,
+                          d.surname, d.dob, co.constructorref, co.name, co.nationality, co.url, s.status),
+                ',' ORDER BY r.resultid
+            )) AS checksum
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN drivers d ON r.driverid = d.driverid
+        JOIN constructors co ON r.constructorid = co.constructorid
+        LEFT JOIN status s ON r.statusid = s.statusid
+        GROUP BY ra.year
+    ), lap_checksums AS (
+        SELECT ra.year, COUNT(*) AS laps, MIN(l.milliseconds) AS fastest
+        FROM lap_times l
+        JOIN races ra ON l.raceid = ra.raceid
+        GROUP BY ra.year
+    )
+    SELECT
+        sc.year,
+        md5(concat_ws(':', sc.checksum, rc.checksum, lc.laps, lc.fastest)) AS checksum
+    FROM race_checksums sc
+    LEFT JOIN result_checksums rc ON sc.year = rc.year
+    LEFT JOIN lap_checksums lc ON sc.year = lc.year;
+"""
+
+
+def create_summaries():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SET LOCAL lock_timeout = %s;', (DDL_LOCK_TIMEOUT,))
+        for name, query in SUMMARIES.items():
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {name} AS {query} WITH NO DATA;', {'year': None})
+        for index in INDEXES:
+            cur.execute(index)
+        cur.execute(
+            """
+                CREATE TABLE IF NOT EXISTS summary_refresh (
+                    year integer PRIMARY KEY,
+                    checksum text NOT NULL,
+                    refreshed_at timestamptz NOT NULL DEFAULT now()
+                );
+            """
+        )
+        conn.commit()
+        cur.close()
+
+def setup_summaries():
+    # Once per database, before the first refresh: refresh_season writes the
+    # summary tables and bumps the versions. Refreshing runs no DDL.
+    create_summaries()
+    create_data_versions()
+
+def summaries_exist():
+    records_data = fetch_df("SELECT to_regclass('summary_refresh') IS NOT NULL AS created;")
+    return bool(records_data['created'][0])
+
+def changed_seasons():
+    current, refreshed = fetch_many([
+        (SEASON_CHECKSUMS, None),
+        ('SELECT year, checksum FROM summary_refresh;', None),
+    ])
+
+    merged = current.merge(refreshed, on='year', how='left', suffixes=('', '_refreshed'))
+    changed = merged[merged['checksum'] != merged['checksum_refreshed']]
+
+    return dict(zip(changed['year'].astype(int), changed['checksum']))
+
+def refresh_season(year, checksum=None):
+    start = time.perf_counter()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # One transaction per season: readers keep seeing the old rows
+        # until the new ones are committed. Two refreshes of the same season
+        # (say, two instances starting at once) take turns.
+        cur.execute('SELECT pg_advisory_xact_lock(%s, %s);', (SUMMARY_LOCK, year))
+        for name, query in SUMMARIES.items():
+            cur.execute(f'DELETE FROM {name} WHERE year = %(year)s;', {'year': year})
+            cur.execute(f'INSERT INTO {name} {query};', {'year': year})
+        if checksum is not None:
+            cur.execute(
+                """
+                    INSERT INTO summary_refresh (year, checksum, refreshed_at)
+                    VALUES (%s, %s, now())
+                    ON CONFLICT (year) DO UPDATE SET checksum = EXCLUDED.checksum, refreshed_at = EXCLUDED.refreshed_at;
+                """, (year, checksum)
+            )
+        # Anything cached between the source change and now was built from
+        # the old summary rows
+        bump(cur, [year])
+        conn.commit()
+        cur.close()
+
+    return time.perf_counter() - start
+
+def refresh_summaries(seasons=None, force=False):
+    start = time.perf_counter()
+
+    checksums = changed_seasons() if not force else dict(
+        fetch_df(SEASON_CHECKSUMS).astype({'year': int}).itertuples(index=False)
+    )
+    if seasons is not None:
+        seasons = {int(year) for year in seasons}
+        if force:
+            checksums = {year: checksums.get(year) for year in seasons}
+        else:
+            checksums = {year: checksum for year, checksum in checksums.items() if year in seasons}
+
+    for year, checksum in sorted(checksums.items()):
+        elapsed = refresh_season(year, checksum)
+        print(f'{year} refreshed in {elapsed:.2f}s')
+
+    print(f'Refreshed {len(checksums)} seasons in {time.perf_counter() - start:.2f}s')
+    return sorted(checksums)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summary tables behind the EDA queries')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('create', help='Create the summary tables and the data versions if they are missing')
+
+    refresh_parser = subparsers.add_parser('refresh', help='Rebuild the seasons whose source data changed')
+    refresh_parser.add_argument('--seasons', type=int, nargs='*', help='Only consider these seasons')
+    refresh_parser.add_argument('--all', action='store_true', help='Rebuild even if nothing changed')
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        setup_summaries()
+    elif args.command == 'refresh':
+        refresh_summaries(args.seasons, force=args.all)
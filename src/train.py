@@ -0,0 +1,349 @@
+import os
+import time
+import json
+import pickle
+import shutil
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from db import fetch_df
+from modelsfunctions import MODEL_FEATURES
+from modelstore import MODELS_DIR, CURRENT_LINK, MODEL_NAMES, METRICS_SUFFIX, ESTIMATOR_SUFFIX, ModelChecksumError, ModelStore, store, sha256sum, _jsonable
+
+VERSIONS_DIR = os.path.join(MODELS_DIR, 'versions')
+TEST_SIZE = 0.2
+CV_FOLDS = 5
+RANDOM_STATE = 0
+
+# One bulk query per training set. The binary model's is the one in
+# f1analysis/logisticbinary.qmd.
+BINARY_QUERY = """
+    SELECT
+        CASE
+            WHEN r.points > 0 THEN 1
+            ELSE 0
+        END AS scored_or_no,
+        ra.year,
+        ra.raceid,
+        r.grid,
+        r.milliseconds / 60000 AS minutes,
+        r.fastestlapspeed, r.constructorid,
+        MAX(p.stop) as pit_stop
+    FROM results r
+    JOIN races ra ON r.raceid = ra.raceid
+    JOIN pit_stops p ON r.raceid = p.raceid
+    WHERE r.milliseconds IS NOT NULL AND r.fastestlapspeed IS NOT NULL
+    GROUP BY scored_or_no, r.grid, r.milliseconds, r.fastestlapspeed, r.constructorid, ra.year, ra.raceid;
+"""
+
+# A constructor's season, averaged over its drivers' results. 'Win' is a
+# top three finish in the season's points; pit stop data starts in 2011.
+CONSTRUCTOR_SEASON_QUERY = """
+    WITH stops AS (
+        SELECT raceid, driverid, MAX(stop) AS stops
+        FROM pit_stops
+        GROUP BY raceid, driverid
+    ),
+    seasons AS (
+        SELECT
+            ra.year,
+            c.name,
+            AVG(r.points) AS avgpoints,
+            AVG(r.grid) AS avginitialpos,
+            AVG(r.positionorder) AS avgfinalpos,
+            AVG(r.laps) AS avglaps,
+            AVG(r.fastestlapspeed) AS avgfastestlapspeed,
+            SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS totalwins,
+            AVG(COALESCE(st.stops, 0)) AS avgstops,
+            AVG(CASE WHEN s.status_category IN ('Finished', 'Not finished') THEN 0 ELSE 1 END) AS avgretirements,
+            SUM(r.points) AS totalpoints
+        FROM results r
+        JOIN races ra ON r.raceid = ra.raceid
+        JOIN constructors c ON r.constructorid = c.constructorid
+        LEFT JOIN stops st ON st.raceid = r.raceid AND st.driverid = r.driverid
+        LEFT JOIN summary_result_status s ON r.resultid = s.resultid
+        WHERE ra.year >= 2011
+        GROUP BY ra.year, c.constructorid, c.name
+    )
+    SELECT
+        *,
+        CASE
+            WHEN RANK() OVER (PARTITION BY year ORDER BY totalpoints DESC) <= 3 THEN 'Win'
+            ELSE 'No win'
+        END AS result
+    FROM seasons
+    WHERE avgfastestlapspeed IS NOT NULL
+    ORDER BY year, name;
+"""
+
+KNN_NEIGHBORS = list(range(1, 31))
+SVM_C = [0.1, 1, 10, 100, 1000]
+
+FIG_LAYOUT = dict(
+    margin={'b': 0, 'r': 30, 'l': 30, 't': 50},
+    xaxis={'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+    yaxis={'gridcolor': '#111', 'tickfont': {'color': 'white'}},
+    plot_bgcolor='rgba(0, 0, 0, 0.0)',
+    paper_bgcolor='rgba(0, 0, 0, 0.0)',
+    font_color='white',
+    hoverlabel=dict(bgcolor='#111'),
+)
+
+
+def _split(data, target):
+    from sklearn.model_selection import train_test_split
+    return train_test_split(data, test_size=TEST_SIZE, stratify=data[target], random_state=RANDOM_STATE)
+
+def _scores(y_true, y_pred, y_score, average='binary', pos_label=1):
+    from sklearn.metrics import precision_score, recall_score, f1_score, roc_auc_score
+    return {
+        'precision': precision_score(y_true, y_pred, average=average, pos_label=pos_label),
+        'recall': recall_score(y_true, y_pred, average=average, pos_label=pos_label),
+        'f1': f1_score(y_true, y_pred, average=average, pos_label=pos_label),
+        'auc': roc_auc_score(np.asarray(y_true) == pos_label, y_score),
+    }
+
+def _fig_cm(y_true, y_pred, labels, names):
+    import plotly.figure_factory as ff
+    from sklearn.metrics import confusion_matrix
+
+    fig_cm = ff.create_annotated_heatmap(
+        confusion_matrix(y_true, y_pred, labels=labels).T, x=names, y=names,
+        colorscale=[[0, '#FFFFFF'], [1, '#e10600']]
+    )
+    fig_cm.update_layout(title='Matriz de Confusión', **FIG_LAYOUT)
+    return fig_cm
+
+def _fig_acc(x, accuracy, title, log_x=False):
+    import plotly.express as px
+
+    fig_acc = px.line(x=x, y=accuracy, markers=True, title=title, labels=dict(x='', y='Accuracy'), log_x=log_x)
+    fig_acc.update_traces(line_color='#e10600', name='Accuracy')
+    fig_acc.update_layout(showlegend=False, **FIG_LAYOUT)
+    return fig_acc
+
+def _fit_logit(formula, data):
+    import statsmodels.formula.api as sm
+    return sm.logit(formula, data=data).fit(disp=0)
+
+def _logit_fold_auc(formula, train, test):
+    from sklearn.metrics import roc_auc_score
+    fit = _fit_logit(formula, train)
+    return roc_auc_score(test['scored_or_no'], fit.predict(test))
+
+def train_binarylsm(data, jobs):
+    import plotly.express as px
+    from sklearn.metrics import roc_curve
+    from sklearn.model_selection import StratifiedKFold
+
+    data = data.astype({'fastestlapspeed': 'float64', 'grid': 'int64', 'minutes': 'int64'})
+    formula = f'scored_or_no ~ {" + ".join(MODEL_FEATURES["binarylsm"])}'
+    train, test = _split(data, 'scored_or_no')
+
+    # Logit has nothing to tune; the folds only estimate how stable it is
+    folds = StratifiedKFold(CV_FOLDS, shuffle=True, random_state=RANDOM_STATE).split(train, train['scored_or_no'])
+    cv_auc = Parallel(n_jobs=jobs)(
+        delayed(_logit_fold_auc)(formula, train.iloc[fit_rows], train.iloc[test_rows])
+        for fit_rows, test_rows in folds
+    )
+
+    log_reg = _fit_logit(formula, train)
+    y_pred = np.asarray(log_reg.predict(test))
+    y_pred_a = np.where(y_pred > 0.5, 1, 0)
+    y = test['scored_or_no'].to_numpy()
+    log_reg.remove_data()
+
+    metrics = _scores(y, y_pred_a, y_pred)
+    fpr, tpr, thresholds = roc_curve(y, y_pred)
+
+    fig_hist = px.histogram(x=y_pred, color=y, nbins=50, labels=dict(color='True Labels', x='Score'))
+    fig_hist.update_layout(**dict(FIG_LAYOUT, margin={'b': 0, 'r': 30, 'l': 30, 't': 0}))
+
+    df = pd.DataFrame({'False Positive Rate': fpr, 'True Positive Rate': tpr}, index=np.minimum(thresholds, 1))
+    df.index.name = 'Thresholds'
+    df.columns.name = 'Rate'
+    fig_thresh = px.line(df, title='TPR y FPR en cada umbral')
+    fig_thresh.update_yaxes(scaleanchor='x', scaleratio=1)
+    fig_thresh.update_xaxes(range=[0, 1], constrain='domain')
+    fig_thresh.update_layout(**FIG_LAYOUT)
+
+    fig_roc = px.area(x=fpr, y=tpr, title='Curva de ROC', labels=dict(x='False Positive Rate', y='True Positive Rate'))
+    fig_roc.add_shape(type='line', line=dict(dash='dash', color='white'), x0=0, x1=1, y0=0, y1=1)
+    fig_roc.add_annotation(
+        xref='paper', yref='paper', x=.95, y=.05, text=f'AUC: {metrics["auc"]:.4f}',
+        showarrow=False, bordercolor='black', borderwidth=.5, bgcolor='#e10600'
+    )
+    fig_roc.update_yaxes(scaleanchor='x', scaleratio=1)
+    fig_roc.update_xaxes(constrain='domain')
+    fig_roc.update_layout(**FIG_LAYOUT)
+
+    metrics.update(
+        fig_hist=fig_hist,
+        fig_thresh=fig_thresh,
+        fig_roc=fig_roc,
+        fig_cm=_fig_cm(y, y_pred_a, [0, 1], ['No Puntuó', 'Puntuó']),
+        training={'rows': len(data), 'cv_auc': float(np.mean(cv_auc)), 'params': {'formula': formula}},
+    )
+    return log_reg, metrics
+
+def _search(estimator, grid, train, target, features, jobs):
+    from sklearn.model_selection import GridSearchCV, StratifiedKFold
+
+    search = GridSearchCV(
+        estimator, grid, scoring='accuracy', n_jobs=jobs,
+        cv=StratifiedKFold(CV_FOLDS, shuffle=True, random_state=RANDOM_STATE)
+    )
+    search.fit(train[features], train[target])
+    return search
+
+def train_knn(data, jobs):
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import KNeighborsClassifier
+
+    features = MODEL_FEATURES['knn']
+    train, test = _split(data, 'result')
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('knn', KNeighborsClassifier(metric='cosine', weights='uniform')),
+    ])
+    search = _search(pipeline, {'knn__n_neighbors': KNN_NEIGHBORS}, train, 'result', features, jobs)
+
+    model = search.best_estimator_
+    y_pred = model.predict(test[features])
+    y_score = model.predict_proba(test[features])[:, list(model.classes_).index('Win')]
+
+    metrics = _scores(test['result'], y_pred, y_score, average='weighted', pos_label='Win')
+    metrics.update(
+        fig_cm=_fig_cm(test['result'], y_pred, ['No win', 'Win'], ['No win', 'Win']),
+        fig_acc=_fig_acc(KNN_NEIGHBORS, search.cv_results_['mean_test_score'], 'Accuracy por número de vecinos'),
+        train_names=[f'{name} {year}' for name, year in zip(train['name'], train['year'])],
+        training={'rows': len(data), 'cv_accuracy': float(search.best_score_), 'params': search.best_params_},
+    )
+    return model, metrics
+
+def train_svm(data, jobs):
+    from sklearn.svm import SVC
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.multiclass import OneVsOneClassifier
+
+    features = MODEL_FEATURES['svm']
+    data = data.assign(result=(data['result'] == 'Win').astype('int64'))
+    train, test = _split(data, 'result')
+    # Linear kernel only: it is what the dashboard compiles to a dot product
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('svm', OneVsOneClassifier(SVC(kernel='linear'))),
+    ])
+    search = _search(pipeline, {'svm__estimator__C': SVM_C}, train, 'result', features, jobs)
+
+    model = search.best_estimator_
+    y_pred = model.predict(test[features])
+    y_score = model.decision_function(test[features])
+
+    metrics = _scores(test['result'], y_pred, y_score, average='weighted')
+    metrics.update(
+        fig_cm=_fig_cm(test['result'], y_pred, [0, 1], ['No win', 'Win']),
+        fig_acc=_fig_acc(SVM_C, search.cv_results_['mean_test_score'], 'Accuracy por valor de C', log_x=True),
+        training={'rows': len(data), 'cv_accuracy': float(search.best_score_), 'params': search.best_params_},
+    )
+    return model, metrics
+
+TRAINERS = {
+    'binarylsm': (BINARY_QUERY, train_binarylsm),
+    'knn': (CONSTRUCTOR_SEASON_QUERY, train_knn),
+    'svm': (CONSTRUCTOR_SEASON_QUERY, train_svm),
+}
+
+def write_artifact(models_dir, name, estimator, metrics):
+    with open(os.path.join(models_dir, f'{name}{METRICS_SUFFIX}'), 'w') as f:
+        json.dump({key: _jsonable(value) for key, value in metrics.items()}, f, separators=(',', ':'), default=_jsonable)
+    with open(os.path.join(models_dir, f'{name}{ESTIMATOR_SUFFIX}'), 'wb') as f:
+        pickle.dump(estimator, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return [f'{name}{METRICS_SUFFIX}', f'{name}{ESTIMATOR_SUFFIX}']
+
+def promote(version_dir, filenames):
+    # The version directory is completed with the live artifacts of the
+    # models that weren't retrained and gets a manifest covering all of
+    # them. Only then the `current` link is flipped: the store never sees
+    # a file without its checksum or a half-promoted set.
+    live_dir = store.live_dir()
+    live_manifest = store.manifest(live_dir)
+    retrained = {filename.split('.')[0] for filename in filenames}
+
+    filenames = list(filenames)
+    for name in MODEL_NAMES:
+        if name in retrained:
+            continue
+        for filename in [f'{name}.pkl', f'{name}{METRICS_SUFFIX}', f'{name}{ESTIMATOR_SUFFIX}']:
+            source = os.path.join(live_dir, filename)
+            if not os.path.exists(source):
+                continue
+            target = os.path.join(version_dir, filename)
+            shutil.copyfile(source, target)
+            expected = live_manifest.get(filename, {}).get('sha256')
+            if expected is not None and sha256sum(target) != expected:
+                raise ModelChecksumError(f'{source} does not match {live_dir} manifest, not promoting')
+            filenames.append(filename)
+    ModelStore(version_dir, download=False).write_manifest(filenames)
+
+    link = os.path.join(MODELS_DIR, CURRENT_LINK)
+    tmp_link = f'{link}.{os.getpid()}.tmp'
+    os.symlink(os.path.relpath(version_dir, MODELS_DIR), tmp_link)
+    os.replace(tmp_link, link)
+
+def run(names=None, jobs=-1, version=None, promote_version=False):
+    names = names or MODEL_NAMES
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    datasets = {}
+    filenames = []
+    timings = {}
+    for name in names:
+        query, trainer = TRAINERS[name]
+        try:
+            start = time.perf_counter()
+            if query not in datasets:
+                datasets[query] = fetch_df(query)
+            loaded = time.perf_counter()
+
+            estimator, metrics = trainer(datasets[query], jobs)
+            metrics['training'].update(version=version, seconds=time.perf_counter() - loaded)
+            filenames += write_artifact(version_dir, name, estimator, metrics)
+
+            timings[name] = (loaded - start, time.perf_counter() - loaded)
+            print(
+                f'{name}: {metrics["training"]["rows"]} rows, query {timings[name][0]:.2f}s, '
+                f'training {timings[name][1]:.2f}s, f1 {metrics["f1"]:.4f}, auc {metrics["auc"]:.4f}, '
+                f'params {metrics["training"]["params"]}'
+            )
+        except Exception as e:
+            print(f'Error while training {name}', e)
+
+    ModelStore(version_dir, download=False).write_manifest(filenames)
+    print(f'Version {version} written to {version_dir}')
+
+    if promote_version and filenames:
+        promote(version_dir, filenames)
+        print(f'Version {version} promoted: {os.path.join(MODELS_DIR, CURRENT_LINK)} -> {version_dir}')
+
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Retrain the dashboard models from the database')
+    parser.add_argument('--models', nargs='*', choices=MODEL_NAMES, help='Only these models')
+    parser.add_argument('--jobs', type=int, default=-1, help='Parallel jobs for cross-validation and the parameter search (-1: all cores)')
+    parser.add_argument('--version', help='Version name (UTC timestamp by default)')
+    parser.add_argument('--promote', action='store_true', help=f'Point {os.path.join(MODELS_DIR, CURRENT_LINK)} at the new version')
+
+    args = parser.parse_args()
+
+    run(args.models, args.jobs, args.version, args.promote)
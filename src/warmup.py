@@ -0,0 +1,172 @@
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import cache, HOUR
+from edafunctions import get_seasons, get_season_bundle, get_sankey_data, get_constructor_stats_names, get_driver_age_point_distribution_data
+from modelsfunctions import get_season_inputs
+from modelstore import MODEL_NAMES, get_metrics
+from forecastfunctions import FORECAST_TEAMS, load_arima, warm_forecasts
+from inference import get_fast_model
+from seasonstore import load_seasons, loaded_seasons
+
+WARMUP_WORKERS = int(os.getenv('WARMUP_WORKERS', 4))
+WARM_CACHE_ON_STARTUP = os.getenv('WARM_CACHE_ON_STARTUP', '0') == '1'
+
+WARMUP_LOCK_KEY = 'warmup:lock'
+WARMUP_STATUS_KEY = 'warmup:status'
+
+
+def _season_tasks(year):
+    # The per-constructor views are slices of the season bundle, so only the
+    # functions that actually run a query need to be warmed.
+    return [
+        (get_season_bundle, (year,)),
+        (get_sankey_data, (year,)),
+        (get_season_inputs, (year,)),
+    ]
+
+def _constructor_tasks(year):
+    constructor_names = get_constructor_stats_names(year)
+    return [
+        (get_driver_age_point_distribution_data, (name, year))
+        for name in constructor_names['name']
+    ]
+
+def warm_season(year):
+    start = time.perf_counter()
+    errors = []
+
+    for func, args in _season_tasks(year):
+        try:
+            func(*args)
+        except Exception as e:
+            errors.append(f'{func.__name__}{args}: {e}')
+
+    try:
+        tasks = _constructor_tasks(year)
+    except Exception as e:
+        errors.append(f'get_constructor_stats_names({year},): {e}')
+        tasks = []
+
+    for func, args in tasks:
+        try:
+            func(*args)
+        except Exception as e:
+            errors.append(f'{func.__name__}{args}: {e}')
+
+    return time.perf_counter() - start, errors
+
+def warm_models():
+    errors = []
+    for name in MODEL_NAMES:
+        try:
+            get_metrics(name)
+        except Exception as e:
+            errors.append(f'{name}: {e}')
+    return errors
+
+def load_shared_data():
+    # Run by the gunicorn master when the app is preloaded (SHARED_DATA=1):
+    # the workers forked from it share these pages instead of loading copies.
+    start = time.perf_counter()
+    size = load_seasons()
+
+    errors = []
+    for name in MODEL_NAMES:
+        try:
+            get_metrics(name)
+            get_fast_model(name)
+        except Exception as e:
+            errors.append(f'{name}: {e}')
+    for team in FORECAST_TEAMS:
+        try:
+            load_arima(team)
+        except Exception as e:
+            errors.append(f'{team}: {e}')
+
+    print(
+        f'Shared data loaded in {time.perf_counter() - start:.2f}s: {len(loaded_seasons())} seasons '
+        f'({size / 2 ** 20:.1f} MB mapped), models{" with errors: " + "; ".join(errors) if errors else ""}'
+    )
+    return errors
+
+def _set_status(**status):
+    cache.set(WARMUP_STATUS_KEY, status, retry=True)
+
+def get_status():
+    return cache.get(WARMUP_STATUS_KEY, default={'state': 'pending'}, retry=True)
+
+def warm_cache(seasons=None, workers=WARMUP_WORKERS):
+    start = time.perf_counter()
+    started = time.time()
+
+    if seasons is None:
+        seasons = sorted(get_seasons()['year'], reverse=True)
+    seasons = [int(year) for year in seasons]
+
+    _set_status(state='running', pid=os.getpid(), started=started, done=0, total=len(seasons))
+
+    failed = {}
+    model_errors = warm_models()
+    if model_errors:
+        failed['models'] = model_errors
+    forecast_errors = warm_forecasts()
+    if forecast_errors:
+        failed['forecasts'] = forecast_errors
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(warm_season, year): year for year in seasons}
+        for future in as_completed(futures):
+            year = futures[future]
+            elapsed, errors = future.result()
+            done += 1
+            if errors:
+                failed[year] = errors
+            print(f'[{done}/{len(seasons)}] {year} warmed in {elapsed:.2f}s' + (f' ({len(errors)} errors)' if errors else ''))
+            _set_status(state='running', pid=os.getpid(), started=started, done=done, total=len(seasons))
+
+    elapsed = time.perf_counter() - start
+    print(f'Warmed {len(seasons)} seasons in {elapsed:.2f}s')
+    for year, errors in failed.items():
+        for error in errors:
+            print(f'  {year}: {error}')
+
+    _set_status(state='done', started=started, finished=time.time(), elapsed=elapsed, total=len(seasons), failed=sorted(failed, key=str))
+
+    return {'seasons': len(seasons), 'elapsed': elapsed, 'failed': failed}
+
+def start_background_warmup(workers=WARMUP_WORKERS):
+    status = get_status()
+    if status['state'] == 'done' and time.time() - status['finished'] < HOUR:
+        return None
+
+    # Every gunicorn worker calls this at startup; the shared cache lock makes
+    # sure only one of them does the work while the rest read its results.
+    if not cache.add(WARMUP_LOCK_KEY, os.getpid(), expire=HOUR, retry=True):
+        return None
+
+    def run():
+        try:
+            warm_cache(workers=workers)
+        except Exception as e:
+            print('Error while warming the cache', e)
+            _set_status(state='failed', error=str(e))
+        finally:
+            cache.delete(WARMUP_LOCK_KEY, retry=True)
+
+    thread = threading.Thread(target=run, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute every season into the shared cache')
+    parser.add_argument('--workers', type=int, default=WARMUP_WORKERS, help='Seasons warmed in parallel')
+    parser.add_argument('--seasons', type=int, nargs='*', help='Only warm these seasons')
+
+    args = parser.parse_args()
+    warm_cache(args.seasons, args.workers)
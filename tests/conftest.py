@@ -0,0 +1,248 @@
+import os
+import sys
+import random
+import tempfile
+import itertools
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+# The app modules read their configuration once, on import
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='f1-cache-'))
+os.environ.setdefault('MODEL_DOWNLOAD', '0')
+
+# The Ergast tables the app reads, as they are in the database.
+# categorize_status() lives in the production database only; here it reads
+# a plain table.
+SCHEMA = """
+    CREATE TABLE seasons (year integer PRIMARY KEY, url text);
+    CREATE TABLE circuits (
+        circuitid integer PRIMARY KEY, circuitref text, name text, location text, country text,
+        lat double precision, lng double precision, alt integer, url text
+    );
+    CREATE TABLE constructors (
+        constructorid integer PRIMARY KEY, constructorref text, name text, nationality text, url text
+    );
+    CREATE TABLE drivers (
+        driverid integer PRIMARY KEY, driverref text, number integer, code text,
+        forename text, surname text, dob date, nationality text, url text
+    );
+    CREATE TABLE status (statusid integer PRIMARY KEY, status text);
+    CREATE TABLE status_category (statusid integer PRIMARY KEY, status_category text);
+    CREATE TABLE races (
+        raceid integer PRIMARY KEY, year integer, round integer, circuitid integer,
+        name text, date date, time text, url text
+    );
+    CREATE TABLE results (
+        resultid integer PRIMARY KEY, raceid integer, driverid integer, constructorid integer,
+        number integer, grid integer, position integer, positiontext text, positionorder integer,
+        points double precision, laps integer, time text, milliseconds integer, fastestlap integer,
+        rank integer, fastestlaptime text, fastestlapspeed double precision, statusid integer
+    );
+    CREATE TABLE lap_times (
+        raceid integer, driverid integer, lap integer, position integer, time text, milliseconds integer,
+        PRIMARY KEY (raceid, driverid, lap)
+    );
+    CREATE TABLE pit_stops (
+        raceid integer, driverid integer, stop integer, lap integer, time text, duration text,
+        milliseconds integer, PRIMARY KEY (raceid, driverid, stop)
+    );
+    CREATE TABLE constructor_results (
+        constructorresultsid integer PRIMARY KEY, raceid integer, constructorid integer,
+        points double precision, status text
+    );
+
+    CREATE FUNCTION categorize_status() RETURNS TABLE (statusid integer, status_category text) AS $$
+        SELECT statusid, status_category FROM status_category
+    $$ LANGUAGE sql STABLE;
+"""
+
+TABLES = [
+    'seasons', 'circuits', 'constructors', 'drivers', 'status', 'status_category',
+    'races', 'results', 'lap_times', 'pit_stops', 'constructor_results',
+]
+
+_databases = itertools.count()
+
+
+def make_tables(years=(2021, 2022, 2023)):
+    # Three seasons of the same three races, six drivers in three teams
+    rng = random.Random(1)
+
+    circuits = pd.DataFrame({
+        'circuitid': [1, 2, 3], 'circuitref': ['bahrain', 'jeddah', 'monza'],
+        'name': ['Bahrain International Circuit', 'Jeddah Corniche Circuit', 'Autodromo Nazionale di Monza'],
+        'location': ['Sakhir', 'Jeddah', 'Monza'], 'country': ['Bahrain', 'Saudi Arabia', 'Italy'],
+        'lat': [26.0325, 21.6319, 45.6156], 'lng': [50.5106, 39.1044, 9.28111], 'alt': [7, 15, 162],
+        'url': ['u1', 'u2', 'u3'],
+    })
+    constructors = pd.DataFrame({
+        'constructorid': [1, 2, 3], 'constructorref': ['red_bull', 'ferrari', 'mercedes'],
+        'name': ['Red Bull', 'Ferrari', 'Mercedes'], 'nationality': ['Austrian', 'Italian', 'German'],
+        'url': ['u1', 'u2', 'u3'],
+    })
+    drivers = pd.DataFrame({
+        'driverid': range(1, 7), 'driverref': ['verstappen', 'perez', 'leclerc', 'sainz', 'hamilton', 'russell'],
+        'number': [1, 11, 16, 55, 44, 63], 'code': ['VER', 'PER', 'LEC', 'SAI', 'HAM', 'RUS'],
+        'forename': ['Max', 'Sergio', 'Charles', 'Carlos', 'Lewis', 'George'],
+        'surname': ['Verstappen', 'Pérez', 'Leclerc', 'Sainz', 'Hamilton', 'Russell'],
+        'dob': [dt.date(1997, 9, 30), dt.date(1990, 1, 26), dt.date(1997, 10, 16),
+                dt.date(1994, 9, 1), dt.date(1985, 1, 7), dt.date(1998, 2, 15)],
+        'nationality': ['Dutch', 'Mexican', 'Monegasque', 'Spanish', 'British', 'British'],
+        'url': ['u1', 'u2', 'u3', 'u4', 'u5', 'u6'],
+    })
+    status = pd.DataFrame({'statusid': [1, 5, 4, 11], 'status': ['Finished', 'Engine', 'Collision', '+1 Lap']})
+    status_category = pd.DataFrame({
+        'statusid': [1, 5, 4, 11], 'status_category': ['Finished', 'Mechanical', 'Accident', 'Finished'],
+    })
+
+    races, results, laps, pits, constructor_results = [], [], [], [], []
+    for year in years:
+        for round_, circuitid in enumerate([1, 2, 3], 1):
+            raceid = len(races) + 1
+            races.append(dict(
+                raceid=raceid, year=year, round=round_, circuitid=circuitid,
+                name=f'{circuits["location"][circuitid - 1]} Grand Prix', date=dt.date(year, 3, 7 * round_),
+                time='15:00:00', url=f'u{raceid}',
+            ))
+
+            order = list(range(1, 7))
+            rng.shuffle(order)
+            for position, driverid in enumerate(order, 1):
+                statusid = rng.choice([1, 1, 1, 5, 4, 11])
+                finished = statusid in (1, 11)
+                results.append(dict(
+                    resultid=len(results) + 1, raceid=raceid, driverid=driverid, constructorid=(driverid + 1) // 2,
+                    number=driverid, grid=rng.randint(1, 20), position=position if finished else None,
+                    positiontext=str(position) if finished else 'R', positionorder=position,
+                    points=float(max(0, 26 - 5 * position)), laps=57, time=None,
+                    milliseconds=5400000 + position * 1000 if finished else None, fastestlap=40, rank=position,
+                    fastestlaptime='1:30.000', fastestlapspeed=round(200 + rng.random() * 20, 3), statusid=statusid,
+                ))
+                for lap in range(1, 4):
+                    laps.append(dict(
+                        raceid=raceid, driverid=driverid, lap=lap, position=position, time='1:30.000',
+                        milliseconds=90000 + rng.randint(0, 5000),
+                    ))
+                for stop in range(1, rng.randint(2, 4)):
+                    pits.append(dict(
+                        raceid=raceid, driverid=driverid, stop=stop, lap=10 * stop, time='15:30:00',
+                        duration='22.100', milliseconds=22100,
+                    ))
+            for constructorid in (1, 2, 3):
+                constructor_results.append(dict(
+                    constructorresultsid=len(constructor_results) + 1, raceid=raceid,
+                    constructorid=constructorid, points=10.0, status=None,
+                ))
+
+    results = pd.DataFrame(results).astype({'position': 'Int64', 'milliseconds': 'Int64'})
+
+    return {
+        'seasons': pd.DataFrame({'year': list(years), 'url': [f'u{year}' for year in years]}),
+        'circuits': circuits,
+        'constructors': constructors,
+        'drivers': drivers,
+        'status': status,
+        'status_category': status_category,
+        'races': pd.DataFrame(races),
+        'results': results,
+        'lap_times': pd.DataFrame(laps),
+        'pit_stops': pd.DataFrame(pits),
+        'constructor_results': pd.DataFrame(constructor_results),
+    }
+
+def write_csv(tables, directory):
+    # Ergast dump format: a header, \N for NULL
+    for name, records_data in tables.items():
+        records_data.to_csv(os.path.join(directory, f'{name}.csv'), index=False, na_rep='\\N')
+
+def _rows(records_data):
+    return [
+        tuple(None if pd.isna(value) else value for value in row)
+        for row in records_data.astype(object).itertuples(index=False)
+    ]
+
+
+@pytest.fixture
+def tables():
+    return make_tables()
+
+@pytest.fixture(scope='session')
+def postgres_url():
+    url = os.getenv('TEST_DATABASE_URL')
+    if url:
+        return url
+
+    pgserver = pytest.importorskip('pgserver', reason='needs TEST_DATABASE_URL or pgserver')
+    server = pgserver.get_server(tempfile.mkdtemp(prefix='f1-pg-'), cleanup_mode='stop')
+    return server.get_uri()
+
+@pytest.fixture
+def scratch_db(postgres_url, tables):
+    # A fresh database per test, loaded with the tables above; the app's
+    # pool is pointed at it for the duration of the test
+    import psycopg2 as psy
+    from psycopg2.extensions import make_dsn, parse_dsn
+    from psycopg2.extras import execute_values
+
+    import db
+    import dataversion
+    from cache import cache
+    from summaries import setup_summaries
+
+    name = f'f1_test_{os.getpid()}_{next(_databases)}'
+    admin = psy.connect(postgres_url)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE DATABASE {name};')
+
+    url = make_dsn(**dict(parse_dsn(postgres_url), dbname=name))
+    conn = psy.connect(url)
+    cur = conn.cursor()
+    cur.execute(SCHEMA)
+    for table in TABLES:
+        columns = ', '.join(tables[table].columns)
+        execute_values(cur, f'INSERT INTO {table} ({columns}) VALUES %s;', _rows(tables[table]))
+    conn.commit()
+    conn.close()
+
+    dsn = db.db_pool.dsn
+    db.db_pool.closeall()
+    db.db_pool.dsn = url
+    dataversion.clear_versions()
+    # Every scratch database starts from the same versions
+    cache.clear()
+    # As on a deployed database: the one-time setup has run
+    setup_summaries()
+
+    yield url
+
+    db.db_pool.closeall()
+    db.db_pool.dsn = dsn
+    dataversion.clear_versions()
+    admin.cursor().execute(f'DROP DATABASE {name} WITH (FORCE);')
+    admin.close()
+
+@pytest.fixture
+def local_data(scratch_db, tmp_path, monkeypatch):
+    # The scratch database with its summaries, exported to Parquet and
+    # served by the DuckDB backend instead
+    import db
+    import dataversion
+    import localstore
+    from summaries import refresh_summaries
+
+    refresh_summaries()
+    localstore.export_tables(str(tmp_path / 'data'))
+
+    monkeypatch.setattr(db, 'DATA_BACKEND', 'local')
+    monkeypatch.setattr(dataversion, 'DATA_BACKEND', 'local')
+    monkeypatch.setattr(localstore, 'LOCAL_DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(localstore, '_database', None)
+
+    yield str(tmp_path / 'data')
+
+    localstore._database = None
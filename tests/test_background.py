@@ -0,0 +1,55 @@
+import os
+
+import pytest
+from diskcache import Cache
+
+
+@pytest.fixture
+def manager(tmp_path):
+    from background import PooledDiskcacheManager
+
+    return PooledDiskcacheManager(Cache(str(tmp_path)), cache_by=[lambda: '1'])
+
+def test_cache_key_follows_the_season_version(manager, monkeypatch):
+    import dataversion
+    from background import versioned
+
+    versions = {2022: 5, 2023: 7}
+    monkeypatch.setattr(dataversion, 'get_versions', lambda: versions)
+
+    @versioned(dataversion.season_version)
+    def figure(year):
+        return year
+
+    before = {year: manager.build_cache_key(figure, [year], []) for year in (2022, 2023)}
+    versions[2023] = 8
+    after = {year: manager.build_cache_key(figure, [year], []) for year in (2022, 2023)}
+
+    assert after[2022] == before[2022]
+    assert after[2023] != before[2023]
+
+def test_terminate_running_job(manager, monkeypatch):
+    import background
+
+    killed = []
+    monkeypatch.setattr(background, '_kill', killed.append)
+    manager.handle.set(background._job_key('a'), (12345, 'key-a'))
+
+    manager.terminate_job('a')
+
+    assert killed == [12345]
+    assert not manager.job_running('a')
+
+def test_terminate_finished_job_keeps_its_process(manager, monkeypatch):
+    import background
+
+    # The result is stored, only the bookkeeping in _run_job is left
+    killed = []
+    monkeypatch.setattr(background, '_kill', killed.append)
+    manager.handle.set(background._job_key('a'), (os.getpid(), 'key-a'))
+    manager.handle.set('key-a', 'result')
+
+    manager.terminate_job('a')
+
+    assert killed == []
+    assert manager.result_ready('key-a')
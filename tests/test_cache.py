@@ -0,0 +1,73 @@
+import os
+import sys
+import subprocess
+
+from conftest import SRC
+
+COUNT = """
+import sys
+from cache import memoize
+
+@memoize(name='tests.square')
+def square(x):
+    return x * x
+
+for x in map(int, sys.argv[1:]):
+    square(x)
+"""
+
+STATS = """
+from cache import cache_stats
+print(cache_stats()['square'])
+"""
+
+
+def _run(code, env, *args):
+    return subprocess.run(
+        [sys.executable, '-c', code, *args], env=env, cwd=SRC, check=True, capture_output=True, text=True
+    ).stdout
+
+def test_memoize_counts():
+    from cache import memoize
+
+    @memoize(name='tests.cube')
+    def cube(x):
+        return x ** 3
+
+    cube.cache_clear()
+    before = cube.cache_stats()
+    cube(2), cube(2), cube(3)
+
+    assert cube.cache_stats() == {'hits': before['hits'] + 1, 'misses': before['misses'] + 2}
+
+def test_stats_add_up_across_processes(tmp_path):
+    # Two workers sharing the cache and the Prometheus directory: any of
+    # them reports both
+    env = dict(
+        os.environ,
+        CACHE_DIR=str(tmp_path / 'cache'),
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path / 'prometheus'),
+    )
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+
+    _run(COUNT, env, '1', '2', '1')
+    _run(COUNT, env, '2', '3')
+
+    assert _run(STATS, env).strip() == str({'hits': 2, 'misses': 3})
+
+def test_hit_takes_no_write_lock():
+    import diskcache
+    from cache import cache
+
+    cache.set('tests.hit', 1)
+
+    # Another process in the middle of a write: a hit must not wait for it
+    writer = diskcache.Cache(cache.directory)
+    reader = diskcache.Cache(cache.directory, timeout=0.1)
+    try:
+        with writer.transact():
+            writer.set('tests.other', 2)
+            assert reader.get('tests.hit') == 1
+    finally:
+        reader.close()
+        writer.close()
@@ -0,0 +1,42 @@
+import psycopg2 as psy
+
+
+def _versions():
+    from db import fetch_df
+
+    records_data = fetch_df('SELECT year, version FROM data_version;')
+    return dict(zip(records_data['year'], records_data['version']))
+
+def test_setup_again_waits_for_no_reader(scratch_db):
+    from dataversion import create_data_versions
+    from summaries import setup_summaries
+
+    # A dashboard query still running on every table the triggers are on
+    reader = psy.connect(scratch_db)
+    cur = reader.cursor()
+    for table in ('results', 'lap_times', 'pit_stops', 'races'):
+        cur.execute(f'SELECT COUNT(*) FROM {table};')
+
+    try:
+        setup_summaries()
+        create_data_versions()
+    finally:
+        reader.rollback()
+        reader.close()
+
+def test_triggers_bump_the_changed_season(scratch_db, tables):
+    from db import get_connection
+
+    versions = _versions()
+    raceid = int(tables['races'].query('year == 2022')['raceid'].iloc[0])
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('UPDATE results SET points = points + 1 WHERE raceid = %s;', (raceid,))
+        conn.commit()
+
+    after = _versions()
+    assert after[2022] > versions[2022]
+    assert {year: after[year] for year in (2021, 2023)} == {year: versions[year] for year in (2021, 2023)}
+    # Statement level: one bump for the whole update
+    assert after[2022] == max(after.values())
@@ -0,0 +1,115 @@
+import time
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from conftest import TABLES
+
+
+def _values(records_data):
+    return records_data.astype(object).where(records_data.notna(), None)
+
+def _schema(records_data):
+    return pa.Table.from_pandas(records_data, preserve_index=False).schema.remove_metadata()
+
+@pytest.mark.parametrize('table', TABLES)
+def test_copy_df_matches_fetch_df(scratch_db, table):
+    from db import copy_df, fetch_df
+
+    query = f'SELECT * FROM {table} ORDER BY 1, 2;'
+    fetched, copied = fetch_df(query), copy_df(query)
+
+    pd.testing.assert_frame_equal(_values(copied), _values(fetched))
+    # What the Parquet export writes
+    assert _schema(copied) == _schema(fetched)
+
+def test_copy_df_types(scratch_db):
+    from db import copy_df
+
+    copied = copy_df(
+        """
+            SELECT 1 AS id, NULL::integer AS missing, true AS flag, ''::text AS empty,
+                   NULL::text AS null_text, '2024-03-02'::date AS day, %s::float8 AS value;
+        """, (1.5,)
+    )
+
+    assert copied.dtypes.astype(str).to_dict() == {
+        'id': 'int64', 'missing': 'float64', 'flag': 'bool', 'empty': 'object',
+        'null_text': 'object', 'day': 'object', 'value': 'float64',
+    }
+    assert copied['empty'][0] == '' and copied['null_text'][0] is None
+    assert copied['day'][0].isoformat() == '2024-03-02'
+
+@pytest.fixture
+def pool(postgres_url):
+    from db import ConnectionPool
+
+    pool = ConnectionPool(postgres_url, min_size=2, max_size=2, timeout=5)
+    yield pool
+    pool.closeall()
+
+def test_pool_reuses_connections(pool):
+    first = pool.getconn()
+    pool.putconn(first)
+    second = pool.getconn()
+    pool.putconn(second)
+
+    assert second is first
+    assert pool.stats()['connects'] == 1
+    assert pool.stats()['checkouts'] == 2
+
+def test_pool_timeout(pool):
+    from db import PoolTimeout
+
+    held = [pool.getconn(), pool.getconn()]
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.2)
+
+    assert 0.2 <= time.monotonic() - start < 2
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['waiting'] == 0
+    for conn in held:
+        pool.putconn(conn)
+
+def test_pool_hands_returned_connection_to_waiter(pool):
+    held = [pool.getconn(), pool.getconn()]
+    timer = threading.Timer(0.2, pool.putconn, (held[0],))
+    timer.start()
+
+    conn = pool.getconn(timeout=5)
+
+    assert conn is held[0]
+    assert pool.stats()['connects'] == 2
+    pool.putconn(conn)
+    pool.putconn(held[1])
+
+def test_pool_replaces_closed_connection(pool):
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+
+    assert pool.stats()['size'] == 0
+    replacement = pool.getconn()
+    assert replacement is not conn and not replacement.closed
+    pool.putconn(replacement)
+
+def test_pool_rolls_back_on_return(pool):
+    conn = pool.getconn()
+    conn.cursor().execute('CREATE TEMP TABLE left_open (id integer);')
+    pool.putconn(conn)
+
+    conn = pool.getconn()
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('pg_temp.left_open');")
+    assert cur.fetchone()[0] is None
+    pool.putconn(conn)
+
+def test_pool_warm_and_closeall(pool):
+    pool.warm()
+    assert pool.stats()['idle'] == 2
+
+    pool.closeall()
+    assert pool.stats()['idle'] == 0 and pool.stats()['size'] == 0
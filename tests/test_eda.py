@@ -0,0 +1,46 @@
+import importlib
+
+from dash import dcc
+
+
+def _page():
+    import app  # noqa: F401, registers the pages
+
+    return importlib.import_module('pages.eda')
+
+def _dropdowns():
+    page = _page().layout()
+    return {component.id: component for component in page._traverse() if isinstance(component, dcc.Dropdown)}
+
+def test_layout_latest_season(scratch_db):
+    from summaries import refresh_summaries
+
+    refresh_summaries()
+    dropdowns = _dropdowns()
+
+    assert dropdowns['seasons-dropdown'].value == 2023
+    assert dropdowns['constructor-selector'].value in {'Red Bull', 'Ferrari', 'Mercedes'}
+
+def test_layout_skips_season_without_results(scratch_db):
+    from db import get_connection
+    from summaries import refresh_summaries
+
+    # The next season's calendar, loaded before its first race
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO seasons VALUES (2024, 'u2024');")
+        cur.execute("INSERT INTO races VALUES (100, 2024, 1, 1, 'Sakhir Grand Prix', '2024-03-02', '15:00:00', 'u');")
+        conn.commit()
+    refresh_summaries()
+
+    dropdowns = _dropdowns()
+
+    assert dropdowns['seasons-dropdown'].value == 2023
+    assert 2024 not in [option['value'] for option in dropdowns['seasons-dropdown'].options]
+    assert dropdowns['constructor-selector'].value in {'Red Bull', 'Ferrari', 'Mercedes'}
+
+def test_selector_for_season_without_results(scratch_db):
+    from summaries import refresh_summaries
+
+    refresh_summaries()
+    assert _page().update_constructor_selector(1999) == ([], None)
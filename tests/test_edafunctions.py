@@ -0,0 +1,174 @@
+import pandas as pd
+import pytest
+
+# The per-view queries the season bundle replaced, as they were
+OLD_MAP = """
+    SELECT
+        r.year, r.name AS race_name,
+        c.lat AS circuit_lat, c.lng AS circuit_lng, c.country as circuit_country,
+        re.milliseconds AS race_time_in_milliseconds,
+        MAX(re.fastestlapspeed) AS fastest_lap_speed
+    FROM races AS r
+    JOIN circuits AS c ON r.circuitId = c.circuitId
+    JOIN (
+        SELECT raceId, milliseconds, fastestlapspeed
+        FROM results
+        WHERE positionOrder = 1
+    ) AS re ON r.raceId = re.raceId
+    LEFT JOIN (
+        SELECT raceId, MIN(milliseconds) AS milliseconds
+        FROM lap_times
+        GROUP BY raceId
+    ) AS l ON r.raceId = l.raceId
+    WHERE r.year = %s
+    GROUP BY r.year, race_name, circuit_lat, circuit_lng, circuit_country, race_time_in_milliseconds;
+"""
+
+OLD_CONSTRUCTORS = """
+    SELECT
+        race_name,
+        constructor_name,
+        SUM(total_points) OVER(PARTITION BY constructor_name ORDER BY race_date) AS total_points
+    FROM (
+        SELECT
+            r.name as race_name,
+            c.name AS constructor_name,
+            SUM(rs.points) AS total_points,
+            r.date as race_date
+        FROM constructors c
+        JOIN results rs ON c.constructorid = rs.constructorid
+        JOIN races r ON rs.raceid = r.raceid
+        WHERE r.year = %s
+        GROUP BY r.name, c.name, r.date
+    ) AS subquery
+    ORDER BY race_date ASC, total_points DESC;
+"""
+
+# Without their LIMIT 1, so ties can be told apart from mistakes
+OLD_FASTEST = """
+    select
+        c.name, max(r.fastestlapspeed) as speed, c.url
+    from results r
+    join races ra on r.raceid = ra.raceid
+    join constructors c on r.constructorid = c.constructorid
+    WHERE ra.year = %s
+    GROUP BY r.raceid, c.name, c.url
+    ORDER BY speed desc;
+"""
+
+OLD_WINS = """
+    select
+        c.name, sum(r.position) as wins, c.url
+    from results r
+    join races ra on r.raceid = ra.raceid
+    join constructors c on r.constructorid = c.constructorid
+    WHERE ra.year = %s and r.position = 1
+    GROUP BY c.name, c.url
+    ORDER BY wins desc;
+"""
+
+OLD_PROBLEMS = """
+    select
+        c.name, count(s.status_category) as problems, c.url
+    from results r
+    join races ra on r.raceid = ra.raceid
+    join constructors c on r.constructorid = c.constructorid
+    join categorize_status() s on r.statusid = s.statusid
+    WHERE ra.year = %s and not s.status_category in ('Finished', 'Not finished')
+    GROUP BY c.name, c.url
+    ORDER BY problems DESC;
+"""
+
+OLD_NAMES = """
+    SELECT
+        c.name
+    FROM results r
+    JOIN races ra ON r.raceid = ra.raceid
+    JOIN constructors c ON r.constructorid = c.constructorid
+    WHERE ra.year = %s
+    GROUP BY c.name, c.url;
+"""
+
+OLD_STATUS = """
+   select
+        c.name, s.status_category as status, count(s.status_category) as problems, c.url
+    from results r
+    join races ra on r.raceid = ra.raceid
+    join constructors c on r.constructorid = c.constructorid
+    join categorize_status() s on r.statusid = s.statusid
+    WHERE ra.year = %s and c.name = %s
+    GROUP BY c.name, c.url, s.status_category
+    ORDER BY problems DESC;
+"""
+
+OLD_STATS_INFO = """
+    SELECT
+        c.name, c.url,
+        COUNT(DISTINCT r.driverid) AS total_drivers,
+        MAX(r.fastestlapspeed) AS max_speed,
+        SUM(r.points) AS total_points,
+        SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS total_wins
+    FROM results r
+    JOIN races ra ON r.raceid = ra.raceid
+    JOIN constructors c ON r.constructorid = c.constructorid
+    WHERE ra.year = %s and c.name = %s
+    GROUP BY c.name, c.url;
+"""
+
+OLD_STATS_TABLE = """
+    SELECT
+        d.surname,
+        MAX(r.fastestlapspeed) AS max_speed,
+        SUM(r.points) AS total_points,
+        SUM(CASE WHEN r.position = 1 THEN 1 ELSE 0 END) AS total_wins
+    FROM results r
+    JOIN races ra ON r.raceid = ra.raceid
+    JOIN constructors c ON r.constructorid = c.constructorid
+    JOIN drivers d on r.driverid = d.driverid
+    WHERE ra.year = %s and c.name = %s
+    GROUP BY  d.surname;
+"""
+
+SEASONS = [2021, 2022, 2023]
+
+
+def _same(new, old, by):
+    pd.testing.assert_frame_equal(
+        new.sort_values(by).reset_index(drop=True),
+        old[list(new.columns)].sort_values(by).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+def _top(new, old, value):
+    # LIMIT 1 over ties picks any of them
+    assert len(new) == 1
+    assert new[value][0] == old[value].max()
+    assert new['name'][0] in set(old.loc[old[value] == old[value].max(), 'name'])
+
+@pytest.mark.parametrize('year', SEASONS)
+def test_season_views(local_data, year):
+    from db import fetch_df
+    from edafunctions import get_map_data, get_constructors_data, get_constructor_info, get_constructor_stats_names
+
+    _same(get_map_data(year), fetch_df(OLD_MAP, (year,)), 'race_name')
+
+    old = fetch_df(OLD_CONSTRUCTORS, (year,))
+    old['race_name'] = old['race_name'].str.replace('Grand Prix', 'GP')
+    _same(get_constructors_data(year), old, ['race_name', 'constructor_name'])
+
+    fastest, wins, problems = get_constructor_info(year)
+    _top(fastest, fetch_df(OLD_FASTEST, (year,)), 'speed')
+    _top(wins, fetch_df(OLD_WINS, (year,)), 'wins')
+    _top(problems, fetch_df(OLD_PROBLEMS, (year,)), 'problems')
+
+    assert sorted(get_constructor_stats_names(year)['name']) == sorted(fetch_df(OLD_NAMES, (year,))['name'])
+
+@pytest.mark.parametrize('year', SEASONS)
+def test_constructor_views(local_data, year):
+    from db import fetch_df
+    from edafunctions import get_constructor_stats_names, get_constructor_status_info, get_constructor_stats_info, get_constructor_stats_table
+
+    for constructor in get_constructor_stats_names(year)['name']:
+        _same(get_constructor_status_info(year, constructor), fetch_df(OLD_STATUS, (year, constructor)), 'status')
+        _same(get_constructor_stats_info(year, constructor), fetch_df(OLD_STATS_INFO, (year, constructor)), 'name')
+        _same(get_constructor_stats_table(year, constructor), fetch_df(OLD_STATS_TABLE, (year, constructor)), 'surname')
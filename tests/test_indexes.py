@@ -0,0 +1,56 @@
+def _indexes(table):
+    from db import fetch_df
+    from indexes import TABLE_INDEXES
+
+    records_data = fetch_df(TABLE_INDEXES, (table,))
+    return {row.relname: (row.usable, list(row.columns)) for row in records_data.itertuples()}
+
+def test_apply_creates_missing_indexes_once(scratch_db):
+    from indexes import apply_indexes
+
+    created = apply_indexes()
+
+    assert 'races_year_idx' in created
+    assert _indexes('races')['races_year_idx'] == (True, ['year'])
+    assert apply_indexes() == []
+
+def test_primary_key_covers_leading_columns(scratch_db):
+    from indexes import apply_indexes
+
+    created = apply_indexes()
+
+    # lap_times and pit_stops are keyed by (raceid, driverid, ...)
+    assert 'lap_times_raceid_idx' not in created
+    assert 'pit_stops_raceid_idx' not in created
+    assert 'lap_times_raceid_idx' not in _indexes('lap_times')
+
+def test_equivalent_index_under_another_name(scratch_db):
+    from db import get_connection
+    from indexes import apply_indexes
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('CREATE INDEX results_by_driver ON results (driverid);')
+        # Not usable in place of an index on the whole table
+        cur.execute('CREATE INDEX results_winners ON results (constructorid) WHERE positionorder = 1;')
+        conn.commit()
+
+    created = apply_indexes()
+
+    assert 'results_driverid_idx' not in created
+    assert 'results_constructorid_idx' in created
+
+def test_invalid_index_is_rebuilt(scratch_db):
+    from db import get_connection
+    from indexes import apply_indexes
+
+    apply_indexes()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # What a CREATE INDEX CONCURRENTLY that failed halfway leaves behind
+        cur.execute("UPDATE pg_index SET indisvalid = false WHERE indexrelid = 'races_year_idx'::regclass;")
+        conn.commit()
+    assert _indexes('races')['races_year_idx'] == (False, ['year'])
+
+    assert apply_indexes() == ['races_year_idx']
+    assert _indexes('races')['races_year_idx'] == (True, ['year'])
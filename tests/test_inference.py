@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope='module')
+def shipped():
+    from modelstore import MODELS_DIR, ModelStore
+
+    return ModelStore(MODELS_DIR, download=False)
+
+def _classification(n=300, features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    Z = rng.normal(0, 1, (n, features))
+    y = (Z @ rng.normal(0, 1, features) + rng.normal(0, 2, n) > 0).astype(int)
+    # Features in their own units, as the scaler sees them
+    return Z * rng.uniform(1, 50, features) + rng.uniform(-10, 100, features), y
+
+@pytest.mark.parametrize('name, kind', [('knn', 'cosine-knn'), ('svm', 'linear-ovo')])
+def test_shipped_models_compile(shipped, name, kind):
+    from modelsfunctions import MODEL_FEATURES
+    from inference import compile_estimator, check_equivalence, sample_rows
+
+    estimator = shipped.get_estimator(name)
+    model = compile_estimator(estimator, MODEL_FEATURES[name])
+
+    assert model.kind == kind
+    assert check_equivalence(model, estimator, sample_rows(model, n=500)) == (True, 0.0)
+
+def test_logistic_pipeline():
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    from inference import LogisticModel, compile_estimator
+
+    X, y = _classification()
+    estimator = Pipeline([('scaler', StandardScaler()), ('model', LogisticRegression())]).fit(X, y)
+    model = compile_estimator(estimator, [f'x{i}' for i in range(X.shape[1])])
+
+    assert isinstance(model, LogisticModel)
+    np.testing.assert_array_equal(model.predict(X), estimator.predict(X))
+    np.testing.assert_allclose(model.predict_proba(X), estimator.predict_proba(X), rtol=0, atol=1e-12)
+
+def test_statsmodels_logit():
+    import statsmodels.formula.api as smf
+    from inference import StatsmodelsLogitModel, compile_estimator, check_equivalence
+
+    X, y = _classification(features=3)
+    data = pd.DataFrame(X, columns=['grid', 'minutes', 'fastestlapspeed']).assign(win=y)
+    estimator = smf.logit('win ~ grid + minutes + fastestlapspeed', data).fit(disp=0)
+    model = compile_estimator(estimator, ['grid', 'minutes', 'fastestlapspeed'])
+
+    assert isinstance(model, StatsmodelsLogitModel)
+    ok, difference = check_equivalence(model, estimator, X)
+    assert ok, difference
+
+def test_cosine_knn_zero_query():
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import KNeighborsClassifier
+    from inference import compile_estimator
+
+    X, y = _classification()
+    estimator = Pipeline([
+        ('scaler', StandardScaler()),
+        ('knn', KNeighborsClassifier(n_neighbors=5, metric='cosine')),
+    ]).fit(X, y)
+    model = compile_estimator(estimator, [f'x{i}' for i in range(X.shape[1])])
+
+    # The training mean scales to the origin
+    query = estimator.named_steps['scaler'].mean_.reshape(1, -1)
+    distances, neighbors = model.kneighbors(query)
+    expected_distances, expected_neighbors = estimator.named_steps['knn'].kneighbors(estimator.named_steps['scaler'].transform(query))
+
+    np.testing.assert_allclose(distances, expected_distances)
+    np.testing.assert_array_equal(neighbors, expected_neighbors)
+    np.testing.assert_array_equal(model.predict_proba(query), estimator.predict_proba(query))
+
+def test_cosine_knn_explain_in_feature_units():
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import KNeighborsClassifier
+    from inference import compile_estimator
+
+    X, y = _classification()
+    features = [f'x{i}' for i in range(X.shape[1])]
+    estimator = Pipeline([
+        ('scaler', StandardScaler()),
+        ('knn', KNeighborsClassifier(n_neighbors=3, metric='cosine')),
+    ]).fit(X, y)
+    model = compile_estimator(estimator, features)
+
+    for neighbor in model.explain(X[:1])[0]['neighbors']:
+        np.testing.assert_allclose([neighbor[feature] for feature in features], X[neighbor['index']])
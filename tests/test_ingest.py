@@ -0,0 +1,118 @@
+import pytest
+
+from conftest import write_csv
+
+
+@pytest.fixture
+def loaded(scratch_db):
+    from summaries import refresh_summaries
+
+    refresh_summaries()
+    return scratch_db
+
+def _versions():
+    from db import fetch_df
+
+    records_data = fetch_df('SELECT year, version FROM data_version;')
+    return dict(zip(records_data['year'], records_data['version']))
+
+def _ingest(tables, directory, **kwargs):
+    from ingest import ingest
+
+    write_csv(tables, directory)
+    return ingest(str(directory), **kwargs)
+
+def test_same_dump_changes_nothing(loaded, tables, tmp_path):
+    versions = _versions()
+
+    assert _ingest(tables, tmp_path) == []
+    assert _versions() == versions
+
+def test_changed_result_rewrites_its_season_only(loaded, tables, tmp_path):
+    from db import fetch_df
+
+    versions = _versions()
+    results = tables['results']
+    raceid = int(tables['races'].query('year == 2022 and round == 2')['raceid'].iloc[0])
+    results.loc[results['raceid'] == raceid, 'points'] += 1
+
+    assert _ingest(tables, tmp_path) == [2022]
+
+    points = fetch_df('SELECT SUM(points) AS points FROM results WHERE raceid = %s;', (raceid,))['points'][0]
+    assert points == results.loc[results['raceid'] == raceid, 'points'].sum()
+    after = _versions()
+    assert after[2022] > versions[2022]
+    assert {year: after[year] for year in (2021, 2023)} == {year: versions[year] for year in (2021, 2023)}
+
+def test_new_season_is_inserted(loaded, tables, tmp_path):
+    from db import fetch_df
+    from conftest import make_tables
+
+    grown = make_tables(years=(2021, 2022, 2023, 2024))
+
+    assert _ingest(grown, tmp_path) == [2024]
+    assert fetch_df('SELECT COUNT(*) AS races FROM summary_race WHERE year = 2024;')['races'][0] == 3
+
+def test_partial_reference_dump_keeps_the_other_columns(loaded, tables, tmp_path):
+    from db import fetch_df
+
+    # Only the columns in the header are compared and written
+    drivers = tables['drivers'][['driverid', 'surname']].copy()
+    drivers.loc[drivers['driverid'] == 2, 'surname'] = 'Perez'
+
+    assert _ingest({'drivers': drivers}, tmp_path) == [2021, 2022, 2023]
+
+    stored = fetch_df('SELECT * FROM drivers ORDER BY driverid;')
+    assert stored['surname'].tolist() == drivers['surname'].tolist()
+    assert stored['forename'].tolist() == tables['drivers']['forename'].tolist()
+    assert stored['dob'].tolist() == tables['drivers']['dob'].tolist()
+
+    # The names are in the summary checksums: the seasons were rebuilt
+    surnames = fetch_df('SELECT DISTINCT surname FROM summary_season_driver;')['surname']
+    assert 'Perez' in surnames.tolist() and 'Pérez' not in surnames.tolist()
+
+def test_partial_reference_dump_unchanged(loaded, tables, tmp_path):
+    versions = _versions()
+
+    assert _ingest({'drivers': tables['drivers'][['driverid', 'code']]}, tmp_path) == []
+    assert _versions() == versions
+
+def test_race_dump_missing_columns_is_refused(loaded, tables, tmp_path):
+    from db import fetch_df
+
+    results = tables['results'].drop(columns=['fastestlapspeed'])
+    results['points'] += 1
+
+    with pytest.raises(ValueError, match='fastestlapspeed'):
+        _ingest({'results': results}, tmp_path)
+
+    assert fetch_df('SELECT SUM(points) AS points FROM results;')['points'][0] == tables['results']['points'].sum()
+
+def test_seasons_filter(loaded, tables, tmp_path):
+    tables['results']['points'] += 1
+
+    assert _ingest(tables, tmp_path, seasons=[2023]) == [2023]
+
+def test_dry_run_rolls_back(loaded, tables, tmp_path):
+    versions = _versions()
+    tables['results']['points'] += 1
+
+    assert _ingest(tables, tmp_path, dry_run=True) == [2021, 2022, 2023]
+    assert _versions() == versions
+
+def test_ingest_waits_for_no_reader(loaded, tables, scratch_db, tmp_path):
+    import psycopg2 as psy
+
+    # A dashboard query still running on every table ingest writes; with
+    # the lock timeout, anything heavier than a row lock would raise
+    reader = psy.connect(scratch_db)
+    cur = reader.cursor()
+    for table in ('races', 'results', 'lap_times', 'pit_stops', 'drivers', 'summary_race'):
+        cur.execute(f'SELECT COUNT(*) FROM {table};')
+
+    tables['results']['points'] += 1
+    try:
+        assert _ingest(tables, tmp_path) == [2021, 2022, 2023]
+    finally:
+        reader.rollback()
+        reader.close()
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+
+def _both(local_data, monkeypatch, function, *args):
+    import db
+    import dataversion
+
+    local = function(*args)
+    monkeypatch.setattr(db, 'DATA_BACKEND', 'postgres')
+    monkeypatch.setattr(dataversion, 'DATA_BACKEND', 'postgres')
+    return local, function(*args)
+
+def test_mapping_params_rejected(local_data):
+    from db import fetch_df
+
+    with pytest.raises(TypeError):
+        fetch_df('SELECT * FROM races WHERE year = %s;', {'year': 2022})
+
+def test_positional_params(local_data):
+    from db import fetch_df
+
+    races = fetch_df('SELECT raceid FROM races WHERE year = %s AND round <= %s ORDER BY raceid;', (2022, 2))
+    assert races['raceid'].tolist() == [4, 5]
+
+def test_season_inputs_match_postgres(local_data, monkeypatch):
+    from modelsfunctions import get_season_inputs
+
+    local, postgres = _both(local_data, monkeypatch, get_season_inputs.__wrapped__, 2022)
+
+    for name in ('teams', 'circuits', 'params'):
+        pd.testing.assert_frame_equal(
+            local[name].sort_values(list(local[name].columns)).reset_index(drop=True),
+            postgres[name].sort_values(list(postgres[name].columns)).reset_index(drop=True),
+            check_dtype=False,
+        )
+    assert local['params']['min_minutes'][0] == 90
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def client():
+    from metrics import register_metrics
+
+    server = Flask(__name__)
+    register_metrics(server)
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        return {'response': {}}
+
+    return server.test_client()
+
+def _samples(output):
+    from metrics import CALLBACK_LATENCY
+
+    return sum(
+        sample.value
+        for metric in CALLBACK_LATENCY.collect()
+        for sample in metric.samples
+        if sample.name.endswith('_count') and sample.labels['output'] == output
+    )
+
+@pytest.mark.parametrize('output, label', [
+    ('map-graph.figure', 'map-graph.figure'),
+    ('{"index":1,"type":"card"}.children', '{"index": 1, "type": "card"}'),
+    ('{"index":"1.5","type":"card.v2"}.children', '{"index": "1.5", "type": "card.v2"}'),
+])
+def test_callback_label(client, output, label):
+    before = _samples(label)
+
+    response = client.post('/_dash-update-component', json={'output': output})
+
+    assert response.status_code == 200
+    assert _samples(label) == before + 1
+
+def test_bad_output_still_served(client):
+    response = client.post('/_dash-update-component', json={'output': '{"index": 1.children'})
+
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'response': {}}
+
+def test_metrics_failure_still_served(client, monkeypatch):
+    import metrics
+
+    def broken():
+        raise RuntimeError('broken')
+
+    monkeypatch.setattr(metrics, '_callback_output', broken)
+    response = client.post('/_dash-update-component', json={'output': 'map-graph.figure'})
+
+    assert response.status_code == 200
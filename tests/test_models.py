@@ -0,0 +1,41 @@
+import importlib
+
+import pytest
+from dash import html
+
+
+def _page():
+    import app  # noqa: F401, registers the pages
+
+    return importlib.import_module('pages.models')
+
+@pytest.fixture
+def empty_store(tmp_path, monkeypatch):
+    # No artifacts and nothing pinned: every model is unavailable
+    import modelstore
+
+    monkeypatch.setattr(modelstore.store, 'models_dir', str(tmp_path))
+    monkeypatch.setattr(modelstore.store, '_files', {})
+    return modelstore.store
+
+def test_unpinned_artifact_is_not_downloaded(tmp_path):
+    from modelstore import ModelStore, ModelUnavailable
+
+    with pytest.raises(ModelUnavailable, match='No checksum'):
+        ModelStore(str(tmp_path), download=True).get('binarylsm')
+
+@pytest.mark.parametrize('tab', ['binarylsm', 'class'])
+def test_tab_without_artifact(empty_store, tab):
+    article = _page().set_model_tab(tab)
+
+    assert isinstance(article, html.Article)
+    assert article.children[0].children == 'Model unavailable'
+
+def test_api_without_artifact(empty_store):
+    import app
+
+    rows = [{'year': 2023, 'raceid': 1, 'grid': 1, 'minutes': 90, 'constructorid': 9, 'pit_stop': 2, 'fastestlapspeed': 210.0}]
+    response = app.server.test_client().post('/api/predict/binarylsm', json={'rows': rows})
+
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'Model binarylsm is unavailable'
@@ -0,0 +1,105 @@
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    # Live knn and svm artifacts with their manifest, as shipped
+    import train
+    from modelstore import ModelStore
+
+    models_dir = str(tmp_path / 'models')
+    os.makedirs(models_dir)
+    filenames = []
+    for name in ('knn', 'svm'):
+        filenames += train.write_artifact(models_dir, name, {'name': name, 'version': 'shipped'}, {'version': 'shipped'})
+    store = ModelStore(models_dir, download=False)
+    store.write_manifest(filenames)
+
+    monkeypatch.setattr(train, 'MODELS_DIR', models_dir)
+    monkeypatch.setattr(train, 'VERSIONS_DIR', os.path.join(models_dir, 'versions'))
+    monkeypatch.setattr(train, 'store', store)
+    return models_dir
+
+def _version(version, names=('knn',)):
+    import train
+
+    version_dir = os.path.join(train.VERSIONS_DIR, version)
+    os.makedirs(version_dir)
+    filenames = []
+    for name in names:
+        filenames += train.write_artifact(version_dir, name, {'name': name, 'version': version}, {'version': version})
+    return version_dir, filenames
+
+def test_promote_flips_current(models_dir):
+    import train
+    from modelstore import MANIFEST_FILE, ModelStore
+
+    version_dir, filenames = _version('v1')
+    train.promote(version_dir, filenames)
+
+    store = ModelStore(models_dir, download=False)
+    assert store.live_dir() == os.path.realpath(version_dir)
+    assert store.get_estimator('knn')['version'] == 'v1'
+    # The models that weren't retrained come along, checksums and all
+    assert store.get_estimator('svm')['version'] == 'shipped'
+    assert sorted(store.manifest()) == sorted(
+        f'{name}{suffix}' for name in ('knn', 'svm') for suffix in (train.METRICS_SUFFIX, train.ESTIMATOR_SUFFIX)
+    )
+    assert MANIFEST_FILE in os.listdir(version_dir)
+
+def test_promote_again_keeps_previous_version(models_dir):
+    import train
+    from modelstore import ModelStore
+
+    train.promote(*_version('v1'))
+    train.promote(*_version('v2', names=('svm',)))
+
+    store = ModelStore(models_dir, download=False)
+    assert store.get_estimator('knn')['version'] == 'v1'
+    assert store.get_estimator('svm')['version'] == 'v2'
+    assert os.listdir(os.path.join(train.VERSIONS_DIR, 'v1'))
+
+def test_promote_refuses_corrupt_live_artifact(models_dir):
+    import train
+    from modelstore import ModelChecksumError, ModelStore
+
+    with open(os.path.join(models_dir, f'svm{train.ESTIMATOR_SUFFIX}'), 'ab') as f:
+        f.write(b'corrupt')
+
+    with pytest.raises(ModelChecksumError):
+        train.promote(*_version('v1'))
+
+    assert ModelStore(models_dir, download=False).live_dir() == models_dir
+
+def test_readers_never_see_half_promoted_version(models_dir):
+    import train
+    from modelstore import ModelStore
+
+    store = ModelStore(models_dir, download=False)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                for name in ('knn', 'svm'):
+                    store.get_estimator(name)
+                    store.get_metrics(name)
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        for i in range(30):
+            train.promote(*_version(f'v{i}', names=('knn', 'svm')[i % 2:i % 2 + 1]))
+    finally:
+        done.set()
+        reader.join()
+
+    assert errors == []
+    assert store.get_estimator('knn')['version'] == 'v28'
+    assert store.get_estimator('svm')['version'] == 'v29'